@@ -0,0 +1,35 @@
+"""Microbenchmark of reading config values.
+
+Compares parsing config.json on every read (as get_config_value used to do) with the memoized
+configuration object. Run it from the root of the repo with: python -m benchmarks.bench_config
+"""
+
+import json
+import timeit
+
+from modules.config import DEFAULT_CONFIG_PATH
+from modules.helpers import get_config_value
+
+KEY_PATH = "help_texts.model"
+NUMBER = 10_000
+
+
+def read_by_parsing_file(key_path: str):
+    with open(DEFAULT_CONFIG_PATH, "r", encoding="utf-8") as config_file:
+        value = json.load(config_file)
+    for key in key_path.split("."):
+        value = value[key]
+    return value
+
+
+def main():
+    assert read_by_parsing_file(KEY_PATH) == get_config_value(KEY_PATH)
+    parsing = timeit.timeit(lambda: read_by_parsing_file(KEY_PATH), number=NUMBER)
+    memoized = timeit.timeit(lambda: get_config_value(KEY_PATH), number=NUMBER)
+    print(f"parsing config.json: {parsing / NUMBER * 1e6:8.2f} µs per read")
+    print(f"memoized config:     {memoized / NUMBER * 1e6:8.2f} µs per read")
+    print(f"speedup:             {parsing / memoized:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Microbenchmark of the full-text search over the library.
+
+Fills a temporary database with videos, library entries and transcripts and compares searching them
+with LIKE (a full scan) to the FTS5 index. Run it from the root of the repo with:
+python -m benchmarks.bench_search
+"""
+
+import random
+import tempfile
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+from peewee import SqliteDatabase
+
+from modules import persistance
+from modules.persistance import LibraryEntry, Transcript, Video, search_library
+
+NUM_VIDEOS = 2_000
+ENTRIES_PER_VIDEO = 10
+WORDS_PER_TEXT = 300
+QUERY = "quantum entangle"
+NUMBER = 100
+
+VOCABULARY = [f"word{i}" for i in range(5_000)]
+# share of the texts that match the query
+MATCHING_SHARE = 0.01
+
+
+def random_text(rng: random.Random) -> str:
+    words = rng.choices(VOCABULARY, k=WORDS_PER_TEXT)
+    if rng.random() < MATCHING_SHARE:
+        words[rng.randrange(WORDS_PER_TEXT)] = "quantum entanglement"
+    return " ".join(words)
+
+
+def fill_database():
+    rng = random.Random(0)
+    with persistance.SQL_DB.atomic():
+        for i in range(NUM_VIDEOS):
+            video = Video.create(
+                yt_video_id=f"video{i}",
+                link=f"https://www.youtube.com/watch?v=video{i}",
+                title=f"Video {i}",
+                channel=f"Channel {i % 50}",
+                saved_on=datetime.now(),
+            )
+            Transcript.create(video=video, text=random_text(rng))
+            LibraryEntry.insert_many(
+                [
+                    {
+                        "entry_type": "A",
+                        "video": video,
+                        "question": f"Question {j}",
+                        "text": random_text(rng),
+                    }
+                    for j in range(ENTRIES_PER_VIDEO)
+                ]
+            ).execute()
+
+
+def search_with_like(query: str):
+    condition = None
+    for word in query.split():
+        matches = LibraryEntry.text.contains(word) | LibraryEntry.question.contains(
+            word
+        )
+        condition = matches if condition is None else condition & matches
+    # all matches are needed to rank them, like the FTS5 index does
+    return list(LibraryEntry.select(LibraryEntry.id).where(condition))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = SqliteDatabase(
+            str(Path(tmp_dir) / "bench.sqlite3"), pragmas=persistance.SQLITE_PRAGMAS
+        )
+        persistance.SQL_DB = db
+        db.bind(persistance.MODELS)
+        persistance.initialize_database()
+        fill_database()
+        rows = NUM_VIDEOS * (ENTRIES_PER_VIDEO + 1)
+
+        like = timeit.timeit(lambda: search_with_like(QUERY), number=NUMBER)
+        fts = timeit.timeit(lambda: search_library(QUERY), number=NUMBER)
+        print(f"rows:              {rows:8d}")
+        print(f"LIKE scan:         {like / NUMBER * 1e3:8.2f} ms per search")
+        print(f"FTS5 index:        {fts / NUMBER * 1e3:8.2f} ms per search")
+        print(f"speedup:           {like / fts:8.1f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
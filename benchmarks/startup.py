@@ -0,0 +1,89 @@
+"""Startup benchmark of the Streamlit pages.
+
+Measures how long importing the modules of each page takes and how much memory (max RSS) the process
+needs afterwards, each in a fresh interpreter, and compares the results against the budget in
+startup_budget.json. Exits with a non-zero status if a page exceeds its budget.
+Run it from the root of the repo with: python -m benchmarks.startup
+"""
+
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BUDGET_PATH = Path(__file__).resolve().parent / "startup_budget.json"
+PAGES = {
+    "main": REPO_ROOT / "main.py",
+    "chat": REPO_ROOT / "pages" / "chat.py",
+    "summary": REPO_ROOT / "pages" / "summary.py",
+    "library": REPO_ROOT / "pages" / "library.py",
+}
+# runs in a fresh interpreter and prints the import time in seconds and the max RSS in MB
+MEASURE_SCRIPT = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+seconds = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": seconds, "rss_mb": rss_mb}))
+"""
+
+
+def get_top_level_imports(page_path: Path) -> List[str]:
+    """Returns the modules a page imports at the top level, i.e. when the page is loaded."""
+    tree = ast.parse(page_path.read_text(encoding="utf-8"))
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def measure_page(page_path: Path, repeat: int) -> Dict[str, float]:
+    """Measures the import of a page in fresh interpreters. The fastest run is taken."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE_SCRIPT, *get_top_level_imports(page_path)],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_PATH.read_text(encoding="utf-8"))
+    exceeded = False
+    print(f"{'page':<10}{'import':>10}{'budget':>10}{'max RSS':>12}{'budget':>10}")
+    for page, page_path in PAGES.items():
+        result = measure_page(page_path, args.repeat)
+        page_budget = budget[page]
+        over_budget = (
+            result["seconds"] > page_budget["import_seconds"]
+            or result["rss_mb"] > page_budget["max_rss_mb"]
+        )
+        exceeded = exceeded or over_budget
+        print(
+            f"{page:<10}{result['seconds']:>9.2f}s{page_budget['import_seconds']:>9.2f}s"
+            f"{result['rss_mb']:>9.0f} MB{page_budget['max_rss_mb']:>7} MB"
+            + ("  <- over budget" if over_budget else "")
+        )
+    return 1 if exceeded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
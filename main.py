@@ -3,9 +3,12 @@ import logging
 import streamlit as st
 
 from modules.helpers import is_api_key_set, read_file
+from modules.tokenizer import prewarm_encodings
 from modules.ui import display_link_to_repo, display_nav_menu
 
 st.set_page_config(page_title="YouTubeGPT", layout="wide", initial_sidebar_state="auto")
+# loads the tokenizers in the background once per process, so that the first request doesn't wait for them
+prewarm_encodings()
 
 # display sidebar with page links
 display_nav_menu()
@@ -0,0 +1,336 @@
+import json
+import logging
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+import numpy as np
+import randomname
+
+from modules.clients import invalidate_collection
+from modules.helpers import get_config_value
+from modules.persistance import SQL_DB, LibraryEntry, Transcript, Video
+from modules.resilience import resilient_call
+
+if TYPE_CHECKING:
+    from chromadb import Collection
+    from chromadb.api import ClientAPI
+
+# version of the format of bundles, bundles of newer versions can't be imported
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# fields of the transcript that are kept in the manifest, the texts and segments are separate files
+TRANSCRIPT_FIELDS = [
+    "language",
+    "preprocessed",
+    "chunk_size",
+    "original_token_num",
+    "processed_token_num",
+]
+# files of a video, the files of the transcript are only written if it has the texts or segments
+REQUIRED_FILES = ["chunks", "embeddings"]
+TRANSCRIPT_FILES = ["text", "compacted_text", "segments", "compacted_segments"]
+
+
+class InvalidBundleException(Exception):
+    """Raised if a file is not a bundle of processed videos or its format isn't supported."""
+
+    def __init__(self, message: str):
+        # message should be a user-friendly error message
+        self.message = message
+        super().__init__(message)
+
+
+@dataclass
+class BundleImportResult:
+    """The titles of the videos that were imported and of those that were already processed."""
+
+    imported: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+
+def _iter_collection(
+    collection: "Collection", batch_size: int
+) -> Iterator[Tuple[List[str], List[str], List[dict], np.ndarray]]:
+    """Yields the ids, documents, metadata and embeddings of a collection in batches."""
+    offset = 0
+    while True:
+        batch = resilient_call(
+            "chroma",
+            lambda: collection.get(
+                include=["documents", "metadatas", "embeddings"],
+                limit=batch_size,
+                offset=offset,
+            ),
+        )
+        if not batch["ids"]:
+            return
+        yield (
+            batch["ids"],
+            batch["documents"],
+            batch["metadatas"],
+            np.asarray(batch["embeddings"], dtype=np.float32),
+        )
+        offset += len(batch["ids"])
+
+
+def _export_video(
+    chroma_client: "ClientAPI",
+    archive: zipfile.ZipFile,
+    transcript: Transcript,
+    batch_size: int,
+) -> dict:
+    """Writes the files of a video to the bundle and returns its entry in the manifest."""
+    video = transcript.video
+    prefix = f"videos/{video.yt_video_id}/"
+    collection = resilient_call(
+        "chroma",
+        lambda: chroma_client.get_collection(name=transcript.chroma_collection_name),
+    )
+    vectors = []
+    with archive.open(prefix + "chunks.jsonl", "w") as chunks_file:
+        for ids, documents, metadatas, embeddings in _iter_collection(
+            collection, batch_size
+        ):
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                chunk = {"id": chunk_id, "document": document, "metadata": metadata}
+                chunks_file.write(
+                    (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+                )
+            vectors.append(embeddings)
+    with archive.open(prefix + "embeddings.npy", "w") as embeddings_file:
+        np.save(
+            embeddings_file,
+            np.concatenate(vectors) if vectors else np.zeros((0, 0), np.float32),
+        )
+
+    files = {"chunks": prefix + "chunks.jsonl", "embeddings": prefix + "embeddings.npy"}
+    for name in TRANSCRIPT_FILES:
+        content = getattr(transcript, name)
+        if content:
+            files[name] = prefix + (name + ".txt" if "text" in name else name + ".bin")
+            archive.writestr(files[name], content)
+
+    return {
+        "yt_video_id": video.yt_video_id,
+        "title": video.title,
+        "link": video.link,
+        "channel": video.channel,
+        "saved_on": video.saved_on.isoformat() if video.saved_on else None,
+        "transcript": {name: getattr(transcript, name) for name in TRANSCRIPT_FIELDS},
+        "collection": {"metadata": collection.metadata},
+        "files": files,
+        "library_entries": [
+            {
+                "entry_type": entry.entry_type,
+                "question": entry.question,
+                "text": entry.text,
+                "saved_on": entry.saved_on.isoformat() if entry.saved_on else None,
+            }
+            for entry in video.lib_entries.order_by(LibraryEntry.id)
+        ],
+    }
+
+
+def export_bundle(
+    chroma_client: "ClientAPI",
+    file: IO[bytes],
+    yt_video_ids: Optional[List[str]] = None,
+) -> int:
+    """Writes processed videos to a bundle, which can be imported by another instance of the app.
+
+    A bundle is a ZIP archive with a JSON manifest and per video its chunks (as JSON lines), their
+    embeddings (as float32 .npy array), the transcript texts and timed segments. The embeddings are
+    read from Chroma, so no embedding model is called. Returns the number of exported videos.
+
+    Args:
+        chroma_client (ClientAPI): The ChromaDB client.
+        file (IO[bytes]): The file the bundle is written to.
+        yt_video_ids (Optional[List[str]]): The videos to export, by default all processed videos.
+    """
+    query = (
+        Transcript.select(Transcript, Video)
+        .join(Video)
+        .where(Transcript.chroma_collection_name.is_null(False))
+        .order_by(Video.id)
+    )
+    if yt_video_ids is not None:
+        query = query.where(Video.yt_video_id.in_(yt_video_ids))
+    batch_size = get_config_value("bundles.batch_size")
+    videos = []
+    with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # one transcript at a time, so that only one video is held in memory
+        for transcript in query.iterator():
+            videos.append(_export_video(chroma_client, archive, transcript, batch_size))
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "created_on": datetime.now().isoformat(),
+            "videos": videos,
+        }
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False))
+    logging.info("Exported %d videos to a bundle.", len(videos))
+    return len(videos)
+
+
+def _read_manifest(archive: zipfile.ZipFile) -> dict:
+    try:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+    except (KeyError, ValueError):
+        raise InvalidBundleException("The file is not a bundle of processed videos.")
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise InvalidBundleException(
+            "The bundle was created by another version of the app and can't be imported."
+        )
+    return manifest
+
+
+def _add_chunks(
+    collection: "Collection",
+    chunks: List[dict],
+    embeddings: np.ndarray,
+    batch_size: int,
+):
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start : start + batch_size]
+        metadatas = [chunk["metadata"] for chunk in batch]
+        resilient_call(
+            "chroma",
+            lambda: collection.add(
+                ids=[chunk["id"] for chunk in batch],
+                embeddings=embeddings[start : start + batch_size],
+                documents=[chunk["document"] for chunk in batch],
+                # chroma doesn't accept empty metadata, chunks have either all or none
+                metadatas=metadatas if all(metadatas) else None,
+            ),
+            idempotent=False,
+        )
+
+
+def _check_keys(entry: dict, name: str, required: List[str], allowed: List[str]):
+    """Raises an InvalidBundleException if a section of a video in the manifest lacks a required or has an unknown key.
+
+    The keys are passed to the models as field names, so they must not be trusted.
+    """
+    keys = set(entry[name])
+    if not set(required) <= keys <= set(allowed):
+        raise InvalidBundleException(
+            f"The bundle is corrupted, the {name} of '{entry['title']}' are invalid."
+        )
+
+
+def _import_video(
+    chroma_client: "ClientAPI", archive: zipfile.ZipFile, entry: dict, batch_size: int
+):
+    _check_keys(entry, "transcript", TRANSCRIPT_FIELDS, TRANSCRIPT_FIELDS)
+    _check_keys(entry, "files", REQUIRED_FILES, REQUIRED_FILES + TRANSCRIPT_FILES)
+    files = entry["files"]
+    with archive.open(files["embeddings"]) as embeddings_file:
+        embeddings = np.load(embeddings_file)
+    with archive.open(files["chunks"]) as chunks_file:
+        chunks = [json.loads(line) for line in chunks_file]
+    if len(chunks) != len(embeddings):
+        raise InvalidBundleException(
+            f"The bundle is corrupted, the chunks of '{entry['title']}' don't match their embeddings."
+        )
+
+    collection = resilient_call(
+        "chroma",
+        lambda: chroma_client.create_collection(
+            name=randomname.get_name(), metadata=entry["collection"]["metadata"]
+        ),
+        idempotent=False,
+    )
+    try:
+        _add_chunks(collection, chunks, embeddings, batch_size)
+        with SQL_DB.atomic():
+            video, _ = Video.get_or_create(
+                yt_video_id=entry["yt_video_id"],
+                defaults={
+                    "title": entry["title"],
+                    "link": entry["link"],
+                    "channel": entry["channel"],
+                    "saved_on": entry["saved_on"]
+                    and datetime.fromisoformat(entry["saved_on"]),
+                },
+            )
+            Transcript.create(
+                video=video,
+                chroma_collection_id=collection.id,
+                chroma_collection_name=collection.name,
+                **entry["transcript"],
+                **{
+                    name: (
+                        archive.read(path).decode("utf-8")
+                        if name.endswith("text")
+                        else archive.read(path)
+                    )
+                    for name, path in files.items()
+                    if name in TRANSCRIPT_FILES
+                },
+            )
+            existing_entries = {
+                (e.entry_type, e.question, e.text) for e in video.lib_entries
+            }
+            for library_entry in entry["library_entries"]:
+                key = (
+                    library_entry["entry_type"],
+                    library_entry["question"],
+                    library_entry["text"],
+                )
+                if key in existing_entries:
+                    continue
+                LibraryEntry.create(
+                    video=video,
+                    entry_type=library_entry["entry_type"],
+                    question=library_entry["question"],
+                    text=library_entry["text"],
+                    saved_on=library_entry["saved_on"]
+                    and datetime.fromisoformat(library_entry["saved_on"]),
+                )
+    except Exception:
+        try:
+            chroma_client.delete_collection(name=collection.name)
+        except Exception as e:
+            logging.error(
+                "Could not remove collection '%s': %s", collection.name, str(e)
+            )
+        raise
+    invalidate_collection(collection.name)
+
+
+def import_bundle(chroma_client: "ClientAPI", file: IO[bytes]) -> BundleImportResult:
+    """Imports the videos of a bundle created by export_bundle, without calling an embedding model.
+
+    The embeddings are added to new Chroma collections and the videos, transcripts and library
+    entries to the database. Videos that were already processed are skipped.
+
+    Raises:
+        InvalidBundleException: If the file is not a bundle or its format isn't supported.
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise InvalidBundleException("The file is not a bundle of processed videos.")
+    result = BundleImportResult()
+    batch_size = get_config_value("bundles.batch_size")
+    with archive:
+        for entry in _read_manifest(archive)["videos"]:
+            already_processed = (
+                Transcript.select()
+                .join(Video)
+                .where(Video.yt_video_id == entry["yt_video_id"])
+                .exists()
+            )
+            if already_processed:
+                result.skipped.append(entry["title"])
+                continue
+            _import_video(chroma_client, archive, entry, batch_size)
+            result.imported.append(entry["title"])
+    logging.info(
+        "Imported %d videos from a bundle, skipped %d.",
+        len(result.imported),
+        len(result.skipped),
+    )
+    return result
@@ -0,0 +1,239 @@
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+
+import tiktoken
+from peewee import DatabaseError
+
+from modules import catalog, clients
+from modules.catalog import ModelCapabilities
+from modules.helpers import get_config_value, get_ollama_host
+from modules.persistance import SQL_DB, ModelCapability
+from modules.resilience import resilient_call
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+# info about OpenAI's GPTs context windows: https://platform.openai.com/docs/models
+OPENAI_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": {"total": 16385, "output": 4096},
+    "gpt-4": {"total": 8192, "output": 4096},
+    "gpt-4-turbo": {"total": 128000, "output": 4096},
+    "gpt-4o": {"total": 128000, "output": 16384},
+    "gpt-4o-mini": {"total": 128000, "output": 16384},
+    "gpt-4.1-nano": {"total": 1047576, "output": 32768},
+    "gpt-4.1-mini": {"total": 1047576, "output": 32768},
+    "gpt-4.1": {"total": 1047576, "output": 32768},
+    "gpt-5.1-chat-latest": {"total": 400000, "output": 128000},
+    "gpt-5.1": {"total": 400000, "output": 128000},
+    "gpt-5.2": {"total": 400000, "output": 128000},
+    "gpt-5.2-chat-latest": {"total": 128000, "output": 16384},
+    "gpt-5.2-pro": {"total": 400000, "output": 128000},
+    "gpt-5-nano": {"total": 400000, "output": 128000},
+    "gpt-5-mini": {"total": 400000, "output": 128000},
+    "gpt-5": {"total": 400000, "output": 128000},
+}
+
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+DEFAULT_CONTEXT_LENGTH = 128000
+# used for models tiktoken doesn't know, e.g. Ollama models. The counts are an approximation then.
+DEFAULT_TOKENIZER = "o200k_base"
+# dated snapshots like 'gpt-4o-2024-08-06' share the capabilities of their model
+SNAPSHOT_SUFFIX_PATTERN = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+
+def _resolve_openai_capabilities(model: str) -> ModelCapabilities:
+    base_model = (
+        model
+        if model in OPENAI_CONTEXT_WINDOWS or model in OPENAI_EMBEDDING_DIMENSIONS
+        else SNAPSHOT_SUFFIX_PATTERN.sub("", model)
+    )
+    context_window = OPENAI_CONTEXT_WINDOWS.get(base_model, {})
+    try:
+        tokenizer = tiktoken.encoding_name_for_model(model_name=base_model)
+    except KeyError:
+        tokenizer = DEFAULT_TOKENIZER
+    return ModelCapabilities(
+        context_length=context_window.get("total"),
+        max_output_tokens=context_window.get("output"),
+        tokenizer=tokenizer,
+        embedding_dimension=OPENAI_EMBEDDING_DIMENSIONS.get(base_model),
+    )
+
+
+def _resolve_ollama_capabilities(model: str, host: str) -> ModelCapabilities:
+    timeout = get_config_value("resilience.health_check_timeout")
+    model_details = resilient_call(
+        "ollama",
+        lambda: clients.get_ollama_client(host, timeout=timeout).show(model),
+        timeout=timeout,
+    )
+    model_info = model_details.modelinfo or {}
+    architecture = model_info.get("general.architecture", "")
+    return ModelCapabilities(
+        context_length=model_info.get(f"{architecture}.context_length"),
+        tokenizer=DEFAULT_TOKENIZER,
+        embedding_dimension=model_info.get(f"{architecture}.embedding_length"),
+    )
+
+
+# (provider, host, model) of the capabilities that are resolved in the background
+_resolving = set()
+_resolving_lock = threading.Lock()
+
+
+def _load_capabilities(
+    provider: str, host: str, model: str
+) -> Optional[ModelCapabilities]:
+    """Returns the persisted capabilities of a model, if they were resolved within the TTL."""
+    ttl = timedelta(seconds=get_config_value("model_catalog.capabilities_ttl"))
+    opened_connection = SQL_DB.connect(reuse_if_open=True)
+    try:
+        row = ModelCapability.get_or_none(
+            ModelCapability.provider == provider,
+            ModelCapability.host == host,
+            ModelCapability.model == model,
+            ModelCapability.resolved_on >= datetime.now() - ttl,
+        )
+    except DatabaseError as e:
+        # e.g. the table wasn't created yet, the capabilities are resolved again then
+        logging.warning("Could not load capabilities of %s: %s", model, str(e))
+        row = None
+    finally:
+        if opened_connection:
+            SQL_DB.close()
+    if row is None:
+        return None
+    return ModelCapabilities(
+        context_length=row.context_length,
+        max_output_tokens=row.max_output_tokens,
+        tokenizer=row.tokenizer,
+        embedding_dimension=row.embedding_dimension,
+    )
+
+
+def _save_capabilities(
+    provider: str, host: str, model: str, capabilities: ModelCapabilities
+):
+    opened_connection = SQL_DB.connect(reuse_if_open=True)
+    try:
+        # deleted and inserted instead of an upsert, whose syntax differs between the databases
+        with SQL_DB.atomic():
+            ModelCapability.delete().where(
+                ModelCapability.provider == provider,
+                ModelCapability.host == host,
+                ModelCapability.model == model,
+            ).execute()
+            ModelCapability.insert(
+                provider=provider,
+                host=host,
+                model=model,
+                context_length=capabilities.context_length,
+                max_output_tokens=capabilities.max_output_tokens,
+                tokenizer=capabilities.tokenizer,
+                embedding_dimension=capabilities.embedding_dimension,
+                resolved_on=datetime.now(),
+            ).execute()
+    except DatabaseError as e:
+        logging.warning("Could not save capabilities of %s: %s", model, str(e))
+    finally:
+        if opened_connection:
+            SQL_DB.close()
+
+
+def get_model_capabilities(
+    provider: str, model: str, base_url: Optional[str] = None
+) -> ModelCapabilities:
+    """Returns the context window, output limit, tokenizer and embedding dimension of a model.
+
+    The capabilities are resolved once per model (by exact name) and kept in the model catalog with a TTL.
+    OpenAI models are looked up in a static table. Ollama models are asked for them, which is why their
+    capabilities are also persisted in the database (per host), so they survive restarts of the app.
+
+    Args:
+        provider (str): 'OpenAI' or 'Ollama'.
+        model (str): The exact name of the model.
+        base_url (Optional[str]): The host of the Ollama server. Defaults to the configured host.
+
+    Returns:
+        ModelCapabilities: The capabilities. Values that couldn't be resolved are None.
+    """
+    if provider == "Ollama":
+        base_url = base_url or get_ollama_host()
+
+    def resolve() -> ModelCapabilities:
+        if provider == "OpenAI":
+            return _resolve_openai_capabilities(model)
+        capabilities = _load_capabilities(provider, base_url, model)
+        if capabilities is None:
+            capabilities = _resolve_ollama_capabilities(model, base_url)
+            logging.info("Resolved capabilities of %s: %s", model, capabilities)
+            _save_capabilities(provider, base_url, model, capabilities)
+        return capabilities
+
+    return catalog.get_model_capabilities(
+        provider=provider,
+        base_url=base_url or "",
+        model=model,
+        fetch=resolve,
+        ttl=get_config_value("model_catalog.capabilities_ttl"),
+    )
+
+
+def peek_model_capabilities(
+    provider: str, model: str, base_url: Optional[str] = None
+) -> Optional[ModelCapabilities]:
+    """Returns the capabilities of a model if they are known, otherwise None, without blocking.
+
+    Unknown capabilities of Ollama models are resolved in a background thread, so that they are known
+    on a later rerun of the page. See get_model_capabilities for the arguments.
+    """
+    if provider == "OpenAI":
+        # looked up in a static table, which doesn't block
+        return get_model_capabilities(provider, model)
+    base_url = base_url or get_ollama_host()
+    capabilities = catalog.peek_model_capabilities(provider, base_url, model)
+    if capabilities is not None:
+        return capabilities
+    key = (provider, base_url, model)
+    with _resolving_lock:
+        if key in _resolving:
+            return None
+        _resolving.add(key)
+
+    def resolve():
+        try:
+            get_model_capabilities(provider, model, base_url=base_url)
+        except Exception as e:
+            logging.warning("Could not resolve capabilities of %s: %s", model, str(e))
+        finally:
+            with _resolving_lock:
+                _resolving.discard(key)
+
+    threading.Thread(target=resolve, name="capabilities-resolve", daemon=True).start()
+    return None
+
+
+def get_capabilities_for(llm: "BaseChatModel") -> ModelCapabilities:
+    """Returns the capabilities of a LangChain chat model of OpenAI or Ollama."""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or llm.name
+    if getattr(llm, "openai_api_key", None) is not None:
+        return get_model_capabilities("OpenAI", model)
+    return get_model_capabilities(
+        "Ollama", model, base_url=getattr(llm, "base_url", None)
+    )
+
+
+def get_tokenizer_for(llm: "BaseChatModel") -> str:
+    """Returns the name of the tiktoken encoding to count the tokens of a chat model with."""
+    try:
+        return get_capabilities_for(llm).tokenizer or DEFAULT_TOKENIZER
+    except Exception as e:
+        logging.warning("Could not resolve the tokenizer of %s: %s", llm.name, str(e))
+        return DEFAULT_TOKENIZER
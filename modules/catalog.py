@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from modules.clients import hash_secret
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class ModelCapabilities:
+    """What is known about a model. Unknown values are None."""
+
+    context_length: Optional[int] = None
+    max_output_tokens: Optional[int] = None
+    # name of the tiktoken encoding used to count tokens for the model
+    tokenizer: Optional[str] = None
+    embedding_dimension: Optional[int] = None
+
+
+class TTLCache(Generic[T]):
+    """A process-wide cache whose entries are refreshed after ttl seconds.
+
+    Only missing entries are fetched by the caller. Stale entries are returned right away and refreshed
+    in a background thread (stale-while-revalidate), so that callers don't block on a refresh.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._entries: Dict[Hashable, Tuple[float, T]] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, fetch: Callable[[], T], ttl: float) -> T:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                fetched_on, value = entry
+                if time.monotonic() - fetched_on >= ttl and key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(
+                        target=self._refresh,
+                        args=(key, fetch),
+                        name=f"{self.name}-refresh",
+                        daemon=True,
+                    ).start()
+                return value
+        value = fetch()
+        self.put(key, value)
+        return value
+
+    def peek(self, key: Hashable) -> Optional[T]:
+        """Returns the cached value (even if it's stale) or None, without fetching it."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: Hashable, value: T):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], T]):
+        try:
+            self.put(key, fetch())
+        except Exception as e:
+            # the stale value is kept and the refresh is tried again on the next access
+            logging.warning("Could not refresh %s for %s: %s", self.name, key, str(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+_model_ids: TTLCache[List] = TTLCache("model catalog")
+_capabilities: TTLCache[ModelCapabilities] = TTLCache("model capabilities")
+
+
+def _catalog_key(
+    provider: str, base_url: str, credential: Optional[str]
+) -> Tuple[str, str, str]:
+    return provider, base_url, hash_secret(credential)
+
+
+def get_models(
+    provider: str,
+    base_url: str,
+    credential: Optional[str],
+    fetch: Callable[[], List],
+    ttl: float,
+) -> List:
+    """Returns the models of a provider as listed by its API.
+
+    The catalog is kept per (provider, base URL, credential hash), so users with different API keys
+    or servers don't see each other's models.
+
+    Args:
+        provider (str): 'OpenAI' or 'Ollama'.
+        base_url (str): The base URL of the API or host of the server.
+        credential (Optional[str]): The API key, if any. Only its hash is kept as part of the key.
+        fetch (Callable[[], List]): Lists the models, if they aren't in the catalog yet or are stale.
+        ttl (float): Seconds after which the models are refreshed in the background.
+    """
+    return _model_ids.get(_catalog_key(provider, base_url, credential), fetch, ttl)
+
+
+def update_models(
+    provider: str, base_url: str, credential: Optional[str], models: List
+):
+    """Puts freshly listed models into the catalog, e.g. from a health probe."""
+    _model_ids.put(_catalog_key(provider, base_url, credential), models)
+
+
+def invalidate_models(provider: str, base_url: str, credential: Optional[str]):
+    """Removes the models of a provider from the catalog, e.g. after a model was pulled."""
+    _model_ids.invalidate(_catalog_key(provider, base_url, credential))
+
+
+def get_model_capabilities(
+    provider: str,
+    base_url: str,
+    model: str,
+    fetch: Callable[[], ModelCapabilities],
+    ttl: float,
+) -> ModelCapabilities:
+    """Returns the capabilities of a model, fetching them only if they aren't in the catalog yet."""
+    return _capabilities.get((provider, base_url, model), fetch, ttl)
+
+
+def peek_model_capabilities(
+    provider: str, base_url: str, model: str
+) -> Optional[ModelCapabilities]:
+    """Returns the capabilities of a model if they are in the catalog, without fetching them."""
+    return _capabilities.peek((provider, base_url, model))
+
+
+def clear_catalog():
+    _model_ids.clear()
+    _capabilities.clear()
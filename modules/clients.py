@@ -0,0 +1,294 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from modules.config import get_config
+
+# the client libraries are imported on first use, as importing them takes seconds and a lot of memory,
+# which would slow down the start of every page, even of those that don't need them
+if TYPE_CHECKING:
+    import ollama
+    import openai
+    from chromadb import Collection
+    from chromadb.api import ClientAPI
+    from langchain.chat_models import BaseChatModel
+    from langchain_chroma import Chroma
+    from langchain_core.embeddings import Embeddings
+
+T = TypeVar("T")
+
+# upper bound for the number of cached clients, e.g. for many combinations of sampling params
+MAX_CACHED_CLIENTS = 64
+
+_clients: "OrderedDict[Tuple[Hashable, ...], object]" = OrderedDict()
+_clients_lock = threading.Lock()
+# cache key -> lock held while its client is created, so that one client is created at a time per key
+_creation_locks: Dict[Tuple[Hashable, ...], threading.Lock] = {}
+# collection name -> (time of caching, collection handle, number of embeddings)
+_collections: Dict[str, Tuple[float, "Collection", Optional[int]]] = {}
+_collections_lock = threading.Lock()
+
+
+def hash_secret(secret: Optional[str]) -> str:
+    """Returns a short hash of a secret like an API key, so that it can be used in cache keys and logs."""
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _get_timeout(dependency: str, timeout: Optional[float]) -> float:
+    """Returns the given timeout or the configured one of the dependency ('openai', 'ollama' or 'chroma').
+
+    The timeouts are passed to the clients themselves, so that a hanging request is aborted
+    instead of keeping its connection (and the caller's rate limit slot) forever.
+    """
+    return timeout or get_config().get(f"resilience.timeouts.{dependency}")
+
+
+def _get_cached(key: Tuple[Hashable, ...]) -> Optional[object]:
+    # the caller holds _clients_lock
+    if key in _clients:
+        _clients.move_to_end(key)
+        return _clients[key]
+    return None
+
+
+def _get_or_create(key: Tuple[Hashable, ...], create: Callable[[], T]) -> T:
+    """Returns the cached client for the key or creates it. The least recently used client is evicted.
+
+    Creating a client may do network I/O, e.g. for Chroma, so it only holds the lock of its key and
+    doesn't block the lookups of other clients.
+    """
+    with _clients_lock:
+        client = _get_cached(key)
+        if client is not None:
+            return client
+        creation_lock = _creation_locks.setdefault(key, threading.Lock())
+    with creation_lock:
+        with _clients_lock:
+            # another thread may have created it meanwhile
+            client = _get_cached(key)
+        if client is not None:
+            return client
+        client = None
+        try:
+            client = create()
+        finally:
+            with _clients_lock:
+                _creation_locks.pop(key, None)
+                if client is not None:
+                    _clients[key] = client
+                    if len(_clients) > MAX_CACHED_CLIENTS:
+                        _clients.popitem(last=False)
+        return client
+
+
+def clear_client_cache():
+    with _clients_lock:
+        _clients.clear()
+    with _collections_lock:
+        _collections.clear()
+
+
+def get_openai_client(
+    api_key: str, base_url: str, timeout: Optional[float] = None
+) -> "openai.OpenAI":
+    """Returns a shared OpenAI client, whose connections are kept alive and reused.
+
+    Its requests time out after timeout seconds, by default the configured timeout of OpenAI.
+    """
+    import openai
+
+    timeout = _get_timeout("openai", timeout)
+    return _get_or_create(
+        ("openai-client", base_url, hash_secret(api_key), timeout),
+        lambda: openai.OpenAI(api_key=api_key, base_url=base_url, timeout=timeout),
+    )
+
+
+def get_ollama_client(host: str, timeout: Optional[float] = None) -> "ollama.Client":
+    """Returns a shared Ollama client, whose connections are kept alive and reused.
+
+    Its requests time out after timeout seconds, by default the configured timeout of Ollama.
+    """
+    import ollama
+
+    timeout = _get_timeout("ollama", timeout)
+    return _get_or_create(
+        ("ollama-client", host, timeout),
+        lambda: ollama.Client(host=host, timeout=timeout),
+    )
+
+
+def get_chat_model(
+    provider: str,
+    model: str,
+    temperature: float,
+    top_p: float,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+) -> "BaseChatModel":
+    """Returns a shared chat model for the provider ('OpenAI' or 'Ollama'), model and sampling params.
+
+    Creating the model once per combination instead of on every rerun of a page lets consecutive
+    questions reuse the HTTP connections (and TLS sessions) of the model's client.
+    """
+    key = (
+        "chat",
+        provider,
+        base_url,
+        hash_secret(api_key),
+        model,
+        temperature,
+        top_p,
+    )
+    if provider == "OpenAI":
+        from langchain_openai import ChatOpenAI
+
+        return _get_or_create(
+            key,
+            lambda: ChatOpenAI(
+                name=model,
+                api_key=api_key,
+                base_url=base_url,
+                temperature=temperature,
+                model=model,
+                top_p=top_p,
+                # rate limit headers are used to adapt the rate limiter
+                include_response_headers=True,
+                timeout=_get_timeout("openai", None),
+            ),
+        )
+    from langchain_ollama import ChatOllama
+
+    return _get_or_create(
+        key,
+        lambda: ChatOllama(
+            name=model,
+            model=model,
+            base_url=base_url,
+            temperature=temperature,
+            top_p=top_p,
+            client_kwargs={"timeout": _get_timeout("ollama", None)},
+        ),
+    )
+
+
+def get_embeddings(
+    provider: str,
+    model: str,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+) -> "Embeddings":
+    """Returns a shared embedding model for the provider ('OpenAI' or 'Ollama') and model."""
+    key = ("embeddings", provider, base_url, hash_secret(api_key), model)
+    if provider == "OpenAI":
+        from langchain_openai import OpenAIEmbeddings
+
+        return _get_or_create(
+            key,
+            lambda: OpenAIEmbeddings(
+                api_key=api_key,
+                base_url=base_url,
+                model=model,
+                timeout=_get_timeout("openai", None),
+            ),
+        )
+    from langchain_ollama import OllamaEmbeddings
+
+    return _get_or_create(
+        key,
+        lambda: OllamaEmbeddings(
+            model=model,
+            base_url=base_url,
+            client_kwargs={"timeout": _get_timeout("ollama", None)},
+        ),
+    )
+
+
+def get_chroma_client(
+    host: str,
+    port: int = 8000,
+    keepalive_secs: float = 40.0,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+) -> "ClientAPI":
+    """Returns a shared Chroma client. Its HTTP connection pool is configured with the given limits.
+
+    Its requests time out after the configured timeout of Chroma.
+    """
+    import chromadb
+    import httpx
+    from chromadb.config import Settings
+
+    def create():
+        client = chromadb.HttpClient(
+            host=host,
+            port=port,
+            settings=Settings(
+                allow_reset=True,
+                anonymized_telemetry=False,
+                chroma_http_keepalive_secs=keepalive_secs,
+                chroma_http_max_connections=max_connections,
+                chroma_http_max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+        # Chroma has no setting for it and creates its httpx session without a timeout. _server._session
+        # is private, it's checked to exist for the chromadb version pinned in requirements.txt (1.5.9)
+        # by tests/test_clients.py and has to be checked again when upgrading.
+        client._server._session.timeout = httpx.Timeout(_get_timeout("chroma", None))
+        return client
+
+    return _get_or_create(("chroma-client", host, port), create)
+
+
+def get_collection(
+    chroma_client: "ClientAPI", name: str, ttl: float = 60.0
+) -> "Collection":
+    """Returns the handle of a collection (incl. its metadata), cached for ttl seconds."""
+    with _collections_lock:
+        cached = _collections.get(name)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+    collection = chroma_client.get_collection(name=name)
+    with _collections_lock:
+        _collections[name] = (time.monotonic(), collection, None)
+    return collection
+
+
+def get_collection_count(collection: "Collection", ttl: float = 60.0) -> int:
+    """Returns the number of embeddings in a collection, cached for ttl seconds."""
+    with _collections_lock:
+        cached = _collections.get(collection.name)
+        if cached and cached[2] is not None and time.monotonic() - cached[0] < ttl:
+            return cached[2]
+    count = collection.count()
+    with _collections_lock:
+        _collections[collection.name] = (time.monotonic(), collection, count)
+    return count
+
+
+def get_vector_store(
+    chroma_client: "ClientAPI", collection_name: str, embeddings: "Embeddings"
+) -> "Chroma":
+    """Returns a shared LangChain vector store for a collection, so that it isn't looked up on every rerun."""
+    from langchain_chroma import Chroma
+
+    return _get_or_create(
+        ("vector-store", id(chroma_client), collection_name, id(embeddings)),
+        lambda: Chroma(
+            client=chroma_client,
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            create_collection_if_not_exists=False,
+        ),
+    )
+
+
+def invalidate_collection(name: str):
+    """Removes a collection from the caches, e.g. after it was deleted or embeddings were added to it."""
+    with _collections_lock:
+        _collections.pop(name, None)
+    with _clients_lock:
+        for key in [k for k in _clients if k[0] == "vector-store" and k[2] == name]:
+            del _clients[key]
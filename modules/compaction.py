@@ -0,0 +1,162 @@
+import logging
+import re
+from typing import List, Tuple
+
+from modules.segments import Segment, join_segments
+
+# annotations of auto-generated captions, e.g. [Music], [Applause], (laughter) or ♪
+ANNOTATION_PATTERN = re.compile(
+    r"\[[^\]]*\]|\((?:music|applause|laughter|laughs|inaudible|silence)\)|[♪♫]+",
+    flags=re.IGNORECASE,
+)
+FILLER_WORDS_PATTERN = re.compile(
+    r"\b(?:um+|uh+|uhm+|erm+|hmm+|mhm+)\b[,.]?", flags=re.IGNORECASE
+)
+SENTENCE_END_PATTERN = re.compile(r"[.!?…][\"')\]]*$")
+# longest word sequence that is checked for immediate repetition ("I think I think")
+MAX_REPEATED_NGRAM = 8
+# words that are repeated in grammatical sentences ("I had had enough", "said that that was"),
+# so a single repetition of them isn't dropped
+GRAMMATICAL_REPEATS = {
+    "had",
+    "that",
+    "is",
+    "was",
+    "do",
+    "does",
+    "very",
+    "really",
+    "bye",
+}
+# auto-generated captions often have no punctuation at all, so sentences are capped at this length
+MAX_SENTENCE_CHARS = 400
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _clean_text(text: str) -> str:
+    """Removes annotations and filler words and collapses whitespace."""
+    text = ANNOTATION_PATTERN.sub(" ", text)
+    text = FILLER_WORDS_PATTERN.sub(" ", text)
+    return " ".join(text.split())
+
+
+def _drop_repeated_ngrams(words: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Drops word sequences that immediately repeat the preceding sequence.
+
+    Each word is a tuple of the index of the segment it belongs to and the word itself. Single words
+    of GRAMMATICAL_REPEATS are kept.
+    """
+    kept: List[Tuple[int, str]] = []
+    normalized: List[str] = []
+    i = 0
+    while i < len(words):
+        for n in range(min(MAX_REPEATED_NGRAM, len(kept), len(words) - i), 0, -1):
+            candidate = [_normalize_word(w) for _, w in words[i : i + n]]
+            if n == 1 and candidate[0] in GRAMMATICAL_REPEATS:
+                continue
+            if any(candidate) and candidate == normalized[-n:]:
+                i += n
+                break
+        else:
+            kept.append(words[i])
+            normalized.append(_normalize_word(words[i][1]))
+            i += 1
+    return kept
+
+
+def compact_segments(
+    transcript_text: str, segments: List[Segment]
+) -> Tuple[str, List[Segment]]:
+    """Compacts a transcript deterministically, while keeping the timing of its segments.
+
+    Annotations like [Music] and filler words are removed, immediately repeated lines and word sequences are dropped
+    and the remaining segments are merged into sentences.
+
+    Args:
+        transcript_text (str): The text of the transcript.
+        segments (List[Segment]): The timed segments of the transcript.
+
+    Returns:
+        Tuple[str, List[Segment]]: The compacted text with one sentence per line and its segments.
+    """
+    texts = [
+        transcript_text[segment.offset : end]
+        for segment, end in zip(
+            segments, [s.offset for s in segments[1:]] + [len(transcript_text)]
+        )
+    ]
+
+    words = [
+        (index, word)
+        for index, text in enumerate(texts)
+        for word in _clean_text(text).split()
+    ]
+    segment_words: List[List[str]] = [[] for _ in segments]
+    for index, word in _drop_repeated_ngrams(words):
+        segment_words[index].append(word)
+
+    sentences: List[Tuple[float, float, str]] = []
+    sentence_start, sentence_end, sentence_words = None, None, []
+    for segment, seg_words in zip(segments, segment_words):
+        for word in seg_words:
+            if sentence_start is None:
+                sentence_start = segment.start
+            sentence_end = max(sentence_end or 0, segment.start + segment.duration)
+            sentence_words.append(word)
+            if SENTENCE_END_PATTERN.search(word) or (
+                sum(len(w) + 1 for w in sentence_words) > MAX_SENTENCE_CHARS
+            ):
+                sentences.append(
+                    (
+                        sentence_start,
+                        sentence_end - sentence_start,
+                        " ".join(sentence_words),
+                    )
+                )
+                sentence_start, sentence_end, sentence_words = None, None, []
+    if sentence_words:
+        sentences.append(
+            (sentence_start, sentence_end - sentence_start, " ".join(sentence_words))
+        )
+
+    return join_segments(sentences)
+
+
+def compact_transcript(transcript_text: str) -> str:
+    """Compacts a transcript without timing information, treating each line as a segment."""
+    text, segments = join_segments(
+        (0.0, 0.0, line) for line in transcript_text.split("\n")
+    )
+    compacted_text, _ = compact_segments(text, segments)
+    return compacted_text
+
+
+def compact(transcript_text: str, segments: List[Segment]) -> Tuple[str, List[Segment]]:
+    """Compacts a transcript with its timed segments or, if it has none, line by line without timing."""
+    if segments:
+        return compact_segments(transcript_text, segments)
+    return compact_transcript(transcript_text), []
+
+
+def format_token_reduction(original_token_num: int, compacted_token_num: int) -> str:
+    """Returns a human readable description of the token reduction, e.g. "25.0% (1200 -> 900 tokens)"."""
+    reduction = (
+        (original_token_num - compacted_token_num) / original_token_num * 100
+        if original_token_num
+        else 0.0
+    )
+    return f"{reduction:.1f}% ({original_token_num} -> {compacted_token_num} tokens)"
+
+
+def log_token_reduction(
+    yt_video_id: str, original_token_num: int, compacted_token_num: int
+):
+    """Logs the token reduction achieved by compacting the transcript of a video."""
+    logging.info(
+        "Compaction reduced the transcript of video %s by %s",
+        yt_video_id,
+        format_token_reduction(original_token_num, compacted_token_num),
+    )
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# config.json lives in the root of the repository, independent of the working directory of the process
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config.json"
+# prefix of environment variables overriding config values, levels are separated by '__',
+# e.g. YTGPT_CONFIG__HEALTH__INTERVAL=10 overrides 'health.interval'
+ENV_PREFIX = "YTGPT_CONFIG__"
+# how often (at most) the modification time of the file is checked
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+def _flatten(value: Any, prefix: str, flat: Dict[str, Any]):
+    """Adds the value and all its nested values to flat, keyed by their dot-separated path."""
+    if prefix:
+        flat[prefix] = value
+    if isinstance(value, dict):
+        for key, nested_value in value.items():
+            _flatten(nested_value, f"{prefix}.{key}" if prefix else key, flat)
+
+
+def _parse_override(raw: str, current: Any) -> Any:
+    """Parses the value of an environment variable into the type of the value it overrides."""
+    if isinstance(current, str):
+        return raw
+    if isinstance(current, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(current, int):
+        return int(raw)
+    if isinstance(current, float):
+        return float(raw)
+    # lists, objects and values that aren't in the file are given as JSON
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+
+
+def _match_key(section: Dict[str, Any], name: str) -> str:
+    """Returns the key of the section that matches the name of an environment variable case-insensitively.
+
+    Names that don't match any key are lowercased, like the keys of the file, e.g. 'RATE_LIMITS'
+    matches 'rate_limits' and 'OPENAI' matches 'OpenAI'.
+    """
+    for key in section:
+        if key.lower() == name.lower():
+            return key
+    return name.lower()
+
+
+class Config:
+    """The configuration of the app, loaded once per process from config.json.
+
+    All values are kept in a flat dictionary keyed by their dot-separated path, so that reading a value
+    is a dictionary lookup. The file is reloaded when its modification time changes, which is checked
+    at most once per RELOAD_CHECK_INTERVAL. Environment variables with the prefix ENV_PREFIX override
+    values of the file and are parsed into the type of the value they override.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CONFIG_PATH):
+        self.path = Path(path)
+        self._values: Dict[str, Any] = {}
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._reload_if_modified()
+
+    def get(self, key_path: str) -> Any:
+        """Returns the value at the key path, e.g. 'resilience.timeouts.openai'.
+
+        Raises:
+            KeyError: If the key path is not found in the configuration.
+        """
+        if time.monotonic() >= self._next_check:
+            self._reload_if_modified()
+        return self._values[key_path]
+
+    def _reload_if_modified(self):
+        """Loads the file if it was modified since it was loaded last.
+
+        If a modified file can't be read or parsed, e.g. because it's saved while being edited,
+        the error is logged and the previous values are kept until the file is modified again.
+        Only the first load of the file raises.
+        """
+        with self._lock:
+            self._next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+            mtime = self._mtime
+            try:
+                mtime = self.path.stat().st_mtime
+                if mtime == self._mtime:
+                    return
+                with open(self.path, "r", encoding="utf-8") as config_file:
+                    config = json.load(config_file)
+                self._apply_env_overrides(config)
+            except (OSError, ValueError) as e:
+                if self._mtime is None:
+                    raise
+                logging.error(
+                    "Could not reload the configuration from %s, keeping the previous one: %s",
+                    self.path,
+                    str(e),
+                )
+                # the file isn't read again before it's modified again
+                self._mtime = mtime
+                return
+            values: Dict[str, Any] = {}
+            _flatten(config, "", values)
+            if self._mtime is not None:
+                logging.info("Reloaded the configuration from %s.", self.path)
+            self._values = values
+            self._mtime = mtime
+
+    @staticmethod
+    def _apply_env_overrides(config: Dict[str, Any]):
+        for name, raw in os.environ.items():
+            if not name.startswith(ENV_PREFIX):
+                continue
+            *parents, key = name[len(ENV_PREFIX) :].split("__")
+            section = config
+            for parent in parents:
+                section = section.setdefault(_match_key(section, parent), {})
+            key = _match_key(section, key)
+            section[key] = _parse_override(raw, section.get(key))
+            logging.debug("Config value %s is overridden by %s.", key, name)
+
+
+_configs: Dict[Path, Config] = {}
+_configs_lock = threading.Lock()
+
+
+def get_config(path: Optional[str] = None) -> Config:
+    """Returns the process-wide configuration loaded from the given file, by default the config.json of the repo."""
+    resolved_path = Path(path).resolve() if path else DEFAULT_CONFIG_PATH
+    config = _configs.get(resolved_path)
+    if config is not None:
+        return config
+    with _configs_lock:
+        if resolved_path not in _configs:
+            _configs[resolved_path] = Config(resolved_path)
+        return _configs[resolved_path]
+
+
+def clear_config_cache():
+    """Forgets the loaded configurations, e.g. to apply changed environment variables."""
+    with _configs_lock:
+        _configs.clear()
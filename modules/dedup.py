@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import random
+import re
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+# number of words per shingle
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+@lru_cache
+def _permutations(num_perm: int) -> List[Tuple[int, int]]:
+    # seeded, so that signatures are comparable across processes
+    rng = random.Random(1)
+    return [
+        (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+        for _ in range(num_perm)
+    ]
+
+
+def minhash_signature(text: str, num_perm: int = 128) -> Tuple[int, ...]:
+    """Computes the MinHash signature of the word shingles of a text."""
+    hashes = [
+        int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big"
+        )
+        for shingle in _shingles(text)
+    ]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _permutations(num_perm)
+    )
+
+
+def estimate_similarity(signature: Sequence[int], other: Sequence[int]) -> float:
+    """Estimates the Jaccard similarity of two texts from their MinHash signatures."""
+    return sum(a == b for a, b in zip(signature, other)) / len(signature)
+
+
+def _lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Chooses the number of bands and rows per band with the highest LSH threshold at or below the given one.
+
+    Pairs with a similarity of s become candidates with probability 1 - (1 - s^rows)^bands,
+    which has its steepest increase around (1 / bands)^(1 / rows). A higher LSH threshold would
+    miss most pairs just above the given threshold, while false candidates are filtered out by
+    comparing their signatures.
+    """
+    options = [
+        (bands, num_perm // bands)
+        for bands in range(1, num_perm + 1)
+        if num_perm % bands == 0
+    ]
+    return max(
+        (p for p in options if (1 / p[0]) ** (1 / p[1]) <= threshold),
+        key=lambda p: (1 / p[0]) ** (1 / p[1]),
+        # a single row per band makes every pair that shares a hash a candidate
+        default=(num_perm, 1),
+    )
+
+
+def deduplicate_documents(
+    docs: List[Document], threshold: float = 0.8, num_perm: int = 128
+) -> Tuple[List[Document], Dict[int, int]]:
+    """Removes near-duplicate chunks using MinHash and locality-sensitive hashing (LSH).
+
+    The first occurrence of a chunk is kept as the canonical one. Its metadata records the number of
+    duplicates (alias_count) and, if the chunks carry time ranges, where they start (alias_starts).
+
+    Args:
+        docs (List[Document]): The chunks, e.g. the output of split_text_recursively.
+        threshold (float): The estimated Jaccard similarity above which chunks are considered duplicates.
+        num_perm (int): The number of permutations, i.e. the length of the MinHash signatures.
+
+    Returns:
+        Tuple[List[Document], Dict[int, int]]: The canonical chunks and a mapping of the index of each
+        duplicate chunk to the index of its canonical chunk (both indices refer to the input list).
+    """
+    bands, rows = _lsh_bands(num_perm, threshold)
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    signatures: List[Tuple[int, ...]] = []
+    aliases: Dict[int, int] = {}
+    canonical_indices: List[int] = []
+
+    for i, doc in enumerate(docs):
+        signature = minhash_signature(doc.page_content, num_perm)
+        signatures.append(signature)
+        band_keys = [
+            (band, signature[band * rows : (band + 1) * rows]) for band in range(bands)
+        ]
+        candidates = {c for key in band_keys for c in buckets.get(key, [])}
+        canonical = next(
+            (
+                c
+                for c in sorted(candidates)
+                if estimate_similarity(signature, signatures[c]) >= threshold
+            ),
+            None,
+        )
+        if canonical is not None:
+            aliases[i] = canonical
+            continue
+        canonical_indices.append(i)
+        for key in band_keys:
+            buckets.setdefault(key, []).append(i)
+
+    duplicates_of: Dict[int, List[int]] = {}
+    for duplicate, canonical in aliases.items():
+        duplicates_of.setdefault(canonical, []).append(duplicate)
+
+    canonical_docs = []
+    for i in canonical_indices:
+        doc = docs[i]
+        duplicates = duplicates_of.get(i, [])
+        if duplicates:
+            metadata = {**doc.metadata, "alias_count": len(duplicates)}
+            if "start" in doc.metadata:
+                metadata["alias_starts"] = ",".join(
+                    str(docs[j].metadata["start"]) for j in duplicates
+                )
+            doc = Document(page_content=doc.page_content, metadata=metadata)
+        canonical_docs.append(doc)
+
+    logging.info(
+        "Removed %d near-duplicate chunks out of %d (threshold %.2f).",
+        len(aliases),
+        len(docs),
+        threshold,
+    )
+    return canonical_docs, aliases
@@ -0,0 +1,172 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, Literal, Optional, Tuple
+
+from modules.helpers import get_config_value
+from modules.persistance import LibraryEntry, get_library_version, iter_library_entries
+
+ExportFormat = Literal["md", "jsonl", "zip"]
+
+# file extension, mime type and name of the export formats
+EXPORT_FORMATS: Dict[str, Tuple[str, str, str]] = {
+    "md": (".md", "text/markdown", "Markdown"),
+    "jsonl": (".jsonl", "application/x-ndjson", "JSON Lines"),
+    "zip": (".zip", "application/zip", "ZIP"),
+}
+
+# exports that are currently written, so that concurrent sessions don't write the same export twice
+_export_locks: Dict[str, threading.Lock] = {}
+_export_locks_lock = threading.Lock()
+
+
+def format_entry_as_markdown(entry: LibraryEntry) -> str:
+    """Formats a summary under the title of its video and an answer under its question."""
+    heading = (
+        f"## {entry.video.title}" if entry.entry_type == "S" else f"# {entry.question}"
+    )
+    return f"{heading}\n\n{entry.text}\n\n---"
+
+
+def write_markdown(entries: Iterable[LibraryEntry], file: IO[str]):
+    """Writes the entries as one markdown document, one entry at a time."""
+    for i, entry in enumerate(entries):
+        if i:
+            file.write("\n\n")
+        file.write(format_entry_as_markdown(entry))
+
+
+def write_jsonl(entries: Iterable[LibraryEntry], file: IO[str]):
+    """Writes the entries as JSON lines, one entry (with its video) per line."""
+    for entry in entries:
+        record = {
+            "id": entry.id,
+            "type": "summary" if entry.entry_type == "S" else "answer",
+            "question": entry.question,
+            "text": entry.text,
+            "saved_on": entry.saved_on.isoformat() if entry.saved_on else None,
+            "video": {
+                "yt_video_id": entry.video.yt_video_id,
+                "title": entry.video.title,
+                "channel": entry.video.channel,
+                "link": entry.video.link,
+            },
+        }
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _get_file_name(title: str) -> str:
+    """Removes characters that aren't allowed in file names (on any OS) from a title."""
+    return re.sub(r'[\\/:*?"<>|\n\r\t]+', "_", title).strip(" .")[:150] or "video"
+
+
+def write_zip(entries: Iterable[LibraryEntry], file: IO[bytes]):
+    """Writes a ZIP archive with one markdown file per video. The entries must be grouped by video."""
+    with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        current_video_id = None
+        member = None
+        for entry in entries:
+            if entry.video.id != current_video_id:
+                if member is not None:
+                    member.close()
+                current_video_id = entry.video.id
+                name = f"{_get_file_name(entry.video.title)} ({entry.video.yt_video_id}).md"
+                member = io.TextIOWrapper(archive.open(name, "w"), encoding="utf-8")
+            else:
+                member.write("\n\n")
+            member.write(format_entry_as_markdown(entry))
+        if member is not None:
+            member.close()
+
+
+def _write_export(export_format: ExportFormat, entries: Iterable[LibraryEntry], file):
+    if export_format == "zip":
+        write_zip(entries, file)
+        return
+    text_file = io.TextIOWrapper(file, encoding="utf-8")
+    if export_format == "md":
+        write_markdown(entries, text_file)
+    else:
+        write_jsonl(entries, text_file)
+    text_file.flush()
+    # the file is closed (and renamed) by the caller
+    text_file.detach()
+
+
+def _get_export_lock(name: str) -> threading.Lock:
+    with _export_locks_lock:
+        return _export_locks.setdefault(name, threading.Lock())
+
+
+def export_library(
+    entry_type: Literal["S", "A"],
+    export_format: ExportFormat,
+    channel: Optional[str] = None,
+    video_title: Optional[str] = None,
+) -> Path:
+    """Exports the library entries of a type to a file and returns its path.
+
+    The entries are streamed from the database into the file, so the memory used doesn't depend on
+    the size of the export. Exports are cached on disk by the version of the library, i.e. an export
+    is only written again after entries were saved or deleted. Older versions are removed.
+
+    Args:
+        entry_type (str): "S" for summaries or "A" for answers.
+        export_format (str): "md" for one markdown document, "jsonl" for JSON lines or "zip" for
+            a ZIP archive with one markdown file per video.
+        channel (Optional[str]): Only export entries of videos of this channel.
+        video_title (Optional[str]): Only export entries of the video with this title.
+    """
+    extension = EXPORT_FORMATS[export_format][0]
+    export_dir = Path(get_config_value("export.cache_dir"))
+    export_dir.mkdir(parents=True, exist_ok=True)
+    export_filter = json.dumps([entry_type, channel, video_title])
+    prefix = (
+        f"{entry_type}-{hashlib.sha256(export_filter.encode('utf-8')).hexdigest()[:16]}"
+    )
+    version = get_library_version(entry_type, channel=channel, video_title=video_title)
+    path = export_dir / f"{prefix}-{version}{extension}"
+
+    with _get_export_lock(path.name):
+        if path.exists():
+            return path
+        # written to a temporary file first, so that other processes never see a partial export
+        fd, tmp_path = tempfile.mkstemp(dir=export_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                _write_export(
+                    export_format,
+                    iter_library_entries(
+                        entry_type, channel=channel, video_title=video_title
+                    ),
+                    file,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    logging.info("Exported library entries to %s.", path)
+
+    for outdated in export_dir.glob(f"{prefix}-*{extension}"):
+        if outdated != path:
+            outdated.unlink(missing_ok=True)
+    return path
+
+
+def get_export_data(
+    entry_type: Literal["S", "A"],
+    export_format: ExportFormat,
+    channel: Optional[str] = None,
+    video_title: Optional[str] = None,
+) -> Callable[[], bytes]:
+    """Returns a callable for download buttons, which only exports the entries when the button is clicked."""
+    return lambda: export_library(
+        entry_type, export_format, channel=channel, video_title=video_title
+    ).read_bytes()
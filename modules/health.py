@@ -0,0 +1,264 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+
+from modules import catalog, clients
+from modules.helpers import (
+    filter_ollama_models,
+    get_chroma_client,
+    get_config_value,
+    get_ollama_host,
+    get_openai_base_url,
+)
+
+
+@dataclass
+class HealthStatus:
+    """The result of the latest probe of a provider or service."""
+
+    available: bool
+    checked_on: float
+    # models as listed by the provider, e.g. dicts for Ollama and ids for OpenAI
+    models: List = field(default_factory=list)
+    error: Optional[str] = None
+
+
+class HealthMonitor:
+    """Probes Chroma, Ollama and the OpenAI API keys in use on an interval in a background thread.
+
+    Pages read the latest status instead of checking the providers themselves, so a provider that is down
+    or slow doesn't block every rerun. The probes run in parallel and bypass the circuit breakers of
+    modules.resilience, so a provider that isn't used can't put the app into degraded mode. Ollama is only
+    probed if it's configured (probe_ollama) or was selected on a page. API keys that weren't used for
+    openai_key_ttl seconds are forgotten, and at most max_openai_keys (the most recently used ones) are probed.
+    """
+
+    def __init__(
+        self,
+        interval: float = 30.0,
+        timeout: float = 5.0,
+        openai_key_ttl: float = 3600.0,
+        max_openai_keys: int = 16,
+        probe_ollama: bool = False,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.openai_key_ttl = openai_key_ttl
+        self.max_openai_keys = max_openai_keys
+        self.probe_ollama = probe_ollama
+        self._statuses: Dict[str, HealthStatus] = {}
+        # hash of the API key -> (API key, time it was last used), least recently used first
+        self._openai_keys: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._probed = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="health-monitor", daemon=True
+            )
+        self._thread.start()
+
+    def refresh(self):
+        """Probes everything again right away, e.g. after an Ollama model was pulled."""
+        self._wake.set()
+
+    def watch_ollama(self):
+        """Adds Ollama to the providers that are probed, e.g. once it's selected. It's probed right away."""
+        with self._lock:
+            is_new = not self.probe_ollama
+            self.probe_ollama = True
+        if is_new:
+            self.refresh()
+
+    def watch_openai_key(self, api_key: str):
+        """Adds an API key to the keys that are probed or marks it as used. A new key is probed right away."""
+        key_hash = clients.hash_secret(api_key)
+        with self._lock:
+            is_new = key_hash not in self._openai_keys
+            self._openai_keys[key_hash] = (api_key, time.monotonic())
+            self._openai_keys.move_to_end(key_hash)
+            while len(self._openai_keys) > self.max_openai_keys:
+                self._forget_openai_key(next(iter(self._openai_keys)))
+        if is_new:
+            self.refresh()
+
+    def _forget_openai_key(self, key_hash: str):
+        # the caller holds the lock
+        del self._openai_keys[key_hash]
+        self._statuses.pop(f"openai:{key_hash}", None)
+
+    def _expire_openai_keys(self):
+        """Forgets the API keys that weren't used within the TTL, together with their statuses."""
+        with self._lock:
+            now = time.monotonic()
+            for key_hash, (_, last_used) in list(self._openai_keys.items()):
+                if now - last_used > self.openai_key_ttl:
+                    self._forget_openai_key(key_hash)
+
+    def get_status(self, name: str, wait: float = 0.0) -> Optional[HealthStatus]:
+        """Returns the latest status of a service, waiting up to wait seconds if it wasn't probed yet."""
+        deadline = time.monotonic() + wait
+        with self._probed:
+            while name not in self._statuses:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._probed.wait(remaining)
+            return self._statuses[name]
+
+    def probe_all(self):
+        """Probes the services in parallel, so that a slow one doesn't delay the status of the others."""
+        self._expire_openai_keys()
+        with self._lock:
+            openai_keys = {
+                key_hash: api_key
+                for key_hash, (api_key, _) in self._openai_keys.items()
+            }
+            probes = [("chroma", self._probe_chroma, lambda: True)]
+            if self.probe_ollama:
+                probes.append(("ollama", self._probe_ollama, lambda: True))
+        for key_hash, api_key in openai_keys.items():
+            probes.append(
+                (
+                    f"openai:{key_hash}",
+                    lambda api_key=api_key: self._probe_openai(api_key),
+                    # the key may have been forgotten while it was probed
+                    lambda key_hash=key_hash: key_hash in self._openai_keys,
+                )
+            )
+        threads = [
+            threading.Thread(
+                target=self._probe, args=probe, name=f"health-probe-{probe[0]}"
+            )
+            for probe in probes
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _probe(
+        self,
+        name: str,
+        probe: Callable[[], List],
+        publish: Callable[[], bool] = lambda: True,
+    ):
+        try:
+            status = HealthStatus(
+                available=True, checked_on=time.time(), models=probe()
+            )
+        except Exception as e:
+            status = HealthStatus(available=False, checked_on=time.time(), error=str(e))
+        with self._probed:
+            if not publish():
+                return
+            previous = self._statuses.get(name)
+            if previous and previous.available != status.available:
+                logging.info(
+                    "%s is %s.",
+                    name,
+                    "available again" if status.available else "unavailable",
+                )
+            self._statuses[name] = status
+            self._probed.notify_all()
+
+    def _probe_ollama(self) -> List[dict]:
+        host = get_ollama_host()
+        models = (
+            clients.get_ollama_client(host, timeout=self.timeout)
+            .list()
+            .get("models", [])
+        )
+        # keeps the model catalog fresh, so pages don't have to list the models themselves
+        catalog.update_models("Ollama", host, None, models)
+        return models
+
+    def _probe_chroma(self) -> List:
+        get_chroma_client().heartbeat()
+        return []
+
+    def _probe_openai(self, api_key: str) -> List[str]:
+        base_url = get_openai_base_url()
+        client = clients.get_openai_client(api_key, base_url, timeout=self.timeout)
+        model_ids = [model.id for model in client.models.list()]
+        catalog.update_models("OpenAI", base_url, api_key, model_ids)
+        return model_ids
+
+    def _run(self):
+        while True:
+            try:
+                self.probe_all()
+            except Exception as e:
+                logging.error("Health probe failed: %s", str(e))
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+_monitor: Optional[HealthMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """Returns the process-wide health monitor and starts it, if it isn't running yet."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor(
+                interval=get_config_value("health.interval"),
+                timeout=get_config_value("resilience.health_check_timeout"),
+                openai_key_ttl=get_config_value("health.openai_key_ttl"),
+                max_openai_keys=get_config_value("health.max_openai_keys"),
+                # otherwise Ollama is probed once a page selects it, see watch_ollama
+                probe_ollama="OLLAMA_HOST" in os.environ
+                or os.getenv("YTGPT_LLM_PROVIDER") == "Ollama",
+            )
+            _monitor.start()
+        return _monitor
+
+
+def _get_status(name: str) -> Optional[HealthStatus]:
+    # only the first page load of the process waits (briefly) for the first probe
+    return get_health_monitor().get_status(
+        name, wait=get_config_value("health.initial_wait")
+    )
+
+
+def is_ollama_ready() -> bool:
+    """Returns whether the Ollama server was reachable at the latest probe."""
+    get_health_monitor().watch_ollama()
+    status = _get_status("ollama")
+    return bool(status and status.available)
+
+
+def get_ollama_model_names(model_type: Literal["gpts", "embeddings"]) -> List[str]:
+    """Returns the Ollama models of the given type found at the latest probe."""
+    get_health_monitor().watch_ollama()
+    status = _get_status("ollama")
+    if not status or not status.available:
+        return []
+    return filter_ollama_models(status.models, model_type)
+
+
+def is_chroma_ready() -> bool:
+    """Returns whether the Chroma server was reachable at the latest probe."""
+    status = _get_status("chroma")
+    return bool(status and status.available)
+
+
+def is_openai_key_valid(api_key: str) -> bool:
+    """Returns whether the OpenAI API key was accepted at the latest probe.
+
+    Keys that couldn't be probed yet are assumed to be valid, so that the page isn't blocked.
+    """
+    get_health_monitor().watch_openai_key(api_key)
+    status = _get_status(f"openai:{clients.hash_secret(api_key)}")
+    return status is None or status.available
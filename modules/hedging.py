@@ -0,0 +1,289 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+from modules.helpers import get_config_value
+from modules.ratelimit import (
+    call_with_rate_limit,
+    estimate_tokens,
+    get_rate_limiter_for,
+)
+from modules.resilience import (
+    DependencyTimeoutError,
+    get_circuit_breaker,
+    get_dependency_for,
+)
+
+if TYPE_CHECKING:
+    from langchain.chat_models import BaseChatModel
+    from langchain_core.messages import BaseMessage
+
+
+class LatencyTracker:
+    """Keeps the most recent first-token latencies of a model to estimate its percentiles."""
+
+    def __init__(self, window: int = 200):
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Returns the latency below which the given percentage of the recorded latencies lie."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[index]
+
+
+_trackers: Dict[Tuple[str, str], LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+_stats = {"requests": 0, "hedged": 0, "secondary_wins": 0, "latency_saved": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _model_key(llm: "BaseChatModel") -> Tuple[str, str]:
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    return get_dependency_for(llm), model_name
+
+
+def get_latency_tracker(llm: "BaseChatModel") -> LatencyTracker:
+    """Returns the process-wide latency tracker of a chat model."""
+    key = _model_key(llm)
+    with _trackers_lock:
+        if key not in _trackers:
+            _trackers[key] = LatencyTracker(window=get_config_value("hedging.window"))
+        return _trackers[key]
+
+
+def get_hedge_delay(llm: "BaseChatModel") -> float:
+    """Returns how long to wait for the first token of a model before hedging.
+
+    It's the configured percentile (p95 by default) of the recent first-token latencies of the model,
+    or a default delay as long as there are too few samples.
+    """
+    tracker = get_latency_tracker(llm)
+    if len(tracker) < get_config_value("hedging.min_samples"):
+        return get_config_value("hedging.default_delay")
+    return tracker.percentile(get_config_value("hedging.percentile"))
+
+
+def _get_timeout(llm: "BaseChatModel") -> float:
+    """Returns the configured timeout of the provider of a chat model."""
+    return get_config_value(f"resilience.timeouts.{get_dependency_for(llm)}")
+
+
+def _stream_response(
+    name: str,
+    llm: "BaseChatModel",
+    messages: List["BaseMessage"],
+    events: queue.Queue,
+    cancelled: threading.Event,
+):
+    """Streams the response of a model and reports the time of its first token, its result or its error to the queue.
+
+    Once the first token has arrived, the stream is closed if the other request has already won.
+    A request can't be aborted before that, but it's not waited for either.
+    """
+    start = time.monotonic()
+
+    def consume():
+        chunks = []
+        stream = llm.stream(messages)
+        try:
+            for chunk in stream:
+                if not chunks:
+                    now = time.monotonic()
+                    get_latency_tracker(llm).record(now - start)
+                    events.put(("first_token", name, now))
+                    if cancelled.is_set():
+                        return None
+                chunks.append(chunk.content)
+        finally:
+            stream.close()
+        return "".join(chunks)
+
+    try:
+        content = call_with_rate_limit(
+            get_rate_limiter_for(llm),
+            lambda: get_circuit_breaker(get_dependency_for(llm)).call(consume),
+            tokens=estimate_tokens("".join(str(m.content) for m in messages)),
+        )
+    except Exception as e:
+        events.put(("error", name, e))
+    else:
+        events.put(("done", name, content))
+
+
+def _log_hedging_stats(hedged: bool, secondary_won: bool, latency_saved: float):
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["hedged"] += hedged
+        _stats["secondary_wins"] += secondary_won
+        _stats["latency_saved"] += latency_saved
+        logging.info(
+            "Hedged %d of %d requests (%.1f%%), the secondary model won %d times and saved %.2fs of first-token latency in total.",
+            _stats["hedged"],
+            _stats["requests"],
+            _stats["hedged"] / _stats["requests"] * 100,
+            _stats["secondary_wins"],
+            _stats["latency_saved"],
+        )
+
+
+def hedged_invoke(
+    primary: "BaseChatModel",
+    secondary: "BaseChatModel",
+    messages: List["BaseMessage"],
+    hedge_delay: Optional[float] = None,
+) -> str:
+    """Sends the messages to the primary model and hedges with the secondary model if the primary is slow.
+
+    If the first token of the primary model doesn't arrive within the hedge delay, or the primary model
+    fails before that, the same messages are sent to the secondary model. The model whose first token
+    arrives first wins and the stream of the other one is closed.
+
+    Args:
+        primary (BaseChatModel): The model to use normally.
+        secondary (BaseChatModel): The model (usually of another provider) to hedge with.
+        messages (List[BaseMessage]): The messages to send.
+        hedge_delay (Optional[float]): Seconds to wait for the first token of the primary model.
+            Defaults to the delay derived from its recent latencies, see get_hedge_delay.
+
+    Returns:
+        str: The content of the winning response.
+
+    Raises:
+        DependencyTimeoutError: If no response is complete within the configured timeout of its provider,
+            counted from the start of its request.
+    """
+    if hedge_delay is None:
+        hedge_delay = get_hedge_delay(primary)
+    events = queue.Queue()
+    models = {"primary": primary, "secondary": secondary}
+    cancelled = {name: threading.Event() for name in models}
+    # point in time after which a request is given up on, like a non-streamed call after its timeout
+    deadlines: Dict[str, float] = {}
+    start = time.monotonic()
+
+    def launch(name: str):
+        deadlines[name] = time.monotonic() + _get_timeout(models[name])
+        threading.Thread(
+            target=_stream_response,
+            args=(name, models[name], messages, events, cancelled[name]),
+            name=f"hedging-{name}",
+            daemon=True,
+        ).start()
+
+    launch("primary")
+    hedged = False
+    winner = None
+    first_tokens: Dict[str, float] = {}
+    errors: Dict[str, Exception] = {}
+
+    while True:
+        if winner:
+            timeout = deadlines[winner] - time.monotonic()
+        elif hedged:
+            timeout = max(
+                deadlines[name] - time.monotonic()
+                for name in deadlines
+                if name not in errors
+            )
+        else:
+            timeout = min(
+                hedge_delay - (time.monotonic() - start),
+                deadlines["primary"] - time.monotonic(),
+            )
+        try:
+            event, name, value = events.get(timeout=max(0.0, timeout))
+        except queue.Empty:
+            if hedged or winner:
+                for cancel in cancelled.values():
+                    cancel.set()
+                name = winner or "primary"
+                raise DependencyTimeoutError(
+                    get_dependency_for(models[name]), _get_timeout(models[name])
+                )
+            logging.info(
+                "No first token from the primary model after %.2fs, hedging.",
+                time.monotonic() - start,
+            )
+            hedged = True
+            launch("secondary")
+            continue
+
+        if event == "first_token":
+            first_tokens[name] = value
+            if winner is None:
+                winner = name
+                cancelled["secondary" if name == "primary" else "primary"].set()
+        elif event == "error":
+            errors[name] = value
+            if name == winner:
+                raise value
+            if not hedged:
+                logging.warning(
+                    "The primary model failed, failing over to the secondary model: %s",
+                    str(value),
+                )
+                hedged = True
+                launch("secondary")
+            elif len(errors) == len(models):
+                raise errors["primary"]
+        elif event == "done" and name == winner:
+            content = value
+            break
+
+    if winner == "secondary" and "primary" in first_tokens:
+        # the first token of the primary arrived while the secondary was completing its response
+        _log_hedging_stats(
+            True, True, max(0.0, first_tokens["primary"] - first_tokens["secondary"])
+        )
+    elif winner == "secondary" and "primary" not in errors:
+        # the primary request is still waiting for its first token, see how long it takes in the background
+        threading.Thread(
+            target=_log_latency_saved,
+            args=(events, first_tokens["secondary"], deadlines["primary"]),
+            name="hedging-stats",
+            daemon=True,
+        ).start()
+    else:
+        _log_hedging_stats(hedged, winner == "secondary", 0.0)
+    return content
+
+
+def _log_latency_saved(
+    events: queue.Queue, secondary_first_token: float, primary_deadline: float
+):
+    """Waits for the first token of the losing primary request to log how much latency the hedge saved.
+
+    If the primary request doesn't answer before its deadline, the time until the deadline is logged.
+    """
+    latency_saved = max(0.0, primary_deadline - secondary_first_token)
+    while True:
+        try:
+            event, name, value = events.get(
+                timeout=max(0.0, primary_deadline - time.monotonic())
+            )
+        except queue.Empty:
+            break
+        if name != "primary":
+            continue
+        if event == "first_token":
+            latency_saved = max(0.0, value - secondary_first_token)
+        elif event == "error":
+            latency_saved = 0.0
+        if event in ("first_token", "error"):
+            break
+    _log_hedging_stats(True, True, latency_saved)
@@ -3,13 +3,18 @@ import logging
 import os
 import re
 from pathlib import Path
-from typing import List, Literal, Optional
+from typing import TYPE_CHECKING, List, Literal, Optional
 
-import ollama
-import openai
 import streamlit as st
 import tiktoken
 
+from modules import catalog, clients
+from modules.config import get_config
+from modules.tokenizer import get_encoding
+
+if TYPE_CHECKING:
+    import openai
+
 
 def is_api_key_set() -> bool:
     """Checks whether the OpenAI API key is set in streamlit's session state or as environment variable."""
@@ -23,9 +28,9 @@ def get_openai_base_url() -> str:
     return os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 
 
-def get_openai_client(api_key: str = "") -> openai.OpenAI:
-    """Return an OpenAI client configured from environment variables."""
-    return openai.OpenAI(
+def get_openai_client(api_key: str = "") -> "openai.OpenAI":
+    """Return a shared OpenAI client configured from environment variables."""
+    return clients.get_openai_client(
         api_key=api_key or os.getenv("OPENAI_API_KEY"),
         base_url=get_openai_base_url(),
     )
@@ -42,6 +47,7 @@ def is_api_key_valid(api_key: str):
     Returns:
         bool: True if the API key is valid, False if the API key is invalid.
     """
+    import openai
 
     client = get_openai_client(api_key)
     try:
@@ -67,7 +73,7 @@ def get_available_models(
     model_type: Literal["gpts", "embeddings"], api_key: str = ""
 ) -> List[str]:
     """
-    Retrieve a list of available model IDs from OpenAI's API or environment variables, based on the specified model type.
+    Retrieve a list of available model IDs from OpenAI's API, based on the specified model type.
 
     When using the default OpenAI base URL, the list is filtered against configured selectable models.
     When using a non-default base URL, all available models are returned without filtering.
@@ -77,29 +83,32 @@ def get_available_models(
         api_key (str, optional): The API key for authenticating with OpenAI. Defaults to an empty string.
 
     Returns:
-        List[str]: A list of available model IDs matching the specified model type. The list is derived either from the environment variable `AVAILABLE_MODEL_IDS` if set, or from a call to OpenAI's API.
+        List[str]: A list of available model IDs matching the specified model type. The model IDs are kept in the
+        model catalog per base URL and API key and refreshed in the background once they are older than the configured TTL.
         If an authentication error or any other exception occurs during the API call, an empty list is returned.
     """
+    import openai
+
     supported_models = list(get_config_value(f"supported_models.{model_type}"))
     is_custom_base_url = get_openai_base_url() != "https://api.openai.com/v1"
 
     def _filter_available(models: List[str]) -> List[str]:
         return [m for m in supported_models if m in models]
 
-    if not api_key and not os.getenv("OPENAI_API_KEY"):
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
         return supported_models
 
-    # AVAILABLE_MODEL_IDS env var stores all the model IDs available to the user as a list (separated by a comma)
-    # the env var is set programatically below
-    available_model_ids = os.getenv("AVAILABLE_MODEL_IDS")
-    if available_model_ids:
-        models_list = available_model_ids.split(",")
-        return models_list if is_custom_base_url else _filter_available(models_list)
-
     try:
-        available_model_ids: list = [
-            model.id for model in get_openai_client(api_key).models.list()
-        ]
+        available_model_ids: list = catalog.get_models(
+            provider="OpenAI",
+            base_url=get_openai_base_url(),
+            credential=api_key,
+            fetch=lambda: [
+                model.id for model in get_openai_client(api_key).models.list()
+            ],
+            ttl=get_config_value("model_catalog.ttl"),
+        )
     except openai.AuthenticationError as e:
         logging.error(
             "An authentication error occurred when fetching available models: %s",
@@ -113,9 +122,6 @@ def get_available_models(
         )
         return []
     else:
-        # set the AVAILABLE_MODEL_IDS env var, so that the list of available models
-        # doesn't have to be fetched every time
-        os.environ["AVAILABLE_MODEL_IDS"] = ",".join(available_model_ids)
         return (
             available_model_ids
             if is_custom_base_url
@@ -125,13 +131,15 @@ def get_available_models(
 
 def get_config_value(
     key_path: str,
-    config_file_path: str = "./config.json",
+    config_file_path: Optional[str] = None,
 ) -> str:
     """
     Retrieves a configuration value from a JSON file using a specified key path.
 
+    The file is parsed once per process and reloaded when it changes, see modules.config.Config.
+
     Args:
-        config_file_path (str): A string representing the relative path to the JSON config file.
+        config_file_path (Optional[str]): Path to the JSON config file. Defaults to the config.json in the root of the repo.
 
         key_path (str): A string representing the path to the desired value within the nested JSON structure,
                         with each level separated by a '.' (e.g., "level1.level2.key").
@@ -144,15 +152,7 @@ def get_config_value(
     Raises:
         KeyError: If the specified key path is not found in the configuration.
     """
-    with open(config_file_path, "r", encoding="utf-8") as config_file:
-        config = json.load(config_file)
-
-        keys = key_path.split(".")
-        value = config
-        for key in keys:
-            value = value[key]  # Navigate through each level
-
-        return value
+    return get_config(config_file_path).get(key_path)
 
 
 def extract_youtube_video_id(url: str):
@@ -235,26 +235,36 @@ def get_preferred_languages():
     return ["en-US", "en", "de"]
 
 
-# TODO: handle Ollama models as well or fallback to other token count method
-def num_tokens_from_string(string: str, model: str = "gpt-4.1-nano") -> int:
+def num_tokens_from_string(
+    string: str, model: str = "gpt-4.1-nano", encoding_name: Optional[str] = None
+) -> int:
     """
     Returns the number of tokens in a text string for OpenAI models.
 
+    The encodings are read from the local tokenizer cache (see modules.tokenizer). If an encoding isn't
+    available, the number of tokens is estimated from the length of the string.
+
     Args:
         string (str): The string to count tokens in.
-        model (str): Name of the model. Default is 'gpt-4o-mini'
+        model (str): Name of the model. Default is 'gpt-4.1-nano'
+        encoding_name (Optional[str]): Name of the tiktoken encoding to use instead of the one of the model,
+            e.g. the tokenizer resolved by the capability registry.
 
     See https://cookbook.openai.com/examples/how_to_count_tokens_with_tiktoken
     """
 
-    try:
-        encoding_name = tiktoken.encoding_name_for_model(model_name=model)
-    except KeyError as e:
-        logging.error("Couldn't map %s to tokenizer: %s", model, str(e))
-        # workaround until https://github.com/openai/tiktoken/issues/395 is fixed
-        encoding_name = "o200k_base"
-
-    encoding = tiktoken.get_encoding(encoding_name)
+    if encoding_name is None:
+        try:
+            encoding_name = tiktoken.encoding_name_for_model(model_name=model)
+        except KeyError as e:
+            logging.error("Couldn't map %s to tokenizer: %s", model, str(e))
+            # workaround until https://github.com/openai/tiktoken/issues/395 is fixed
+            encoding_name = "o200k_base"
+
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        # the encoding couldn't be loaded, e.g. without network access and a cached BPE file
+        return len(string) // 4 + 1
     return len(encoding.encode(string))
 
 
@@ -268,6 +278,22 @@ def is_environment_prod():
     return False
 
 
+def get_chroma_host() -> str:
+    """Return the host of the ChromaDB server."""
+    return "chromadb" if is_environment_prod() else "localhost"
+
+
+def get_chroma_client():
+    """Return the shared client of the ChromaDB server, configured from the config file."""
+    return clients.get_chroma_client(
+        host=get_chroma_host(),
+        port=get_config_value("chroma.port"),
+        keepalive_secs=get_config_value("chroma.keepalive_secs"),
+        max_connections=get_config_value("chroma.max_connections"),
+        max_keepalive_connections=get_config_value("chroma.max_keepalive_connections"),
+    )
+
+
 def get_ollama_host() -> str:
     """Return the configured Ollama host."""
     return os.getenv("OLLAMA_HOST", "http://localhost:11434")
@@ -275,9 +301,19 @@ def get_ollama_host() -> str:
 
 def is_ollama_available(host: Optional[str] = None) -> bool:
     """Checks whether an Ollama server is reachable."""
+    # imported here, because the resilience module depends on this one
+    from modules.resilience import resilient_call
+
     ollama_host = host or get_ollama_host()
+    timeout = get_config_value("resilience.health_check_timeout")
     try:
-        ollama.Client(host=ollama_host).list()
+        # a health check should fail fast, so it's not retried
+        resilient_call(
+            "ollama",
+            lambda: clients.get_ollama_client(ollama_host, timeout=timeout).list(),
+            idempotent=False,
+            timeout=timeout,
+        )
     except Exception as e:
         logging.error("Ollama connection check failed: %s", str(e))
         return False
@@ -293,28 +329,57 @@ def _is_embedding_model(model: dict) -> bool:
     return "embed" in family or "embedding" in model_type or "embed" in name
 
 
+def filter_ollama_models(
+    models: List[dict], model_type: Literal["gpts", "embeddings"]
+) -> List[str]:
+    """Returns the names of the Ollama models (as listed by the Ollama API) of the given type."""
+    if model_type == "embeddings":
+        return [model["model"] for model in models if _is_embedding_model(model)]
+    return [model["model"] for model in models if not _is_embedding_model(model)]
+
+
 def get_ollama_models(
     model_type: Literal["gpts", "embeddings"], host: Optional[str] = None
 ) -> List[str]:
     """Returns available Ollama models filtered by type."""
+    from modules.resilience import resilient_call
+
     ollama_host = host or get_ollama_host()
+    timeout = get_config_value("resilience.health_check_timeout")
     try:
-        models = ollama.Client(host=ollama_host).list().get("models", [])
+        models = catalog.get_models(
+            provider="Ollama",
+            base_url=ollama_host,
+            credential=None,
+            fetch=lambda: resilient_call(
+                "ollama",
+                lambda: clients.get_ollama_client(ollama_host, timeout=timeout).list(),
+                timeout=timeout,
+            ).get("models", []),
+            ttl=get_config_value("model_catalog.ttl"),
+        )
     except Exception as e:
         logging.error("Could not list Ollama models: %s", str(e))
         return []
 
-    if model_type == "embeddings":
-        return [model["model"] for model in models if _is_embedding_model(model)]
-    return [model["model"] for model in models if not _is_embedding_model(model)]
+    return filter_ollama_models(models, model_type)
 
 
 def pull_ollama_model(model_name: str, host: Optional[str] = None) -> bool:
-    """Triggers pulling an Ollama model; returns True on success."""
+    """Triggers pulling an Ollama model; returns True on success.
+
+    Without streaming, the server only answers once the model is downloaded, so the pull has its own,
+    much longer timeout than other requests to Ollama.
+    """
     ollama_host = host or get_ollama_host()
+    timeout = get_config_value("resilience.timeouts.ollama_pull")
     try:
-        ollama.Client(host=ollama_host).pull(model=model_name, stream=False)
+        clients.get_ollama_client(ollama_host, timeout=timeout).pull(
+            model=model_name, stream=False
+        )
     except Exception as e:
         logging.error("Failed to pull Ollama model %s: %s", model_name, str(e))
         return False
+    # the models of the host are listed again on the next access
+    catalog.invalidate_models(provider="Ollama", base_url=ollama_host, credential=None)
     return True
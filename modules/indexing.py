@@ -0,0 +1,274 @@
+import logging
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+import randomname
+from langchain_core.embeddings import Embeddings
+
+from modules.clients import invalidate_collection
+from modules.compaction import compact
+from modules.dedup import deduplicate_documents
+from modules.helpers import get_config_value, num_tokens_from_string
+from modules.persistance import SQL_DB, Transcript, Video
+from modules.rag import embed_excerpts, split_text_recursively
+from modules.segments import Segment, pack_segments
+
+if TYPE_CHECKING:
+    from chromadb.api import ClientAPI
+
+# background upgrades that are currently running, keyed by the YouTube video id
+_running_upgrades: Dict[str, threading.Thread] = {}
+_running_upgrades_lock = threading.Lock()
+
+
+def split_into_excerpts(
+    transcript_text: str, chunk_size: int, segments: Optional[List[Segment]] = None
+):
+    """Splits a transcript into excerpts by tokens and removes near-duplicate excerpts, if enabled in the config."""
+    excerpts = split_text_recursively(
+        transcript_text=transcript_text,
+        chunk_size=chunk_size,
+        len_func="tokens",
+        segments=segments,
+    )
+    if get_config_value("deduplication.enabled"):
+        excerpts, _ = deduplicate_documents(
+            excerpts,
+            threshold=get_config_value("deduplication.similarity_threshold"),
+            num_perm=get_config_value("deduplication.num_permutations"),
+        )
+    return excerpts
+
+
+def is_upgrade_running(yt_video_id: str) -> bool:
+    """Returns True if the index of the video is currently being upgraded in the background."""
+    with _running_upgrades_lock:
+        thread = _running_upgrades.get(yt_video_id)
+        return thread is not None and thread.is_alive()
+
+
+def upgrade_index_with_whisper(
+    chroma_client: "ClientAPI",
+    video: Video,
+    transcribe: Callable[[], Tuple[str, List[Segment]]],
+    chunk_size: int,
+    embeddings: Embeddings,
+    collection_metadata: dict,
+    compacted: bool = False,
+):
+    """Re-indexes a video from a Whisper transcription and swaps it in for the current index.
+
+    The new collection is fully embedded before the transcript row is pointed at it, so queries
+    keep being answered from the caption-based index until the swap. The old collection is deleted afterwards.
+    If the captions were compacted, the transcription is compacted as well and stored next to it.
+
+    Args:
+        chroma_client (ClientAPI): The ChromaDB client.
+        video (Video): The video whose index is upgraded.
+        transcribe (Callable[[], Tuple[str, List[Segment]]]): Returns the Whisper transcription of the video and its segments.
+        chunk_size (int): The chunk size used to split the transcription.
+        embeddings (Embeddings): The embedding model used to embed the excerpts.
+        collection_metadata (dict): Metadata of the new collection.
+        compacted (bool): Whether the current index was built from the compacted captions.
+    """
+    opened_connection = SQL_DB.connect(reuse_if_open=True)
+    new_collection = None
+    old_collection_name = None
+    try:
+        whisper_transcript, whisper_segments = transcribe()
+        indexed_text, indexed_segments = whisper_transcript, whisper_segments
+        if compacted:
+            indexed_text, indexed_segments = compact(
+                whisper_transcript, whisper_segments
+            )
+        excerpts = split_into_excerpts(
+            transcript_text=indexed_text,
+            chunk_size=chunk_size,
+            segments=indexed_segments,
+        )
+        new_collection = chroma_client.create_collection(
+            name=randomname.get_name(), metadata=collection_metadata
+        )
+        embed_excerpts(
+            collection=new_collection, excerpts=excerpts, embeddings=embeddings
+        )
+
+        with SQL_DB.atomic():
+            transcript = Transcript.get(Transcript.video == video)
+            old_collection_name = transcript.chroma_collection_name
+            Transcript.update(
+                {
+                    Transcript.preprocessed: True,
+                    Transcript.chroma_collection_id: new_collection.id,
+                    Transcript.chroma_collection_name: new_collection.name,
+                    Transcript.text: whisper_transcript,
+                    Transcript.segments: (
+                        pack_segments(whisper_segments) if whisper_segments else None
+                    ),
+                    # the compacted captions don't match the new text anymore
+                    Transcript.compacted_text: indexed_text if compacted else None,
+                    Transcript.compacted_segments: (
+                        pack_segments(indexed_segments)
+                        if compacted and indexed_segments
+                        else None
+                    ),
+                    Transcript.processed_token_num: num_tokens_from_string(
+                        indexed_text
+                    ),
+                }
+            ).where(Transcript.id == transcript.id).execute()
+        logging.info(
+            "Swapped index of video %s from collection '%s' to '%s'.",
+            video.yt_video_id,
+            old_collection_name,
+            new_collection.name,
+        )
+    except Exception as e:
+        logging.error(
+            "Upgrading the index of video %s failed: %s",
+            video.yt_video_id,
+            str(e),
+            exc_info=True,
+        )
+        if new_collection is not None:
+            try:
+                chroma_client.delete_collection(name=new_collection.name)
+            except Exception as e:
+                logging.error(
+                    "Could not remove collection '%s': %s", new_collection.name, str(e)
+                )
+        return
+    finally:
+        if opened_connection:
+            SQL_DB.close()
+
+    if old_collection_name:
+        try:
+            chroma_client.delete_collection(name=old_collection_name)
+            invalidate_collection(old_collection_name)
+        except Exception as e:
+            logging.error(
+                "Could not remove replaced collection '%s': %s",
+                old_collection_name,
+                str(e),
+            )
+
+
+def rechunk_transcript(transcript: Transcript, chunk_size: int):
+    """Splits the stored (compacted) text of a transcript into chunks of another size, without fetching it again.
+
+    Returns an empty list if the transcript text wasn't stored.
+    """
+    compacted = bool(transcript.compacted_text)
+    transcript_text = transcript.compacted_text if compacted else transcript.text
+    if not transcript_text:
+        return []
+    return split_into_excerpts(
+        transcript_text=transcript_text,
+        chunk_size=chunk_size,
+        segments=transcript.get_segments(compacted=compacted),
+    )
+
+
+def rechunk_index(
+    chroma_client: "ClientAPI",
+    video: Video,
+    chunk_size: int,
+    embeddings: Embeddings,
+    collection_metadata: dict,
+) -> bool:
+    """Re-indexes a video at another chunk size from its stored transcript and swaps it in for the current index.
+
+    The transcript isn't fetched again, only the new chunks are embedded. Like upgrade_index_with_whisper,
+    the new collection is fully embedded before the transcript row is pointed at it, and the old collection
+    is deleted afterwards. Errors are raised to the caller.
+
+    Args:
+        chroma_client (ClientAPI): The ChromaDB client.
+        video (Video): The video to re-index.
+        chunk_size (int): The new chunk size.
+        embeddings (Embeddings): The embedding model of the current index.
+        collection_metadata (dict): Metadata of the current collection, its chunk size is replaced.
+
+    Returns:
+        bool: False if the text of the transcript wasn't stored, so it can't be re-chunked.
+    """
+    transcript = Transcript.get(Transcript.video == video)
+    excerpts = rechunk_transcript(transcript, chunk_size)
+    if not excerpts:
+        return False
+    new_collection = chroma_client.create_collection(
+        name=randomname.get_name(),
+        metadata={**collection_metadata, "chunk_size": chunk_size},
+    )
+    try:
+        embed_excerpts(
+            collection=new_collection, excerpts=excerpts, embeddings=embeddings
+        )
+        Transcript.update(
+            {
+                Transcript.chunk_size: chunk_size,
+                Transcript.chroma_collection_id: new_collection.id,
+                Transcript.chroma_collection_name: new_collection.name,
+            }
+        ).where(Transcript.id == transcript.id).execute()
+    except Exception:
+        chroma_client.delete_collection(name=new_collection.name)
+        raise
+    logging.info(
+        "Re-chunked video %s to chunk size %d in collection '%s'.",
+        video.yt_video_id,
+        chunk_size,
+        new_collection.name,
+    )
+
+    old_collection_name = transcript.chroma_collection_name
+    if old_collection_name:
+        try:
+            chroma_client.delete_collection(name=old_collection_name)
+            invalidate_collection(old_collection_name)
+        except Exception as e:
+            # the collection is an orphan then, which is removed by modules.maintenance
+            logging.error(
+                "Could not remove replaced collection '%s': %s",
+                old_collection_name,
+                str(e),
+            )
+    return True
+
+
+def start_index_upgrade(
+    chroma_client: "ClientAPI",
+    video: Video,
+    transcribe: Callable[[], Tuple[str, List[Segment]]],
+    chunk_size: int,
+    embeddings: Embeddings,
+    collection_metadata: dict,
+    compacted: bool = False,
+) -> bool:
+    """Starts upgrading the index of a video in a background thread.
+
+    Returns False if an upgrade for the video is already running, True otherwise.
+    """
+    with _running_upgrades_lock:
+        running = _running_upgrades.get(video.yt_video_id)
+        if running is not None and running.is_alive():
+            return False
+        thread = threading.Thread(
+            target=upgrade_index_with_whisper,
+            kwargs={
+                "chroma_client": chroma_client,
+                "video": video,
+                "transcribe": transcribe,
+                "chunk_size": chunk_size,
+                "embeddings": embeddings,
+                "collection_metadata": collection_metadata,
+                "compacted": compacted,
+            },
+            name=f"index-upgrade-{video.yt_video_id}",
+            daemon=True,
+        )
+        _running_upgrades[video.yt_video_id] = thread
+        thread.start()
+    logging.info("Started background index upgrade for video %s.", video.yt_video_id)
+    return True
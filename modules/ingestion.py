@@ -0,0 +1,315 @@
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import randomname
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from modules.helpers import extract_youtube_video_id, num_tokens_from_string
+from modules.indexing import split_into_excerpts
+from modules.persistance import (
+    SQL_DB,
+    IngestionJob,
+    Transcript,
+    Video,
+    fail_stale_ingestion_jobs,
+    get_or_create_video,
+    update_ingestion_job,
+)
+from modules.rag import embed_excerpts
+from modules.segments import Segment
+from modules.youtube import (
+    InvalidUrlException,
+    NoTranscriptReceivedException,
+    fetch_youtube_transcript_segments,
+    get_video_metadata,
+)
+
+if TYPE_CHECKING:
+    from chromadb.api import ClientAPI
+
+STAGES = ["metadata", "transcript", "splitting", "embedding"]
+# errors for which retrying won't help
+NON_RETRYABLE_ERRORS = (InvalidUrlException, NoTranscriptReceivedException)
+# base delay in seconds before retrying a failed stage, doubled with every attempt
+RETRY_BASE_DELAY = 1.0
+
+
+class SkipVideo(Exception):
+    """Raised by a stage if the video doesn't need to be processed (any further)."""
+
+
+@dataclass
+class _WorkItem:
+    job_id: int
+    url: str
+    video: Optional[Video] = None
+    transcript_text: str = ""
+    segments: List[Segment] = field(default_factory=list)
+    excerpts: List[Document] = field(default_factory=list)
+
+
+def resolve_video_urls(sources: List[str]) -> List[str]:
+    """Resolves URLs of videos, playlists and channels as well as playlist ids to a list of video URLs.
+
+    Duplicates are removed, the order is preserved.
+    """
+    from pytubefix import Channel, Playlist
+
+    video_urls = []
+    for source in (s.strip() for s in sources):
+        if not source:
+            continue
+        if "list=" in source or source.startswith(("PL", "UU", "OL", "FL")):
+            playlist_url = (
+                source
+                if "list=" in source
+                else f"https://www.youtube.com/playlist?list={source}"
+            )
+            video_urls.extend(Playlist(playlist_url).video_urls)
+        elif any(part in source for part in ("/@", "/channel/", "/c/", "/user/")):
+            video_urls.extend(video.watch_url for video in Channel(source).videos)
+        else:
+            video_urls.append(source)
+    return list(dict.fromkeys(video_urls))
+
+
+class IngestionPipeline:
+    """Processes many videos with bounded, concurrent stages.
+
+    Each stage (metadata, transcript, splitting, embedding) has its own worker threads. The stages are
+    connected by bounded queues, so a slow stage (usually embedding) blocks the stages before it instead
+    of letting work pile up in memory. Failed stages are retried with exponential backoff.
+    The progress of each video is persisted in the IngestionJob table. Jobs that were left running
+    for stale_after seconds, e.g. by a restart of the app, are marked as failed when a batch is run.
+    """
+
+    def __init__(
+        self,
+        chroma_client: "ClientAPI",
+        embeddings: Embeddings,
+        embeddings_model: str,
+        embeddings_provider: str,
+        chunk_size: int,
+        workers: Dict[str, int],
+        queue_size: int = 16,
+        max_attempts: int = 3,
+        stale_after: float = 3600.0,
+    ):
+        self.chroma_client = chroma_client
+        self.embeddings = embeddings
+        self.embeddings_model = embeddings_model
+        self.embeddings_provider = embeddings_provider
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        # one queue in front of each stage
+        self._queues = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES}
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, urls: List[str]) -> str:
+        """Creates an ingestion job for each URL. Returns the id of the batch."""
+        batch_id = uuid.uuid4().hex
+        with SQL_DB.atomic():
+            for url in urls:
+                IngestionJob.create(
+                    batch_id=batch_id, url=url, updated_on=datetime.now()
+                )
+        logging.info("Submitted batch %s with %d videos.", batch_id, len(urls))
+        return batch_id
+
+    def run(self, batch_id: str):
+        """Processes all queued videos of the batch and blocks until they are done."""
+        for stage_index, stage in enumerate(STAGES):
+            for i in range(max(1, self.workers.get(stage, 1))):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage_index,),
+                    name=f"ingestion-{stage}-{i}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        opened_connection = SQL_DB.connect(reuse_if_open=True)
+        try:
+            stale_jobs = fail_stale_ingestion_jobs(
+                datetime.now() - timedelta(seconds=self.stale_after)
+            )
+            if stale_jobs:
+                logging.warning("Marked %d stale ingestion jobs as failed.", stale_jobs)
+            jobs = list(
+                IngestionJob.select(IngestionJob.id, IngestionJob.url).where(
+                    IngestionJob.batch_id == batch_id,
+                    IngestionJob.status == "queued",
+                )
+            )
+        finally:
+            if opened_connection:
+                SQL_DB.close()
+        for job in jobs:
+            # blocks while the first stage is busy
+            self._queues[STAGES[0]].put(_WorkItem(job_id=job.id, url=job.url))
+
+        # shut the stages down one after another, so that every item is passed through
+        for stage in STAGES:
+            stage_workers = [
+                t for t in self._threads if t.name.startswith(f"ingestion-{stage}-")
+            ]
+            for _ in stage_workers:
+                self._queues[stage].put(None)
+            for thread in stage_workers:
+                thread.join()
+        logging.info("Finished batch %s.", batch_id)
+
+    def start(self, batch_id: str) -> threading.Thread:
+        """Processes the batch in a background thread."""
+        thread = threading.Thread(
+            target=self.run, args=(batch_id,), name=f"ingestion-{batch_id}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _work(self, stage_index: int):
+        stage = STAGES[stage_index]
+        handler = getattr(self, f"_{stage}")
+        opened_connection = SQL_DB.connect(reuse_if_open=True)
+        try:
+            while True:
+                item = self._queues[stage].get()
+                if item is None:
+                    break
+                # an unexpected error, e.g. of the database, fails the item but not the worker,
+                # because the stages before it would block once all workers of the stage are gone
+                try:
+                    if not self._process(item, stage, handler):
+                        continue
+                    if stage_index + 1 == len(STAGES):
+                        update_ingestion_job(item.job_id, status="done", error=None)
+                        continue
+                except Exception as e:
+                    logging.error("Stage %s failed for %s: %s", stage, item.url, str(e))
+                    self._fail(item, str(e))
+                    continue
+                # blocks while the next stage is busy (backpressure)
+                self._queues[STAGES[stage_index + 1]].put(item)
+        finally:
+            if opened_connection:
+                SQL_DB.close()
+
+    def _fail(self, item: _WorkItem, error: str):
+        try:
+            update_ingestion_job(item.job_id, status="failed", error=error)
+        except Exception as e:
+            # the job is marked as failed once it's stale, see fail_stale_ingestion_jobs
+            logging.error(
+                "Could not mark ingestion job %d as failed: %s", item.job_id, e
+            )
+
+    def _process(self, item: _WorkItem, stage: str, handler) -> bool:
+        """Runs a stage for an item with retries. Returns True if the item should be passed on.
+
+        Updating the status of the job is retried like the stage, e.g. if the database is locked.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                update_ingestion_job(
+                    item.job_id, status="running", stage=stage, attempts=attempt
+                )
+                handler(item)
+            except SkipVideo as e:
+                update_ingestion_job(item.job_id, status="skipped", error=str(e))
+                return False
+            except NON_RETRYABLE_ERRORS as e:
+                update_ingestion_job(item.job_id, status="failed", error=e.message)
+                return False
+            except Exception as e:
+                logging.warning(
+                    "Stage %s failed for %s (attempt %d/%d): %s",
+                    stage,
+                    item.url,
+                    attempt,
+                    self.max_attempts,
+                    str(e),
+                )
+                if attempt == self.max_attempts:
+                    update_ingestion_job(item.job_id, status="failed", error=str(e))
+                    return False
+                # exponential backoff with jitter
+                time.sleep(
+                    RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                )
+            else:
+                return True
+        return False
+
+    def _metadata(self, item: _WorkItem):
+        yt_video_id = extract_youtube_video_id(item.url)
+        if yt_video_id is None:
+            raise InvalidUrlException("Not a valid YouTube video URL.", item.url)
+        existing = Video.get_or_none(Video.yt_video_id == yt_video_id)
+        if existing and existing.transcripts.count() != 0:
+            update_ingestion_job(item.job_id, video=existing)
+            raise SkipVideo("The video has already been processed.")
+        video_metadata = get_video_metadata(item.url)
+        if video_metadata is None:
+            raise RuntimeError("Could not retrieve the metadata of the video.")
+        item.video, _ = get_or_create_video(
+            yt_video_id=yt_video_id,
+            link=item.url,
+            title=video_metadata["name"],
+            channel=video_metadata["channel"],
+            saved_on=datetime.now(),
+        )
+        update_ingestion_job(item.job_id, video=item.video)
+
+    def _transcript(self, item: _WorkItem):
+        item.transcript_text, item.segments = fetch_youtube_transcript_segments(
+            item.url
+        )
+
+    def _splitting(self, item: _WorkItem):
+        item.excerpts = split_into_excerpts(
+            transcript_text=item.transcript_text,
+            chunk_size=self.chunk_size,
+            segments=item.segments,
+        )
+
+    def _embedding(self, item: _WorkItem):
+        collection = self.chroma_client.create_collection(
+            name=randomname.get_name(),
+            metadata={
+                "yt_video_title": item.video.title,
+                "chunk_size": self.chunk_size,
+                "embeddings_model": self.embeddings_model,
+                "embeddings_provider": self.embeddings_provider,
+            },
+        )
+        try:
+            embed_excerpts(
+                collection=collection,
+                excerpts=item.excerpts,
+                embeddings=self.embeddings,
+            )
+            transcript = Transcript(
+                video=item.video,
+                text=item.transcript_text,
+                preprocessed=False,
+                chunk_size=self.chunk_size,
+                original_token_num=num_tokens_from_string(item.transcript_text),
+                chroma_collection_id=collection.id,
+                chroma_collection_name=collection.name,
+            )
+            transcript.set_segments(item.segments)
+            transcript.save()
+        except Exception:
+            self.chroma_client.delete_collection(name=collection.name)
+            raise
@@ -0,0 +1,414 @@
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+
+from modules import clients
+from modules.health import get_ollama_model_names
+from modules.helpers import get_config_value, get_ollama_host, get_openai_base_url
+from modules.persistance import (
+    SQL_DB,
+    LibraryEmbedding,
+    LibraryEntry,
+    Video,
+    get_library_entries_by_id,
+)
+from modules.ratelimit import (
+    call_with_rate_limit,
+    estimate_tokens,
+    get_rate_limiter_for,
+)
+from modules.resilience import get_dependency_for, resilient_call
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+# longer texts are cut off before embedding, the beginning of a summary or answer says what it's about
+MAX_EMBEDDED_CHARS = 8000
+
+
+def get_library_embeddings(
+    provider: str, api_key: Optional[str] = None
+) -> Optional["Embeddings"]:
+    """Returns the embedding model of the semantic index of the provider ('OpenAI' or 'Ollama').
+
+    The model is configured per provider and independent of the model chosen for chatting with a video,
+    so that all entries end up in the same index. Returns None if no API key is given for OpenAI
+    or the model isn't pulled in Ollama.
+    """
+    model = get_config_value(f"library.embeddings.{provider}")
+    if provider == "OpenAI":
+        if not api_key:
+            return None
+        return clients.get_embeddings(
+            provider, model, api_key=api_key, base_url=get_openai_base_url()
+        )
+    if model not in get_ollama_model_names(model_type="embeddings"):
+        return None
+    return clients.get_embeddings(provider, model, base_url=get_ollama_host())
+
+
+def get_index_key(embeddings: "Embeddings") -> Tuple[str, str]:
+    """Returns the provider and name of an embedding model, which identify its index."""
+    provider = "OpenAI" if get_dependency_for(embeddings) == "openai" else "Ollama"
+    return provider, getattr(embeddings, "model", "")
+
+
+def _text_to_embed(entry: LibraryEntry) -> str:
+    parts = [entry.video.title, entry.question, entry.text]
+    return "\n\n".join(part for part in parts if part)[:MAX_EMBEDDED_CHARS]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scales the vectors to unit length, so that their dot product is their cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class LibraryIndex:
+    """The normalized embeddings of the library entries for one embedding model, as one matrix in memory.
+
+    The matrix is loaded from the database on the first search and only rows that were added since are
+    loaded on later searches, so saving an entry (in any process) never reloads the whole index.
+    It's only reloaded after entries were deleted. Searching is a single matrix-vector product.
+    """
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._entry_ids = np.zeros(0, dtype=np.int64)
+        self._entry_types = np.zeros(0, dtype="<U1")
+        self._size = 0
+        # entry id -> row in the matrix, to replace the vector of an entry that is embedded again
+        self._rows: Dict[int, int] = {}
+        # id of the last LibraryEmbedding row that was loaded
+        self._last_loaded_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def refresh(self):
+        """Loads the embeddings that were stored since the last refresh."""
+        with self._lock:
+            self._load_new_rows()
+            stored = (
+                LibraryEmbedding.select()
+                .where(
+                    LibraryEmbedding.provider == self.provider,
+                    LibraryEmbedding.model == self.model,
+                )
+                .count()
+            )
+            if stored != self._size:
+                # entries were deleted since the last refresh
+                self._clear()
+                self._load_new_rows()
+
+    def _clear(self):
+        self._size = 0
+        self._rows.clear()
+        self._last_loaded_id = 0
+
+    def _load_new_rows(self):
+        rows = list(
+            LibraryEmbedding.select(
+                LibraryEmbedding.id,
+                LibraryEmbedding.entry,
+                LibraryEmbedding.vector,
+                LibraryEntry.entry_type,
+            )
+            .join(LibraryEntry)
+            .where(
+                LibraryEmbedding.provider == self.provider,
+                LibraryEmbedding.model == self.model,
+                LibraryEmbedding.id > self._last_loaded_id,
+            )
+            .order_by(LibraryEmbedding.id)
+            .tuples()
+        )
+        if not rows:
+            return
+        ids, entry_ids, blobs, entry_types = zip(*rows)
+        vectors = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(
+            len(rows), -1
+        )
+        self._add(list(entry_ids), vectors, list(entry_types))
+        self._last_loaded_id = max(ids)
+
+    def _add(self, entry_ids: List[int], vectors: np.ndarray, entry_types: List[str]):
+        if self._matrix.shape[1] != vectors.shape[1]:
+            if self._size:
+                raise ValueError(
+                    f"Embeddings of {self.model} have {vectors.shape[1]} dimensions, "
+                    f"expected {self._matrix.shape[1]}."
+                )
+            self._matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            self._entry_ids = np.zeros(0, dtype=np.int64)
+            self._entry_types = np.zeros(0, dtype="<U1")
+        for entry_id, vector, entry_type in zip(entry_ids, vectors, entry_types):
+            row = self._rows.get(entry_id)
+            if row is None:
+                row = self._size
+                self._grow(row + 1)
+                self._rows[entry_id] = row
+                self._size += 1
+            self._matrix[row] = vector
+            self._entry_ids[row] = entry_id
+            self._entry_types[row] = entry_type
+
+    def _grow(self, size: int):
+        """Doubles the capacity of the arrays if they're full, so that adding rows is amortized O(1)."""
+        capacity = len(self._entry_ids)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+        self._entry_ids = np.resize(self._entry_ids, capacity)
+        self._entry_types = np.resize(self._entry_types, capacity)
+
+    def search(
+        self, query_vector: np.ndarray, k: int, entry_type: Optional[str] = None
+    ) -> List[Tuple[int, float]]:
+        """Returns the ids of the k entries most similar to the query and their cosine similarity, best first."""
+        with self._lock:
+            size = self._size
+            if not size or k < 1:
+                return []
+            scores = self._matrix[:size] @ _normalize(
+                np.asarray(query_vector, dtype=np.float32)
+            )
+            if entry_type is not None:
+                scores[self._entry_types[:size] != entry_type] = -np.inf
+            entry_ids = self._entry_ids[:size].copy()
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (int(entry_ids[row]), float(scores[row]))
+            for row in top
+            if scores[row] > -np.inf
+        ]
+
+
+_indexes: Dict[Tuple[str, str], LibraryIndex] = {}
+_indexes_lock = threading.Lock()
+# backfills that are currently running, keyed by the provider and name of the embedding model
+_running_backfills: Dict[Tuple[str, str], threading.Thread] = {}
+_running_backfills_lock = threading.Lock()
+
+
+def get_library_index(embeddings: "Embeddings") -> LibraryIndex:
+    """Returns the process-wide index of the embedding model, up to date with the database."""
+    key = get_index_key(embeddings)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = LibraryIndex(*key)
+        index = _indexes[key]
+    index.refresh()
+    return index
+
+
+def clear_library_indexes():
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def embed_library_entries(entries: List[LibraryEntry], embeddings: "Embeddings") -> int:
+    """Embeds the entries in batches and stores their normalized embeddings. Returns the number of embedded entries.
+
+    Entries that were embedded with the model before are embedded again and their embeddings are replaced.
+    """
+    provider, model = get_index_key(embeddings)
+    limiter = get_rate_limiter_for(embeddings)
+    dependency = get_dependency_for(embeddings)
+    batch_size = get_config_value("library.embedding_batch_size")
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start : start + batch_size]
+        texts = [_text_to_embed(entry) for entry in batch]
+        vectors = call_with_rate_limit(
+            limiter,
+            lambda: resilient_call(
+                dependency, lambda: embeddings.embed_documents(texts)
+            ),
+            tokens=sum(estimate_tokens(text) for text in texts),
+        )
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with SQL_DB.atomic():
+            LibraryEmbedding.delete().where(
+                LibraryEmbedding.provider == provider,
+                LibraryEmbedding.model == model,
+                LibraryEmbedding.entry.in_([entry.id for entry in batch]),
+            ).execute()
+            LibraryEmbedding.insert_many(
+                [
+                    {
+                        "entry": entry.id,
+                        "provider": provider,
+                        "model": model,
+                        "vector": vector.tobytes(),
+                    }
+                    for entry, vector in zip(batch, vectors)
+                ]
+            ).execute()
+    if entries:
+        logging.info(
+            "Embedded %d library entries with %s model %s.",
+            len(entries),
+            provider,
+            model,
+        )
+    return len(entries)
+
+
+def index_library_entry(entry_id: int, embeddings: "Embeddings") -> bool:
+    """Adds a newly saved entry to the index of the embedding model.
+
+    Failures are only logged, as the entry is saved anyway and embedded by the next backfill.
+    Returns whether the entry was embedded.
+    """
+    opened_connection = SQL_DB.connect(reuse_if_open=True)
+    try:
+        entry = (
+            LibraryEntry.select(LibraryEntry, Video)
+            .join(Video)
+            .where(LibraryEntry.id == entry_id)
+            .first()
+        )
+        if entry is None:
+            # deleted in the meantime
+            return False
+        embed_library_entries([entry], embeddings)
+    except Exception as e:
+        logging.warning(
+            "Could not embed library entry %d, it is embedded by the next backfill: %s",
+            entry_id,
+            str(e),
+        )
+        return False
+    finally:
+        if opened_connection:
+            SQL_DB.close()
+    return True
+
+
+def start_library_entry_indexing(entry: LibraryEntry, embeddings: "Embeddings"):
+    """Adds a newly saved entry to the index of the embedding model in a background thread.
+
+    Saving an entry thus never waits for the embedding model, which may be slow or retried.
+    """
+    threading.Thread(
+        target=index_library_entry,
+        args=(entry.id, embeddings),
+        name=f"library-index-{entry.id}",
+        daemon=True,
+    ).start()
+
+
+def _select_unindexed_entries(embeddings: "Embeddings"):
+    provider, model = get_index_key(embeddings)
+    embedded = LibraryEmbedding.select(LibraryEmbedding.entry).where(
+        LibraryEmbedding.provider == provider, LibraryEmbedding.model == model
+    )
+    return (
+        LibraryEntry.select(LibraryEntry, Video)
+        .join(Video)
+        .where(LibraryEntry.id.not_in(embedded))
+        .order_by(LibraryEntry.id)
+    )
+
+
+def count_unindexed_entries(embeddings: "Embeddings") -> int:
+    """Returns the number of library entries that aren't in the index of the embedding model yet."""
+    return _select_unindexed_entries(embeddings).count()
+
+
+def backfill_library_index(embeddings: "Embeddings") -> int:
+    """Embeds all library entries that aren't in the index of the embedding model yet, e.g. entries saved
+    before the semantic search existed. Returns the number of embedded entries."""
+    batch_size = get_config_value("library.embedding_batch_size")
+    embedded = 0
+    while True:
+        batch = list(_select_unindexed_entries(embeddings).limit(batch_size))
+        if not batch:
+            return embedded
+        embedded += embed_library_entries(batch, embeddings)
+
+
+def _run_backfill(embeddings: "Embeddings"):
+    opened_connection = SQL_DB.connect(reuse_if_open=True)
+    try:
+        backfill_library_index(embeddings)
+    except Exception as e:
+        logging.error("Backfilling the library index failed: %s", str(e), exc_info=True)
+    finally:
+        if opened_connection:
+            SQL_DB.close()
+
+
+def is_backfill_running(embeddings: "Embeddings") -> bool:
+    """Returns True if the index of the embedding model is currently being backfilled in the background."""
+    with _running_backfills_lock:
+        thread = _running_backfills.get(get_index_key(embeddings))
+        return thread is not None and thread.is_alive()
+
+
+def start_library_backfill(embeddings: "Embeddings") -> bool:
+    """Starts backfilling the index of the embedding model in a background thread.
+
+    Returns False if a backfill for the model is already running, True otherwise.
+    """
+    key = get_index_key(embeddings)
+    with _running_backfills_lock:
+        running = _running_backfills.get(key)
+        if running is not None and running.is_alive():
+            return False
+        thread = threading.Thread(
+            target=_run_backfill,
+            args=(embeddings,),
+            name=f"library-backfill-{key[1]}",
+            daemon=True,
+        )
+        _running_backfills[key] = thread
+        thread.start()
+    logging.info("Started backfilling the library index of %s model %s.", *key)
+    return True
+
+
+def search_library_semantically(
+    query: str,
+    embeddings: "Embeddings",
+    k: int = 10,
+    entry_type: Optional[Literal["S", "A"]] = None,
+) -> List[Tuple[LibraryEntry, float]]:
+    """Returns the k library entries (without their text) most similar in meaning to the query, best first.
+
+    Args:
+        query (str): What to search for, e.g. a question.
+        embeddings (Embeddings): The embedding model whose index is searched.
+        k (int): The maximum number of entries.
+        entry_type (Optional[str]): Only return summaries ("S") or answers ("A").
+
+    Returns:
+        list: The entries with their cosine similarity to the query.
+    """
+    index = get_library_index(embeddings)
+    if not len(index):
+        return []
+    query_vector = call_with_rate_limit(
+        get_rate_limiter_for(embeddings),
+        lambda: resilient_call(
+            get_dependency_for(embeddings), lambda: embeddings.embed_query(query)
+        ),
+        tokens=estimate_tokens(query),
+    )
+    # entries deleted after the refresh of the index are left out
+    matches = index.search(np.asarray(query_vector), k=k, entry_type=entry_type)
+    entries = get_library_entries_by_id([entry_id for entry_id, _ in matches])
+    return [
+        (entries[entry_id], score) for entry_id, score in matches if entry_id in entries
+    ]
@@ -0,0 +1,372 @@
+import argparse
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from peewee import SqliteDatabase
+
+from modules.clients import invalidate_collection
+from modules.helpers import get_chroma_client, get_config_value
+from modules.persistance import (
+    SQL_DB,
+    IngestionJob,
+    LibraryEmbedding,
+    LibraryEntry,
+    ReconciliationCandidate,
+    Transcript,
+    Video,
+    initialize_database,
+)
+from modules.resilience import resilient_call
+
+if TYPE_CHECKING:
+    from chromadb import Collection
+    from chromadb.api import ClientAPI
+
+# embeddings are stored as float32 by Chroma
+BYTES_PER_DIMENSION = 4
+
+
+@dataclass
+class ReconciliationReport:
+    """What a reconciliation removed (or would remove in a dry run) and the space it reclaimed."""
+
+    dry_run: bool = False
+    deleted_collections: List[str] = field(default_factory=list)
+    # titles of the videos whose half-written transcripts were removed or repaired
+    removed_transcripts: List[str] = field(default_factory=list)
+    repaired_transcripts: List[str] = field(default_factory=list)
+    # number of deleted rows per table, whose references point to rows that don't exist anymore
+    deleted_rows: Dict[str, int] = field(default_factory=dict)
+    # orphans that were found within the grace period, they are removed by a later run
+    pending: int = 0
+    reclaimed_embeddings: int = 0
+    # estimated size of the deleted embedding vectors
+    reclaimed_bytes: int = 0
+    # size by which VACUUM shrank the SQLite database
+    reclaimed_database_bytes: int = 0
+
+    def summary(self) -> str:
+        """Returns a human-readable summary of the report."""
+        prefix = "Would remove" if self.dry_run else "Removed"
+        lines = [
+            f"{prefix} {len(self.deleted_collections)} orphaned collections with "
+            f"{self.reclaimed_embeddings} embeddings (~{self.reclaimed_bytes / 1024**2:.1f} MB).",
+            f"{prefix} {len(self.removed_transcripts)} half-written transcripts, "
+            f"repaired {len(self.repaired_transcripts)}.",
+        ]
+        lines += [
+            f"{prefix} {count} dangling rows of {table}."
+            for table, count in self.deleted_rows.items()
+            if count
+        ]
+        if self.reclaimed_database_bytes:
+            lines.append(
+                f"VACUUM shrank the database by {self.reclaimed_database_bytes / 1024**2:.1f} MB."
+            )
+        if self.pending:
+            lines.append(
+                f"{self.pending} orphans are within the grace period and are removed by a later run."
+            )
+        return "\n".join(lines)
+
+
+def _list_collections(chroma_client: "ClientAPI") -> Dict[str, "Collection"]:
+    return {
+        collection.name: collection
+        for collection in resilient_call("chroma", chroma_client.list_collections)
+    }
+
+
+def _get_size(collection: "Collection", count: Optional[int] = None) -> Tuple[int, int]:
+    """Returns the number of embeddings of a collection and their estimated size in bytes.
+
+    The embeddings are only counted if count isn't given.
+    """
+    if count is None:
+        count = resilient_call("chroma", collection.count)
+    if not count:
+        return 0, 0
+    sample = resilient_call(
+        "chroma", lambda: collection.get(limit=1, include=["embeddings"])
+    )
+    return count, count * len(sample["embeddings"][0]) * BYTES_PER_DIMENSION
+
+
+def _get_due_orphans(
+    kind: str, keys: Set[str], grace_period: float, now: datetime, dry_run: bool
+) -> Set[str]:
+    """Records the orphans of a kind and returns those that were orphaned for the grace period.
+
+    Orphans are only removed by a later run, because processing a video creates its collection (and
+    transcript) before they are linked to each other. Orphans that aren't orphaned anymore are forgotten.
+    """
+    first_seen = {
+        candidate.key: candidate.first_seen_on
+        for candidate in ReconciliationCandidate.select().where(
+            ReconciliationCandidate.kind == kind
+        )
+    }
+    due = {
+        key
+        for key in keys
+        if now - first_seen.get(key, now) >= timedelta(seconds=grace_period)
+    }
+    if not dry_run:
+        with SQL_DB.atomic():
+            ReconciliationCandidate.delete().where(
+                ReconciliationCandidate.kind == kind,
+                ReconciliationCandidate.key.not_in(list(keys - due)),
+            ).execute()
+            new_keys = keys - due - set(first_seen)
+            if new_keys:
+                ReconciliationCandidate.insert_many(
+                    [
+                        {"kind": kind, "key": key, "first_seen_on": now}
+                        for key in new_keys
+                    ]
+                ).execute()
+    return due
+
+
+def _delete_dangling_rows(dry_run: bool) -> Dict[str, int]:
+    """Deletes rows that reference videos or library entries that don't exist anymore."""
+    videos = Video.select(Video.id)
+    valid_entries = LibraryEntry.select(LibraryEntry.id).where(
+        LibraryEntry.video.in_(videos)
+    )
+    # library embeddings first, because they reference the entries
+    queries = [
+        (LibraryEmbedding, LibraryEmbedding.entry.not_in(valid_entries)),
+        (LibraryEntry, LibraryEntry.video.not_in(videos)),
+        (Transcript, Transcript.video.not_in(videos)),
+    ]
+    deleted_rows = {}
+    with SQL_DB.atomic():
+        for model, condition in queries:
+            if dry_run:
+                count = model.select().where(condition).count()
+            else:
+                count = model.delete().where(condition).execute()
+            deleted_rows[model._meta.table_name] = count
+        if not dry_run:
+            IngestionJob.update(video=None).where(
+                IngestionJob.video.not_in(videos)
+            ).execute()
+    return deleted_rows
+
+
+def _delete_unused_videos(
+    removed_transcript_ids: Set[int], grace_period: float, now: datetime, dry_run: bool
+) -> int:
+    """Deletes videos that have neither a transcript nor library entries, e.g. because processing failed."""
+    # in a dry run, the removed transcripts are still there
+    transcripts = Transcript.select(Transcript.video).where(
+        Transcript.id.not_in(list(removed_transcript_ids))
+    )
+    unused = Video.select(Video.id).where(
+        Video.id.not_in(transcripts),
+        Video.id.not_in(LibraryEntry.select(LibraryEntry.video)),
+        # the video of a job in progress gets its transcript later
+        Video.id.not_in(
+            IngestionJob.select(IngestionJob.video).where(
+                IngestionJob.video.is_null(False),
+                IngestionJob.status.in_(["queued", "running"]),
+            )
+        ),
+        Video.saved_on.is_null()
+        | (Video.saved_on <= now - timedelta(seconds=grace_period)),
+    )
+    video_ids = [video.id for video in unused]
+    if video_ids and not dry_run:
+        with SQL_DB.atomic():
+            IngestionJob.update(video=None).where(
+                IngestionJob.video.in_(video_ids)
+            ).execute()
+            Video.delete().where(Video.id.in_(video_ids)).execute()
+    return len(video_ids)
+
+
+def _vacuum() -> int:
+    """Rebuilds the SQLite database to return the space of deleted rows and returns the reclaimed bytes."""
+
+    def get_size():
+        page_count = SQL_DB.execute_sql("PRAGMA page_count").fetchone()[0]
+        return page_count * SQL_DB.execute_sql("PRAGMA page_size").fetchone()[0]
+
+    size = get_size()
+    SQL_DB.execute_sql("VACUUM")
+    return size - get_size()
+
+
+def reconcile(
+    chroma_client: "ClientAPI",
+    grace_period: Optional[float] = None,
+    dry_run: bool = False,
+    vacuum: bool = False,
+) -> ReconciliationReport:
+    """Diffs the database against Chroma and removes what processing or deleting videos left behind.
+
+    - rows that reference videos or library entries that don't exist anymore are deleted,
+    - transcripts without a (non-empty) collection, e.g. because embedding failed, are removed, so
+      that their videos can be processed again. Transcripts whose collection has another id are repaired,
+    - collections that no transcript references are deleted,
+    - videos without transcript and library entries are deleted.
+
+    Orphaned collections and transcripts are only removed once a previous run found them and the grace
+    period has passed, so that videos that are processed right now aren't affected.
+
+    Args:
+        chroma_client (ClientAPI): The ChromaDB client.
+        grace_period (Optional[float]): Seconds an orphan must be orphaned before it's removed, by
+            default the configured maintenance.grace_period.
+        dry_run (bool): Only reports what would be removed, without changing anything.
+        vacuum (bool): Rebuilds the SQLite database afterwards to return the space of deleted rows.
+    """
+    if grace_period is None:
+        grace_period = get_config_value("maintenance.grace_period")
+    now = datetime.now()
+    report = ReconciliationReport(dry_run=dry_run)
+    report.deleted_rows = _delete_dangling_rows(dry_run)
+
+    collections = _list_collections(chroma_client)
+    transcripts = list(
+        Transcript.select(
+            Transcript.id,
+            Transcript.chroma_collection_id,
+            Transcript.chroma_collection_name,
+            Video.title,
+        ).join(Video)
+    )
+    # only the collections that are deleted are sampled for their size, see _get_size
+    counts = {}
+    half_written = {}
+    repaired = []
+    for transcript in transcripts:
+        collection = collections.get(transcript.chroma_collection_name)
+        if collection is not None:
+            counts[collection.name] = resilient_call("chroma", collection.count)
+        if collection is None or not counts[collection.name]:
+            half_written[str(transcript.id)] = transcript
+        elif str(transcript.chroma_collection_id) != str(collection.id):
+            repaired.append(transcript)
+    report.repaired_transcripts = [t.video.title for t in repaired]
+    if repaired and not dry_run:
+        with SQL_DB.atomic():
+            for transcript in repaired:
+                Transcript.update(
+                    chroma_collection_id=collections[
+                        transcript.chroma_collection_name
+                    ].id
+                ).where(Transcript.id == transcript.id).execute()
+
+    due_transcripts = _get_due_orphans(
+        "transcript", set(half_written), grace_period, now, dry_run
+    )
+    removed = [half_written[key] for key in sorted(due_transcripts, key=int)]
+    report.removed_transcripts = [t.video.title for t in removed]
+    if removed and not dry_run:
+        with SQL_DB.atomic():
+            Transcript.delete().where(
+                Transcript.id.in_([t.id for t in removed])
+            ).execute()
+
+    # the collections of removed transcripts are orphaned right away
+    removed_ids = {t.id for t in removed}
+    referenced = {
+        t.chroma_collection_name for t in transcripts if t.id not in removed_ids
+    }
+    orphaned = set(collections) - referenced
+    removed_collections = orphaned & {t.chroma_collection_name for t in removed}
+    due_collections = removed_collections | _get_due_orphans(
+        "collection", orphaned - removed_collections, grace_period, now, dry_run
+    )
+    report.pending = (len(half_written) - len(removed)) + (
+        len(orphaned) - len(due_collections)
+    )
+
+    for name in sorted(due_collections):
+        count, size = _get_size(collections[name], counts.get(name))
+        if not dry_run:
+            try:
+                resilient_call(
+                    "chroma",
+                    lambda: chroma_client.delete_collection(name=name),
+                    idempotent=False,
+                )
+            except Exception as e:
+                logging.error("Could not remove collection '%s': %s", name, str(e))
+                continue
+            invalidate_collection(name)
+        report.deleted_collections.append(name)
+        report.reclaimed_embeddings += count
+        report.reclaimed_bytes += size
+
+    report.deleted_rows[Video._meta.table_name] = _delete_unused_videos(
+        removed_ids, grace_period, now, dry_run
+    )
+    if vacuum and not dry_run and isinstance(SQL_DB, SqliteDatabase):
+        report.reclaimed_database_bytes = _vacuum()
+    logging.info("Reconciled the database with Chroma:\n%s", report.summary())
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m modules.maintenance",
+        description="Removes orphaned Chroma collections and dangling rows of the database.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report what would be removed",
+    )
+    parser.add_argument(
+        "--grace-period",
+        type=float,
+        help="seconds an orphan must be orphaned before it's removed, 0 removes orphans right away "
+        "(default: maintenance.grace_period of config.json)",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="rebuild the SQLite database afterwards to return the space of deleted rows",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        nargs="?",
+        const=-1,
+        help="keep running and reconcile every INTERVAL seconds "
+        "(default without value: maintenance.interval of config.json)",
+    )
+    args = parser.parse_args(argv)
+    interval = args.interval
+    if interval is not None and interval < 0:
+        interval = get_config_value("maintenance.interval")
+
+    initialize_database()
+    chroma_client = get_chroma_client()
+    while True:
+        try:
+            report = reconcile(
+                chroma_client,
+                grace_period=args.grace_period,
+                dry_run=args.dry_run,
+                vacuum=args.vacuum,
+            )
+            print(report.summary())
+        except Exception as e:
+            if interval is None:
+                raise
+            logging.error("Reconciliation failed: %s", str(e), exc_info=True)
+        if interval is None:
+            return
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
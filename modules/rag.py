@@ -1,16 +1,24 @@
 import logging
 import uuid
-from typing import List, Literal
+from typing import TYPE_CHECKING, List, Literal, Optional
 
-from chromadb import Collection
-from langchain.chat_models import BaseChatModel
-from langchain.messages import HumanMessage, SystemMessage
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from modules.hedging import hedged_invoke
 from modules.helpers import num_tokens_from_string, read_file
+from modules.ratelimit import (
+    call_with_rate_limit,
+    estimate_tokens,
+    get_rate_limiter_for,
+)
+from modules.resilience import get_dependency_for, resilient_call
+
+if TYPE_CHECKING:
+    from chromadb import Collection
+    from langchain.chat_models import BaseChatModel
+    from langchain_chroma import Chroma
+from modules.segments import Segment, get_time_range
 
 CHUNK_SIZE_FOR_UNPROCESSED_TRANSCRIPT = 512
 
@@ -36,14 +44,30 @@ def split_text_recursively(
     chunk_size: int = 1024,
     chunk_overlap: int = 0,
     len_func: Literal["characters", "tokens"] = "characters",
+    segments: Optional[List[Segment]] = None,
 ):
-    """Splits a string recurisively by characters or tokens."""
+    """Splits a string recurisively by characters or tokens.
+
+    If the timed segments of the transcript are provided, the metadata of each chunk contains
+    its offset in the transcript text (start_index) and the time range it covers in seconds (start, end).
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         length_function=len if len_func == "characters" else num_tokens_from_string,
+        add_start_index=bool(segments),
     )
     splits = text_splitter.create_documents([transcript_text])
+    if segments:
+        for split in splits:
+            start_index = split.metadata["start_index"]
+            split.metadata["start"], split.metadata["end"] = get_time_range(
+                segments,
+                start_offset=start_index,
+                end_offset=start_index + len(split.page_content),
+            )
     logging.info(
         "Split transcript by %s into %d chunks with a provided chunk size of %d.",
         len_func,
@@ -53,25 +77,64 @@ def split_text_recursively(
     return splits
 
 
+def merge_adjacent_documents(docs: List[Document]) -> List[Document]:
+    """Merges chunks whose time ranges touch or overlap into single documents, ordered by time.
+
+    Chunks without a time range (e.g. from collections created before timestamps were stored) are returned unchanged.
+    """
+    timed_docs = sorted(
+        (d for d in docs if "start" in d.metadata and "end" in d.metadata),
+        key=lambda d: d.metadata["start"],
+    )
+    untimed_docs = [
+        d for d in docs if not ("start" in d.metadata and "end" in d.metadata)
+    ]
+
+    merged: List[Document] = []
+    for doc in timed_docs:
+        previous = merged[-1] if merged else None
+        if previous and doc.metadata["start"] <= previous.metadata["end"]:
+            merged[-1] = Document(
+                page_content=previous.page_content + "\n" + doc.page_content,
+                metadata={
+                    **previous.metadata,
+                    "end": max(previous.metadata["end"], doc.metadata["end"]),
+                },
+            )
+        else:
+            merged.append(doc)
+    return merged + untimed_docs
+
+
 def format_docs_for_context(docs):
     return "\n\n---\n\n".join(doc.page_content for doc in docs)
 
 
 def embed_excerpts(
-    collection: Collection, excerpts: List[Document], embeddings: Embeddings
+    collection: "Collection", excerpts: List[Document], embeddings: Embeddings
 ):
     """If there are no embeddings in the database, each document in the list is embedded in the provided collection."""
     if collection.count() <= 0:
+        limiter = get_rate_limiter_for(embeddings)
+        dependency = get_dependency_for(embeddings)
         for e in excerpts:
-            response = embeddings.embed_query(e.page_content)
+            response = call_with_rate_limit(
+                limiter,
+                lambda: resilient_call(
+                    dependency, lambda: embeddings.embed_query(e.page_content)
+                ),
+                tokens=estimate_tokens(e.page_content),
+            )
             collection.add(
                 ids=[str(uuid.uuid1())],
                 embeddings=[response],
                 documents=[e.page_content],
+                # chroma doesn't accept empty metadata
+                metadatas=[e.metadata] if e.metadata else None,
             )
 
 
-def find_relevant_documents(query: str, db: Chroma, k: int = 3):
+def find_relevant_documents(query: str, db: "Chroma", k: int = 3):
     """
     Retrieve relevant documents by performing a similarity search.
 
@@ -85,11 +148,22 @@ def find_relevant_documents(query: str, db: Chroma, k: int = 3):
     """
 
     retriever = db.as_retriever(search_kwargs={"k": k})
-    return retriever.invoke(input=query)
+    # the query is embedded by the embedding function of the vector store
+    return call_with_rate_limit(
+        get_rate_limiter_for(db.embeddings),
+        lambda: resilient_call(
+            get_dependency_for(db.embeddings),
+            lambda: retriever.invoke(input=query),
+        ),
+        tokens=estimate_tokens(query),
+    )
 
 
 def generate_response(
-    question: str, llm: BaseChatModel, relevant_docs: List[Document]
+    question: str,
+    llm: "BaseChatModel",
+    relevant_docs: List[Document],
+    backup_llm: Optional["BaseChatModel"] = None,
 ) -> str:
     """Generates a response from the LLM based on the question and relevant documents.
 
@@ -97,19 +171,33 @@ def generate_response(
         question (str): The user's question or topic.
         llm (BaseChatModel): The language model instance to use for generating the response.
         relevant_docs (List[Document]): A list of relevant documents to use as context.
+        backup_llm (Optional[BaseChatModel]): If provided, the request is hedged with this model when
+            the first token of llm takes unusually long or llm fails.
 
     Returns:
         str: The generated response from the LLM.
     """
 
     formatted_input = rag_user_prompt_template.format(
-        question=question, context=format_docs_for_context(relevant_docs)
+        question=question,
+        context=format_docs_for_context(merge_adjacent_documents(relevant_docs)),
     )
 
+    from langchain.messages import HumanMessage, SystemMessage
+
     messages = [
         SystemMessage(content=RAG_SYSTEM_PROMPT),
         HumanMessage(content=formatted_input),
     ]
 
-    response = llm.invoke(messages)
+    if backup_llm is not None:
+        return hedged_invoke(primary=llm, secondary=backup_llm, messages=messages)
+
+    response = call_with_rate_limit(
+        get_rate_limiter_for(llm),
+        lambda: resilient_call(
+            get_dependency_for(llm), lambda: llm.invoke(messages), idempotent=False
+        ),
+        tokens=estimate_tokens(RAG_SYSTEM_PROMPT + formatted_input),
+    )
     return response.content
@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from modules.helpers import get_config_value
+
+T = TypeVar("T")
+
+# how often a rate limited call is retried before the error is raised
+MAX_RATE_LIMIT_RETRIES = 5
+# delay in seconds if a rate limited response doesn't tell how long to wait
+DEFAULT_RETRY_AFTER = 2.0
+
+
+class TokenBucket:
+    """A token bucket refilled continuously up to its capacity per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.refill_rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        # the bucket is paused until this point in time, e.g. after a 429
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.refill_rate
+        )
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """Blocks until the amount can be taken from the bucket.
+
+        Amounts larger than the capacity are capped, so that a single large request can't block forever.
+        """
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    wait = (amount - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for the given number of seconds."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the number of concurrent calls with additive increase, multiplicative decrease (AIMD).
+
+    Every successful call raises the limit by 1/limit, i.e. by about one per round of calls, and every
+    rate limited call halves it.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_rate_limited(self):
+        with self._condition:
+            self.limit = max(1.0, self.limit / 2)
+
+
+class RateLimiter:
+    """Limits requests per minute, tokens per minute and concurrency of calls to one model."""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 4,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(max_concurrency)
+
+    @contextmanager
+    def limit(self, tokens: int = 0):
+        """Waits for capacity before the wrapped call and frees the concurrency slot afterwards."""
+        if self.requests:
+            self.requests.acquire()
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+        self.concurrency.acquire()
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    def on_success(self, headers: Optional[dict] = None):
+        self.concurrency.on_success()
+        if headers:
+            self.update_from_headers(headers)
+
+    def on_rate_limited(self, retry_after: float):
+        self.concurrency.on_rate_limited()
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.pause(retry_after)
+
+    def update_from_headers(self, headers: dict):
+        """Pauses the buckets if the provider reports that a limit is used up (x-ratelimit-* headers)."""
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = headers.get(f"x-ratelimit-reset-{kind}")
+            if bucket and remaining is not None and reset and int(remaining) <= 0:
+                bucket.pause(parse_duration(reset))
+
+
+def parse_duration(value: str) -> float:
+    """Parses durations like '1s', '6m0s', '20ms' or '0.5' (seconds) as used by rate limit headers."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(
+        float(amount) * units[unit]
+        for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    )
+
+
+_limiters: Dict[Tuple[str, str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str, credential: str = "") -> RateLimiter:
+    """Returns the process-wide rate limiter for a (provider, model, credential) combination.
+
+    The credential (API key or host) is only used as a hash. The limits are read from the config.
+    """
+    key = (
+        provider,
+        model,
+        hashlib.sha256(credential.encode("utf-8")).hexdigest()[:16],
+    )
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = get_config_value(f"rate_limits.{provider}")
+            _limiters[key] = RateLimiter(
+                requests_per_minute=limits.get("requests_per_minute"),
+                tokens_per_minute=limits.get("tokens_per_minute"),
+                max_concurrency=limits.get("max_concurrency", 4),
+            )
+        return _limiters[key]
+
+
+def get_rate_limiter_for(model) -> RateLimiter:
+    """Returns the rate limiter for a LangChain chat or embedding model of OpenAI or Ollama."""
+    model_name = getattr(model, "model_name", None) or getattr(model, "model", "")
+    api_key = getattr(model, "openai_api_key", None)
+    if api_key is not None:
+        return get_rate_limiter(
+            "OpenAI",
+            model_name,
+            (
+                api_key.get_secret_value()
+                if hasattr(api_key, "get_secret_value")
+                else api_key
+            ),
+        )
+    return get_rate_limiter("Ollama", model_name, getattr(model, "base_url", "") or "")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate of the number of tokens of a text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def get_retry_after(error: Exception) -> float:
+    """Returns the delay requested by a rate limited response or a default."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in (
+        "retry-after",
+        "x-ratelimit-reset-requests",
+        "x-ratelimit-reset-tokens",
+    ):
+        if headers.get(header):
+            return parse_duration(headers[header])
+    return DEFAULT_RETRY_AFTER
+
+
+def call_with_rate_limit(
+    limiter: RateLimiter, func: Callable[[], T], tokens: int = 0
+) -> T:
+    """Calls func within the limits of the rate limiter and retries it if it gets rate limited (HTTP 429).
+
+    If the result carries response headers (LangChain messages of models created with
+    include_response_headers=True), they are used to adjust the limiter.
+    """
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        try:
+            with limiter.limit(tokens=tokens):
+                result = func()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            retry_after = get_retry_after(e)
+            logging.warning(
+                "Rate limited (attempt %d), retrying in %.1fs: %s",
+                attempt + 1,
+                retry_after,
+                str(e),
+            )
+            limiter.on_rate_limited(retry_after)
+            time.sleep(retry_after)
+        else:
+            metadata = getattr(result, "response_metadata", None) or {}
+            limiter.on_success(headers=metadata.get("headers"))
+            return result
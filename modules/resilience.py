@@ -0,0 +1,233 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+from modules.helpers import get_config_value
+from modules.ratelimit import is_rate_limit_error
+
+T = TypeVar("T")
+
+
+class DependencyTimeoutError(TimeoutError):
+    """Raised when a call to a dependency doesn't return within its timeout."""
+
+    def __init__(self, dependency: str, timeout: float):
+        self.dependency = dependency
+        self.timeout = timeout
+        super().__init__(f"Call to {dependency} timed out after {timeout}s")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+    def __init__(self, dependency: str):
+        self.dependency = dependency
+        self.message = f"{dependency} is currently unavailable. Please try again later."
+        super().__init__(self.message)
+
+
+class CircuitBreaker:
+    """Stops calling a dependency after consecutive failures.
+
+    After failure_threshold consecutive failures the circuit opens and calls fail fast with CircuitOpenError.
+    Once reset_timeout seconds have passed, a single trial call is let through (half-open). If it succeeds,
+    the circuit closes again, otherwise it stays open for another reset_timeout.
+    """
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def _before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if (
+                time.monotonic() - self.opened_at < self.reset_timeout
+                or self._trial_running
+            ):
+                raise CircuitOpenError(self.name)
+            self._trial_running = True
+
+    def _on_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logging.info("Circuit of %s closed again.", self.name)
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def _on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logging.warning(
+                        "Circuit of %s opened after %d failures.",
+                        self.name,
+                        self.failures,
+                    )
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def call(
+        self,
+        func: Callable[[], T],
+        expected_errors: Tuple[Type[BaseException], ...] = (),
+    ) -> T:
+        """Calls func through the breaker. Expected errors (e.g. 'no transcript found') don't count as failures."""
+        self._before_call()
+        try:
+            result = func()
+        except expected_errors:
+            self._on_success()
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e):
+                # the dependency is up, it just asks us to slow down
+                self._on_success()
+            else:
+                self._on_failure()
+            raise
+        self._on_success()
+        return result
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(dependency: str) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker of a dependency."""
+    with _breakers_lock:
+        if dependency not in _breakers:
+            _breakers[dependency] = CircuitBreaker(
+                dependency,
+                failure_threshold=get_config_value(
+                    "resilience.circuit_breaker.failure_threshold"
+                ),
+                reset_timeout=get_config_value(
+                    "resilience.circuit_breaker.reset_timeout"
+                ),
+            )
+        return _breakers[dependency]
+
+
+def get_unavailable_dependencies() -> List[str]:
+    """Returns the names of the dependencies whose circuit breaker is open."""
+    with _breakers_lock:
+        return [name for name, breaker in _breakers.items() if breaker.is_open]
+
+
+def get_dependency_for(model) -> str:
+    """Returns the name of the dependency behind a LangChain chat or embedding model."""
+    return "openai" if getattr(model, "openai_api_key", None) is not None else "ollama"
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """Whether an error is a timeout, e.g. of openai, httpx (Ollama, Chroma) or requests (YouTube)."""
+    return isinstance(error, TimeoutError) or any(
+        "Timeout" in cls.__name__ for cls in type(error).__mro__
+    )
+
+
+def retry(
+    func: Callable[[], T],
+    attempts: int = 3,
+    base_delay: float = 0.5,
+    give_up_on: Tuple[Type[BaseException], ...] = (),
+    deadline: Optional[float] = None,
+    attempt_timeout: float = 0.0,
+) -> T:
+    """Calls func and retries it with jittered exponential backoff. Only use it for idempotent calls.
+
+    If a deadline (in seconds) is given, no retry is started that could end after it, i.e. whose
+    delay and attempt_timeout don't fit into the remaining time.
+    """
+    started = time.monotonic()
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except give_up_on:
+            raise
+        except Exception as e:
+            if attempt == attempts or is_rate_limit_error(e):
+                raise
+            delay = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if (
+                deadline is not None
+                and time.monotonic() - started + delay + attempt_timeout > deadline
+            ):
+                raise
+            logging.warning(
+                "Attempt %d/%d failed, retrying in %.2fs: %s",
+                attempt,
+                attempts,
+                delay,
+                str(e),
+            )
+            time.sleep(delay)
+
+
+def resilient_call(
+    dependency: str,
+    func: Callable[[], T],
+    idempotent: bool = True,
+    expected_errors: Tuple[Type[BaseException], ...] = (),
+    timeout: Optional[float] = None,
+) -> T:
+    """Calls a dependency through its circuit breaker and, if idempotent, with retries within its deadline.
+
+    The call itself is bounded by the timeout of the dependency's client (see modules/clients.py),
+    so that a hanging call doesn't keep running after the caller gave up on it.
+
+    Args:
+        dependency (str): Name of the dependency, e.g. 'chroma', 'openai', 'ollama' or 'youtube'.
+        func (Callable[[], T]): The call to make.
+        idempotent (bool): Whether the call may be retried.
+        expected_errors: Errors that are part of the normal operation. They are neither retried
+            nor counted as failures of the dependency.
+        timeout (Optional[float]): The timeout of the client used by func, if it isn't the configured
+            timeout of the dependency, e.g. for health checks.
+
+    Raises:
+        CircuitOpenError: If the dependency failed repeatedly and is not called at the moment.
+        DependencyTimeoutError: If the call (or its last retry) timed out.
+    """
+    timeout = timeout or get_config_value(f"resilience.timeouts.{dependency}")
+
+    def attempt():
+        try:
+            return func()
+        except expected_errors:
+            raise
+        except Exception as e:
+            if is_timeout_error(e) and not isinstance(e, DependencyTimeoutError):
+                raise DependencyTimeoutError(dependency, timeout) from e
+            raise
+
+    def call():
+        if not idempotent:
+            return attempt()
+        return retry(
+            attempt,
+            attempts=get_config_value("resilience.retry_attempts"),
+            give_up_on=expected_errors,
+            deadline=get_config_value(f"resilience.deadlines.{dependency}"),
+            attempt_timeout=timeout,
+        )
+
+    return get_circuit_breaker(dependency).call(call, expected_errors=expected_errors)
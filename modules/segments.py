@@ -0,0 +1,84 @@
+import struct
+from bisect import bisect_right
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# each segment is stored as start (float32, seconds), duration (float32, seconds)
+# and the offset of its text within the transcript text (uint32), i.e. 12 bytes per segment
+_SEGMENT_STRUCT = struct.Struct("<ffI")
+
+
+class Segment(NamedTuple):
+    """A timed part of a transcript. The text is not stored, only its offset within the transcript text."""
+
+    start: float
+    duration: float
+    offset: int
+
+
+def join_segments(
+    timed_texts: Iterable[Tuple[float, float, str]], separator: str = "\n"
+) -> Tuple[str, List[Segment]]:
+    """Joins timed texts into a single transcript text and the segments pointing into it.
+
+    Args:
+        timed_texts (Iterable[Tuple[float, float, str]]): (start, duration, text) tuples in chronological order.
+        separator (str): The string the texts are joined with. Defaults to a newline.
+
+    Returns:
+        Tuple[str, List[Segment]]: The transcript text and its segments.
+    """
+    texts = []
+    segments = []
+    offset = 0
+    for start, duration, text in timed_texts:
+        if texts:
+            offset += len(separator)
+        segments.append(Segment(start=start, duration=duration, offset=offset))
+        texts.append(text)
+        offset += len(text)
+    return separator.join(texts), segments
+
+
+def pack_segments(segments: List[Segment]) -> bytes:
+    """Serializes segments into a compact binary representation."""
+    return b"".join(
+        _SEGMENT_STRUCT.pack(s.start, s.duration, s.offset) for s in segments
+    )
+
+
+def unpack_segments(data: bytes) -> List[Segment]:
+    """Deserializes segments created by `pack_segments`."""
+    return [Segment(*values) for values in _SEGMENT_STRUCT.iter_unpack(bytes(data))]
+
+
+def get_time_range(
+    segments: List[Segment], start_offset: int, end_offset: int
+) -> Optional[Tuple[float, float]]:
+    """Returns the time range (in seconds) covered by the text between start_offset and end_offset.
+
+    Returns None if there are no segments.
+    """
+    if not segments:
+        return None
+    offsets = [s.offset for s in segments]
+    first = max(bisect_right(offsets, start_offset) - 1, 0)
+    last = max(bisect_right(offsets, max(end_offset - 1, start_offset)) - 1, first)
+    return (
+        segments[first].start,
+        segments[last].start + segments[last].duration,
+    )
+
+
+def format_timestamp(seconds: float) -> str:
+    """Formats seconds as (h:)mm:ss, e.g. 75.3 -> '01:15'."""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def get_timestamp_url(url: str, seconds: float) -> str:
+    """Returns the URL of a YouTube video that starts playing at the given second."""
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}t={int(seconds)}s"
@@ -1,35 +1,22 @@
 import logging
+from typing import TYPE_CHECKING
 
-import ollama
-from langchain.messages import HumanMessage, SystemMessage
-from langchain_core.language_models import BaseChatModel
-
+from .capabilities import (
+    DEFAULT_CONTEXT_LENGTH,
+    get_capabilities_for,
+    get_tokenizer_for,
+)
 from .helpers import num_tokens_from_string, read_file
+from .ratelimit import call_with_rate_limit, get_rate_limiter_for
+from .resilience import get_dependency_for, resilient_call
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
 
 SYSTEM_PROMPT = read_file("prompts/summary_system_prompt.txt")
 
 USER_PROMPT_TEMPLATE = read_file("prompts/summary_user_prompt.txt")
 
-# info about OpenAI's GPTs context windows: https://platform.openai.com/docs/models
-OPENAI_CONTEXT_WINDOWS = {
-    "gpt-3.5-turbo": {"total": 16385, "output": 4096},
-    "gpt-4": {"total": 8192, "output": 4096},
-    "gpt-4-turbo": {"total": 128000, "output": 4096},
-    "gpt-4o": {"total": 128000, "output": 16384},
-    "gpt-4o-mini": {"total": 128000, "output": 16384},
-    "gpt-4.1-nano": {"total": 1047576, "output": 32768},
-    "gpt-4.1-mini": {"total": 1047576, "output": 32768},
-    "gpt-4.1": {"total": 1047576, "output": 32768},
-    "gpt-5.1-chat-latest": {"total": 400000, "output": 128000},
-    "gpt-5.1": {"total": 400000, "output": 128000},
-    "gpt-5.2": {"total": 400000, "output": 128000},
-    "gpt-5.2-chat-latest": {"total": 128000, "output": 16384},
-    "gpt-5.2-pro": {"total": 400000, "output": 128000},
-    "gpt-5-nano": {"total": 400000, "output": 128000},
-    "gpt-5-mini": {"total": 400000, "output": 128000},
-    "gpt-5": {"total": 400000, "output": 128000},
-}
-
 
 class TranscriptTooLongForModelException(Exception):
     """Raised when the length of the transcript exceeds the context window of a language model."""
@@ -44,7 +31,7 @@ class TranscriptTooLongForModelException(Exception):
         logging.error("Transcript too long for %s.", self.model_name, exc_info=True)
 
 
-def get_max_context_length(llm: BaseChatModel) -> int:
+def get_max_context_length(llm: "BaseChatModel") -> int:
     """
     Returns the maximum context length for the provided model.
 
@@ -54,27 +41,17 @@ def get_max_context_length(llm: BaseChatModel) -> int:
     Returns:
         int: The maximum context window size in tokens. Defaults to 128k if not found.
     """
-    # Check if llm.name is a substring of any OpenAI model in OPENAI_CONTEXT_WINDOWS
-    for model_name in OPENAI_CONTEXT_WINDOWS.keys():
-        if llm.name in model_name:
-            return OPENAI_CONTEXT_WINDOWS[model_name]["total"]
-    
-    # Try retrieving via ollama client
     try:
-        model_details = ollama.show(model=llm.name)
-        model_info = model_details.get("modelinfo", {})
-        general_arch = model_info.get("general.architecture", "")
-        context_length = model_info.get(f"{general_arch}.context_length")
-        if context_length:
-            return context_length
+        context_length = get_capabilities_for(llm).context_length
     except Exception as e:
-        logging.warning("Could not retrieve context length for model %s via Ollama: %s", llm.name, str(e))
-    
-    # Fallback to 128k
-    return 128000
+        logging.warning(
+            "Could not retrieve context length for model %s: %s", llm.name, str(e)
+        )
+        context_length = None
+    return context_length or DEFAULT_CONTEXT_LENGTH
 
 
-def get_transcript_summary(transcript_text: str, llm: BaseChatModel, **kwargs):
+def get_transcript_summary(transcript_text: str, llm: "BaseChatModel", **kwargs):
     """
     Generates a summary from a video transcript using a language model.
 
@@ -109,9 +86,10 @@ def get_transcript_summary(transcript_text: str, llm: BaseChatModel, **kwargs):
     max_context_length = get_max_context_length(llm)
 
     # if the number of tokens in the transcript (plus the number of tokens in the prompt) exceed the model's context window, an exception is raised
+    tokenizer = get_tokenizer_for(llm)
     total_tokens = num_tokens_from_string(
-        string=user_prompt, model=llm.name
-    ) + num_tokens_from_string(string=SYSTEM_PROMPT, model=llm.name)
+        string=user_prompt, encoding_name=tokenizer
+    ) + num_tokens_from_string(string=SYSTEM_PROMPT, encoding_name=tokenizer)
     if total_tokens > max_context_length:
         raise TranscriptTooLongForModelException(
             message=f"Your transcript exceeds the context window of the chosen model ({llm.name}), which is {max_context_length} tokens. "
@@ -122,6 +100,8 @@ def get_transcript_summary(transcript_text: str, llm: BaseChatModel, **kwargs):
             model_name=llm.name,
         )
 
+    from langchain.messages import HumanMessage, SystemMessage
+
     messages = [
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=user_prompt),
@@ -132,5 +112,11 @@ def get_transcript_summary(transcript_text: str, llm: BaseChatModel, **kwargs):
         llm.name,
         total_tokens,
     )
-    response = llm.invoke(messages)
+    response = call_with_rate_limit(
+        get_rate_limiter_for(llm),
+        lambda: resilient_call(
+            get_dependency_for(llm), lambda: llm.invoke(messages), idempotent=False
+        ),
+        tokens=total_tokens,
+    )
     return response.content
@@ -0,0 +1,96 @@
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from modules.config import DEFAULT_CONFIG_PATH, get_config
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# encodings that are loaded or being loaded, keyed by their name
+_loads: Dict[str, Future] = {}
+_loads_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tokenizer")
+
+
+def get_cache_dir() -> str:
+    """Returns the directory tiktoken reads the BPE files of the encodings from.
+
+    It's the TIKTOKEN_CACHE_DIR environment variable if set, else the configured directory relative to the repo.
+    The files are downloaded into it when the Docker image is built, see the __main__ block below.
+    """
+    cache_dir = os.getenv("TIKTOKEN_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = str(
+            DEFAULT_CONFIG_PATH.parent / get_config().get("tokenizer.cache_dir")
+        )
+        # tiktoken looks up the cache directory on every load
+        os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+    return cache_dir
+
+
+def _load_encoding(encoding_name: str) -> "tiktoken.Encoding":
+    import tiktoken
+
+    get_cache_dir()
+    encoding = tiktoken.get_encoding(encoding_name)
+    # the first encode builds internal tables, which is part of the latency of the first request otherwise
+    encoding.encode("warm up")
+    logging.info("Loaded tokenizer %s.", encoding_name)
+    return encoding
+
+
+def _submit_load(encoding_name: str) -> Future:
+    with _loads_lock:
+        if encoding_name not in _loads:
+            _loads[encoding_name] = _executor.submit(_load_encoding, encoding_name)
+        return _loads[encoding_name]
+
+
+def prewarm_encodings(encoding_names: Optional[Iterable[str]] = None):
+    """Loads the encodings (by default the configured ones) in the background, so that the first request doesn't have to."""
+    for encoding_name in encoding_names or get_config().get("tokenizer.encodings"):
+        _submit_load(encoding_name)
+
+
+def get_encoding(
+    encoding_name: str, timeout: Optional[float] = None
+) -> Optional["tiktoken.Encoding"]:
+    """Returns the encoding or None if it couldn't be loaded within the timeout.
+
+    Loading an encoding whose BPE file isn't in the cache directory downloads it, which fails or stalls
+    without network access. A failed load isn't retried, so that callers don't wait for it again.
+
+    Args:
+        encoding_name (str): Name of the tiktoken encoding, e.g. 'o200k_base'.
+        timeout (Optional[float]): Seconds to wait for the encoding. Defaults to the configured load timeout.
+    """
+    if timeout is None:
+        timeout = get_config().get("tokenizer.load_timeout")
+    future = _submit_load(encoding_name)
+    try:
+        return future.result(timeout=timeout)
+    except Exception as e:
+        logging.warning(
+            "Tokenizer %s is not available (%s), token counts are estimated.",
+            encoding_name,
+            str(e) or type(e).__name__,
+        )
+        return None
+
+
+def clear_encodings():
+    with _loads_lock:
+        _loads.clear()
+
+
+if __name__ == "__main__":
+    # downloads the BPE files of the given (by default the configured) encodings into the cache directory
+    logging.basicConfig(level=logging.INFO)
+    names = sys.argv[1:] or get_config().get("tokenizer.encodings")
+    for name in names:
+        _load_encoding(name)
+    print(f"Cached {', '.join(names)} in {get_cache_dir()}")
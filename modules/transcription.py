@@ -1,13 +1,15 @@
-import whisper
 import os
+import threading
+from typing import List, Tuple
+
+from modules.segments import Segment, join_segments
 from modules.youtube import get_video_metadata
-from pytubefix import YouTube
 
 
-# Lazy load whisper model to avoid network issues at import time
-# Note: This uses a simple global variable pattern which is safe for
-# single-threaded Streamlit apps but not thread-safe for concurrent use
+# Lazy load whisper (and torch) and its model to avoid network issues and a slow start at import time.
+# The lock guards the first load, as transcriptions may run in background threads
 model = None
+_model_lock = threading.Lock()
 
 def get_whisper_model():
     """Lazy-load the Whisper model on first use.
@@ -15,8 +17,11 @@ def get_whisper_model():
     Returns the singleton Whisper model instance.
     """
     global model
-    if model is None:
-        model = whisper.load_model("base")
+    with _model_lock:
+        if model is None:
+            import whisper
+
+            model = whisper.load_model("base")
     return model
 
 
@@ -25,6 +30,8 @@ def download_mp3(video_id: str, download_folder_path: str):
 
     Returns the full path to the MP3 audio file.
     """
+    from pytubefix import YouTube
+
     video_url = f"https://www.youtube.com/watch?v={video_id}"
     audio_filename = get_video_metadata(video_url)["name"]
     audio_filepath = os.path.join(download_folder_path, audio_filename)
@@ -32,10 +39,29 @@ def download_mp3(video_id: str, download_folder_path: str):
     return yt.streams.get_audio_only().download(mp3=True, filename=audio_filepath)
 
 
+def generate_transcript_segments(file_path: str) -> Tuple[str, List[Segment]]:
+    """Transcribes the audio file at the given path using Whisper base model.
+
+    Returns the transcription as plain text together with its timed segments.
+    """
+    transcription = get_whisper_model().transcribe(file_path)
+    return join_segments(
+        (
+            (
+                segment["start"],
+                segment["end"] - segment["start"],
+                segment["text"].strip(),
+            )
+            for segment in transcription["segments"]
+        ),
+        separator=" ",
+    )
+
+
 def generate_transcript(file_path: str):
     """Transcribes the audio file at the given path using Whisper base model.
 
     Returns the transcription as plain text.
     """
-    transcription = get_whisper_model().transcribe(file_path)
-    return transcription["text"]
+    transcript_text, _ = generate_transcript_segments(file_path)
+    return transcript_text
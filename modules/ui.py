@@ -1,16 +1,18 @@
 import os
+from typing import Callable, Optional, Union
 
 import streamlit as st
 
+from modules.capabilities import peek_model_capabilities
+from modules.export import EXPORT_FORMATS, ExportFormat
+from modules.health import get_ollama_model_names, is_ollama_ready, is_openai_key_valid
 from modules.helpers import (
     get_available_models,
     get_config_value,
-    get_ollama_models,
     get_openai_base_url,
     is_api_key_set,
-    is_api_key_valid,
-    is_ollama_available,
 )
+from modules.resilience import get_unavailable_dependencies
 
 GENERAL_ERROR_MESSAGE = "An unexpected error occurred. If you are a developer and run the app locally, you can view the logs to see details about the error."
 
@@ -27,12 +29,22 @@ def display_api_key_warning():
             it should be on the right side. 
             """
         )
-    elif "openai_api_key" in st.session_state and not is_api_key_valid(
+    elif "openai_api_key" in st.session_state and not is_openai_key_valid(
         st.session_state.openai_api_key
     ):
         st.warning("API key seems to be invalid.")
 
 
+def display_degraded_mode_banner():
+    """Displays a warning if dependencies are unavailable, because they failed repeatedly."""
+    unavailable = get_unavailable_dependencies()
+    if unavailable:
+        st.warning(
+            f":construction: Running in degraded mode. The following services are currently unavailable: "
+            f"{', '.join(sorted(unavailable))}. Features that depend on them won't work until they recover."
+        )
+
+
 def set_api_key_in_session_state():
     """If the env-var OPENAI_API_KEY is set, it's value is assigned to openai_api_key property in streamlit's session state.
     Otherwise an input field for the API key is diplayed.
@@ -82,13 +94,13 @@ def display_model_settings_sidebar():
         )
         available_models = []
         if provider == "Ollama":
-            ollama_ready = is_ollama_available()
+            ollama_ready = is_ollama_ready()
             if not ollama_ready:
                 st.warning(
                     "Ollama server not reachable. Ensure it is running locally on port 11434 or set the host via the `OLLAMA_HOST` environment variable."
                 )
             available_models = (
-                get_ollama_models(model_type="gpts") if ollama_ready else []
+                get_ollama_model_names(model_type="gpts") if ollama_ready else []
             )
             if not available_models:
                 st.warning(
@@ -119,6 +131,12 @@ def display_model_settings_sidebar():
             help=get_config_value("help_texts.model"),
             disabled=not available_models,
         )
+        if available_models:
+            # not shown until the capabilities of an Ollama model are resolved in the background
+            capabilities = peek_model_capabilities(provider, model)
+            context_length = capabilities and capabilities.context_length
+            if context_length:
+                st.caption(f"Context window: {context_length:,} tokens")
         st.slider(
             label="Adjust temperature",
             min_value=0.0,
@@ -147,6 +165,42 @@ def display_model_settings_sidebar():
             )
 
 
+def display_hedging_settings_sidebar():
+    """Displays the settings for hedging requests with a backup model.
+
+    The selected backup model can be accessed via st.session_state.backup_model in the form '<provider>: <model>'.
+    """
+    with st.sidebar:
+        hedging_enabled = st.checkbox(
+            label="Hedge with a backup model",
+            key="hedging_enabled",
+            help=get_config_value("help_texts.hedging"),
+        )
+        if not hedging_enabled:
+            return
+        options = []
+        if is_api_key_set():
+            options += [
+                f"OpenAI: {model}"
+                for model in get_available_models(
+                    model_type="gpts",
+                    api_key=st.session_state.get("openai_api_key", ""),
+                )
+            ]
+        if is_ollama_ready():
+            options += [f"Ollama: {model}" for model in get_ollama_model_names("gpts")]
+        primary_model = f"{st.session_state.llm_provider}: {st.session_state.model}"
+        options = [option for option in options if option != primary_model]
+        if not options:
+            st.warning("No backup model available.")
+        st.selectbox(
+            label="Select a backup model",
+            options=options,
+            key="backup_model",
+            disabled=not options,
+        )
+
+
 def display_link_to_repo(view: str = "main"):
     gh_link = get_config_value(f"github_repo_links.{view}")
     st.sidebar.write(f"[View the source code]({gh_link})")
@@ -181,15 +235,25 @@ def display_nav_menu():
 
 
 def display_download_button(
-    data: str,
+    data: Union[str, bytes, Callable[[], Union[str, bytes]]],
     file_name: str,
     label="Download",
+    key: Optional[str] = None,
+    export_format: ExportFormat = "md",
 ):
+    """Displays a button for downloading markdown or another export format.
+
+    If data is a callable, it's only called when the button is clicked, e.g. to build a large export.
+    """
+    extension, mime, format_name = EXPORT_FORMATS[export_format]
     st.download_button(
         label=label,
         data=data,
-        file_name=f"{file_name}.md",
-        mime="text/markdown",
+        file_name=f"{file_name}{extension}",
+        mime=mime,
         icon=":material/download:",
-        help="Download as markdown",
+        help=f"Download as {format_name}",
+        key=key,
+        # downloading doesn't change anything on the page
+        on_click="ignore",
     )
@@ -1,16 +1,34 @@
 import json
 import logging
+from typing import List, Tuple
 
-from requests import api
+from requests import Session, api
 from requests.exceptions import RequestException
 from youtube_transcript_api import CouldNotRetrieveTranscript, YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter
 
-from .helpers import extract_youtube_video_id, get_preferred_languages
+from .helpers import (
+    extract_youtube_video_id,
+    get_config_value,
+    get_preferred_languages,
+)
+from .resilience import resilient_call
+from .segments import Segment, join_segments
 
 OEMBED_PROVIDER = "https://noembed.com/embed"
 
 
+class TimeoutSession(Session):
+    """A requests session whose requests time out, as youtube_transcript_api doesn't set a timeout."""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
 class NoTranscriptReceivedException(Exception):
     def __init__(self, url: str):
         # message should be a user-friendly error message
@@ -55,8 +73,8 @@ def get_video_metadata(url: str):
         }
 
 
-def fetch_youtube_transcript(url: str):
-    """Fetches the transcript of a YouTube video. Returns transcript text."""
+def fetch_youtube_transcript_segments(url: str) -> Tuple[str, List[Segment]]:
+    """Fetches the transcript of a YouTube video. Returns the transcript text and its timed segments."""
 
     video_id = extract_youtube_video_id(url)
     if video_id is None:
@@ -64,12 +82,26 @@ def fetch_youtube_transcript(url: str):
             "Something is wrong with the URL :confused:", video_id
         )
 
+    api_client = YouTubeTranscriptApi(
+        http_client=TimeoutSession(get_config_value("resilience.timeouts.youtube"))
+    )
     try:
-        transcript = YouTubeTranscriptApi().fetch(
-            video_id, languages=get_preferred_languages()
+        transcript = resilient_call(
+            "youtube",
+            lambda: api_client.fetch(video_id, languages=get_preferred_languages()),
+            expected_errors=(CouldNotRetrieveTranscript,),
         )
     except CouldNotRetrieveTranscript as e:
         logging.error("Failed to retrieve transcript for URL: %s", str(e))
         raise NoTranscriptReceivedException(url)
     else:
-        return TextFormatter().format_transcript(transcript)
+        # joined the same way as youtube_transcript_api's TextFormatter does it
+        return join_segments(
+            (snippet.start, snippet.duration, snippet.text) for snippet in transcript
+        )
+
+
+def fetch_youtube_transcript(url: str):
+    """Fetches the transcript of a YouTube video. Returns transcript text."""
+    transcript_text, _ = fetch_youtube_transcript_segments(url)
+    return transcript_text
@@ -1,36 +1,62 @@
 import logging
 import os
+import tempfile
 from datetime import datetime as dt
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-import chromadb
 import randomname
 import streamlit as st
-from chromadb import Collection
-from chromadb.config import Settings
-from langchain_chroma import Chroma
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
+from modules.bundles import InvalidBundleException, export_bundle, import_bundle
+from modules.clients import (
+    get_chat_model,
+    get_collection,
+    get_collection_count,
+    get_embeddings,
+    get_vector_store,
+    invalidate_collection,
+)
+from modules.compaction import (
+    compact_segments,
+    format_token_reduction,
+    log_token_reduction,
+)
 from modules.helpers import (
     get_available_models,
+    get_chroma_client,
     get_config_value,
+    get_ollama_host,
     get_openai_base_url,
-    get_ollama_models,
     is_api_key_set,
-    is_api_key_valid,
-    is_environment_prod,
-    is_ollama_available,
     num_tokens_from_string,
     pull_ollama_model,
     read_file,
 )
+from modules.health import (
+    get_health_monitor,
+    get_ollama_model_names,
+    is_chroma_ready,
+    is_ollama_ready,
+    is_openai_key_valid,
+)
+from modules.ingestion import IngestionPipeline, resolve_video_urls
+from modules.indexing import (
+    is_upgrade_running,
+    rechunk_index,
+    split_into_excerpts,
+    start_index_upgrade,
+)
+from modules.library_index import get_library_embeddings
 from modules.persistance import (
-    SQL_DB,
     LibraryEntry,
     Transcript,
     Video,
     delete_video,
+    get_ingestion_jobs,
     get_or_create_video,
+    get_titles_of_videos_with_transcript,
+    initialize_database,
     save_library_entry,
 )
 from modules.rag import (
@@ -38,13 +64,17 @@ from modules.rag import (
     embed_excerpts,
     find_relevant_documents,
     generate_response,
-    split_text_recursively,
 )
-from modules.transcription import download_mp3, generate_transcript
+from modules.resilience import CircuitOpenError, resilient_call
+from modules.segments import format_timestamp, get_timestamp_url
+from modules.transcription import download_mp3, generate_transcript_segments
+from modules.tokenizer import prewarm_encodings
 from modules.ui import (
     GENERAL_ERROR_MESSAGE,
     display_api_key_warning,
+    display_degraded_mode_banner,
     display_download_button,
+    display_hedging_settings_sidebar,
     display_link_to_repo,
     display_model_settings_sidebar,
     display_nav_menu,
@@ -56,19 +86,24 @@ from modules.youtube import (
     InvalidUrlException,
     NoTranscriptReceivedException,
     extract_youtube_video_id,
-    fetch_youtube_transcript,
+    fetch_youtube_transcript_segments,
     get_video_metadata,
 )
 
+if TYPE_CHECKING:
+    from chromadb import Collection
+
 CHUNK_SIZE_FOR_UNPROCESSED_TRANSCRIPT = 512
 DEFAULT_OLLAMA_EMBEDDING_MODEL = "nomic-embed-text:latest"
 
 st.set_page_config("Chat", layout="wide", initial_sidebar_state="auto")
+prewarm_encodings()
 if "llm_provider" not in st.session_state:
     st.session_state.llm_provider = os.getenv("YTGPT_LLM_PROVIDER", "OpenAI")
 if "embeddings_model" not in st.session_state:
     st.session_state.embeddings_model = get_config_value("default_model.embeddings")
 display_api_key_warning()
+display_degraded_mode_banner()
 
 # --- part of the sidebar which doesn't require an api key ---
 display_nav_menu()
@@ -77,30 +112,36 @@ display_link_to_repo("chat")
 # --- end ---
 
 # --- SQLite stuff ---
-SQL_DB.connect(reuse_if_open=True)
-# create tables if they don't already exist
-SQL_DB.create_tables([Video, Transcript, LibraryEntry], safe=True)
+# connect and create tables (or add new columns) if they don't already exist
+initialize_database()
 # --- end ---
 
 # --- Chroma ---
 chroma_connection_established = False
-chroma_settings = Settings(allow_reset=True, anonymized_telemetry=False)
-collection: Collection = None
-try:
-    chroma_client = chromadb.HttpClient(
-        host="chromadb" if is_environment_prod() else "localhost",
-        settings=chroma_settings,
-    )
-except Exception as e:
-    logging.error(e)
-    st.warning(
-        "Connection to ChromaDB could not be established! You need to have a ChromaDB instance up and running locally on port 8000!"
-    )
+collection: "Collection" = None
+collection_cache_ttl = get_config_value("chroma.collection_cache_ttl")
+chroma_warning = "Connection to ChromaDB could not be established! You need to have a ChromaDB instance up and running locally on port 8000!"
+# the availability is probed in the background, so a Chroma server that is down doesn't block every rerun
+if not is_chroma_ready():
+    st.warning(chroma_warning)
 else:
-    chroma_connection_established = True
+    try:
+        # the client is shared across reruns and sessions, so it only has to be created once
+        chroma_client = resilient_call("chroma", get_chroma_client)
+    except Exception as e:
+        logging.error(e)
+        st.warning(chroma_warning)
+    else:
+        chroma_connection_established = True
 # --- end ---
 
 
+def pull_default_embedding_model():
+    if pull_ollama_model(DEFAULT_OLLAMA_EMBEDDING_MODEL):
+        # probe again in the background, so that the pulled model shows up without blocking the callback
+        get_health_monitor().refresh()
+
+
 def is_video_selected():
     return True if selected_video_title else False
 
@@ -114,6 +155,35 @@ def refresh_page(message: str):
         st.rerun()
 
 
+@st.fragment(run_every=2)
+def display_batch_progress(batch_id: str):
+    """Displays the progress of a batch of videos processed in the background."""
+    jobs = get_ingestion_jobs(batch_id)
+    finished = [j for j in jobs if j["status"] in ("done", "skipped", "failed")]
+    st.progress(
+        len(finished) / len(jobs) if jobs else 1.0,
+        text=f"{len(finished)} of {len(jobs)} videos finished",
+    )
+    st.dataframe(jobs, hide_index=True)
+
+
+def create_bundle(yt_video_ids=None) -> bytes:
+    """Exports the processed videos (all by default) as bundle. Passed to the download button, so it only runs on download.
+
+    Like the exports of the library, the bundle is written to a temporary file in the export directory,
+    so it isn't built up in memory.
+    """
+    export_dir = Path(get_config_value("export.cache_dir"))
+    export_dir.mkdir(parents=True, exist_ok=True)
+    fd, bundle_path = tempfile.mkstemp(dir=export_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as bundle_file:
+            export_bundle(chroma_client, bundle_file, yt_video_ids=yt_video_ids)
+        return Path(bundle_path).read_bytes()
+    finally:
+        os.unlink(bundle_path)
+
+
 # variable for holding the Video object
 saved_video = None
 
@@ -126,6 +196,10 @@ def save_response_to_lib():
             question_text=st.session_state.user_prompt,
             response_text=st.session_state.response,
             video=saved_video,
+            # adds the answer to the semantic search of the library in the background
+            embeddings=get_library_embeddings(
+                st.session_state.llm_provider, st.session_state.get("openai_api_key")
+            ),
         )
     except Exception as e:
         st.error("Saving failed! If you are a developer, see logs for details!")
@@ -135,12 +209,13 @@ def save_response_to_lib():
 
 
 display_model_settings_sidebar()
+display_hedging_settings_sidebar()
 
 provider = st.session_state.llm_provider
 provider_is_openai = provider == "OpenAI"
-ollama_ready = is_ollama_available() if not provider_is_openai else False
+ollama_ready = is_ollama_ready() if not provider_is_openai else False
 openai_ready = (
-    is_api_key_set() and is_api_key_valid(st.session_state.openai_api_key)
+    is_api_key_set() and is_openai_key_valid(st.session_state.openai_api_key)
     if provider_is_openai
     else False
 )
@@ -158,7 +233,7 @@ if provider_ready and chroma_connection_established:
             api_key=st.session_state.openai_api_key, model_type="embeddings"
         )
     else:
-        embedding_options = get_ollama_models(model_type="embeddings")
+        embedding_options = get_ollama_model_names(model_type="embeddings")
     selected_embeddings_model = st.sidebar.selectbox(
         label="Select an embedding model",
         options=(
@@ -177,44 +252,54 @@ if provider_ready and chroma_connection_established:
         st.warning("No Ollama embedding models available. Pull one to continue.")
         st.button(
             f"Pull {DEFAULT_OLLAMA_EMBEDDING_MODEL}",
-            on_click=lambda: pull_ollama_model(DEFAULT_OLLAMA_EMBEDDING_MODEL),
+            on_click=pull_default_embedding_model,
             key="pull_embedding_model",
         )
     # --- end ---
 
     # --- initialize models ---
-    if provider_is_openai:
-        chat_model = ChatOpenAI(
-            name=st.session_state.model,
-            api_key=st.session_state.openai_api_key,
-            base_url=get_openai_base_url(),
-            temperature=st.session_state.temperature,
-            model=st.session_state.model,
-            top_p=st.session_state.top_p,
-            # max_tokens=2048,
-        )
-        embedding_model = OpenAIEmbeddings(
-            api_key=st.session_state.openai_api_key,
-            base_url=get_openai_base_url(),
+    llm_api_key = st.session_state.get("openai_api_key")
+    llm_base_url = get_openai_base_url() if provider_is_openai else get_ollama_host()
+    chat_model = get_chat_model(
+        provider=provider,
+        model=st.session_state.model,
+        temperature=st.session_state.temperature,
+        top_p=st.session_state.top_p,
+        api_key=llm_api_key if provider_is_openai else None,
+        base_url=llm_base_url,
+    )
+    embedding_model = (
+        get_embeddings(
+            provider=provider,
             model=st.session_state.embeddings_model,
+            api_key=llm_api_key if provider_is_openai else None,
+            base_url=llm_base_url,
         )
-    else:
-        chat_model = ChatOllama(
-            name=st.session_state.model,
-            model=st.session_state.model,
+        if provider_is_openai or embeddings_available
+        else None
+    )
+
+    backup_chat_model = None
+    if st.session_state.get("hedging_enabled") and st.session_state.get("backup_model"):
+        backup_provider, backup_model = st.session_state.backup_model.split(": ", 1)
+        backup_chat_model = get_chat_model(
+            provider=backup_provider,
+            model=backup_model,
             temperature=st.session_state.temperature,
             top_p=st.session_state.top_p,
-        )
-        embedding_model = (
-            OllamaEmbeddings(model=st.session_state.embeddings_model)
-            if embeddings_available
-            else None
+            api_key=(
+                st.session_state.get("openai_api_key")
+                if backup_provider == "OpenAI"
+                else None
+            ),
+            base_url=(
+                get_openai_base_url()
+                if backup_provider == "OpenAI"
+                else get_ollama_host()
+            ),
         )
     # --- end ---
 
-    # fetch all saved videos from SQLite
-    saved_videos = Video.select()
-
     # create columns
     col1, col2 = st.columns([0.5, 0.5], gap="large")
 
@@ -223,9 +308,7 @@ if provider_ready and chroma_connection_established:
             label="Select from already processed videos",
             placeholder="Choose a video",
             # only videos with an associated transcript can be selected
-            options=[
-                video.title for video in saved_videos if video.transcripts.count() != 0
-            ],
+            options=get_titles_of_videos_with_transcript(),
             index=None,
             key="selected_video",
             help=get_config_value("help_texts.selected_video"),
@@ -255,17 +338,31 @@ if provider_ready and chroma_connection_established:
                 key="delete_video_button",
                 help="Deletes selected video. You won't be able to Q&A this video, unless you process it again!",
             )
-            collection = chroma_client.get_collection(
-                name=saved_video.chroma_collection_name(),
-            )
+            collection_name = saved_video.chroma_collection_name()
+            try:
+                collection = resilient_call(
+                    "chroma",
+                    lambda: get_collection(
+                        chroma_client,
+                        name=collection_name,
+                        ttl=collection_cache_ttl,
+                    ),
+                )
+            except CircuitOpenError as e:
+                st.error(e.message)
+            except Exception as e:
+                logging.error("Could not get the collection: %s", str(e))
+                st.error(GENERAL_ERROR_MESSAGE)
             if delete_video_button:
                 try:
-                    chroma_client.delete_collection(
-                        name=saved_video.chroma_collection_name(),
-                    )
-                    delete_video(
-                        video_title=selected_video_title,
-                    )
+                    # the video is removed from SQLite first, a collection that can't be deleted
+                    # afterwards is an orphan, which is removed by modules.maintenance
+                    delete_video(saved_video)
+                    if collection_name:
+                        chroma_client.delete_collection(
+                            name=collection_name,
+                        )
+                        invalidate_collection(collection_name)
                 except Exception as e:
                     logging.error("An unexpected error occurred %s", str(e))
                     st.error(GENERAL_ERROR_MESSAGE)
@@ -290,6 +387,91 @@ if provider_ready and chroma_connection_established:
                 help=get_config_value("help_texts.preprocess_checkbox"),
                 disabled=is_video_selected(),
             )
+            compaction_checkbox = st.checkbox(
+                label="Compact transcript",
+                key="compaction_checkbox",
+                help=get_config_value("help_texts.compaction_checkbox"),
+                disabled=is_video_selected(),
+            )
+
+        with st.expander("Process playlists and channels"):
+            batch_input = st.text_area(
+                label="URLs of videos, playlists or channels",
+                key="batch_input",
+                help=get_config_value("help_texts.batch_ingestion"),
+                disabled=is_video_selected(),
+            )
+            if st.button(
+                label="Process all",
+                key="batch_process_button",
+                disabled=is_video_selected() or not embedding_model,
+            ):
+                try:
+                    batch_urls = resolve_video_urls(batch_input.splitlines())
+                except Exception as e:
+                    logging.error(
+                        "An unexpected error occurred: %s", str(e), exc_info=True
+                    )
+                    st.error(GENERAL_ERROR_MESSAGE)
+                else:
+                    pipeline = IngestionPipeline(
+                        chroma_client=chroma_client,
+                        embeddings=embedding_model,
+                        embeddings_model=selected_embeddings_model,
+                        embeddings_provider=(
+                            "OpenAI" if provider_is_openai else "Ollama"
+                        ),
+                        chunk_size=chunk_size,
+                        workers=get_config_value("ingestion.workers"),
+                        queue_size=get_config_value("ingestion.queue_size"),
+                        max_attempts=get_config_value("ingestion.max_attempts"),
+                        stale_after=get_config_value("ingestion.stale_after"),
+                    )
+                    st.session_state.batch_id = pipeline.submit(batch_urls)
+                    pipeline.start(st.session_state.batch_id)
+            if "batch_id" in st.session_state:
+                display_batch_progress(st.session_state.batch_id)
+
+        with st.expander("Export and import processed videos"):
+            st.caption(get_config_value("help_texts.bundles"))
+            display_download_button(
+                data=lambda yt_video_ids=(
+                    [saved_video.yt_video_id] if saved_video else None
+                ): create_bundle(yt_video_ids),
+                file_name=saved_video.title if saved_video else "Processed videos",
+                label=(
+                    "Export the selected video"
+                    if saved_video
+                    else "Export all processed videos"
+                ),
+                key="export_bundle",
+                export_format="zip",
+            )
+            bundle_file = st.file_uploader(
+                label="Import videos", type="zip", key="bundle_file"
+            )
+            if bundle_file and st.button(label="Import", key="import_bundle_button"):
+                try:
+                    with st.spinner("Importing videos..."):
+                        import_result = import_bundle(chroma_client, bundle_file)
+                except InvalidBundleException as e:
+                    st.error(e.message)
+                except CircuitOpenError as e:
+                    st.error(e.message)
+                except Exception as e:
+                    logging.error(
+                        "An unexpected error occurred: %s", str(e), exc_info=True
+                    )
+                    st.error(GENERAL_ERROR_MESSAGE)
+                else:
+                    refresh_page(
+                        message=f"Imported {len(import_result.imported)} videos."
+                        + (
+                            f" Skipped {len(import_result.skipped)} videos, which were already processed."
+                            if import_result.skipped
+                            else ""
+                        )
+                    )
 
         if process_button and not embedding_model:
             st.warning("Please pull an Ollama embedding model before processing.")
@@ -315,20 +497,47 @@ if provider_ready and chroma_connection_established:
                         saved_on=dt.now(),
                     )
                     # 2. fetch transcript from youtube
-                    original_transcript = fetch_youtube_transcript(url_input)
+                    original_transcript, transcript_segments = (
+                        fetch_youtube_transcript_segments(url_input)
+                    )
 
-                    # 3. save transcript, or more precisely, information about it, in the database
-                    saved_transcript = Transcript.create(
+                    # 3. save transcript, incl. its timed segments, in the database
+                    token_count_model = (
+                        chat_model.model_name
+                        if provider_is_openai
+                        else st.session_state.model
+                    )
+                    saved_transcript = Transcript(
                         video=saved_video,
+                        text=original_transcript,
                         original_token_num=num_tokens_from_string(
                             string=original_transcript,
-                            model=(
-                                chat_model.model_name
-                                if provider_is_openai
-                                else st.session_state.model
-                            ),
+                            model=token_count_model,
                         ),
                     )
+                    saved_transcript.set_segments(transcript_segments)
+                    # optionally compact the transcript to reduce the number of tokens to embed.
+                    # The compacted form is saved next to the original one
+                    transcript_text = original_transcript
+                    if compaction_checkbox:
+                        transcript_text, transcript_segments = compact_segments(
+                            transcript_text=original_transcript,
+                            segments=transcript_segments,
+                        )
+                        saved_transcript.compacted_text = transcript_text
+                        saved_transcript.set_segments(
+                            transcript_segments, compacted=True
+                        )
+                        saved_transcript.processed_token_num = num_tokens_from_string(
+                            string=transcript_text,
+                            model=token_count_model,
+                        )
+                        log_token_reduction(
+                            yt_video_id=saved_video.yt_video_id,
+                            original_token_num=saved_transcript.original_token_num,
+                            compacted_token_num=saved_transcript.processed_token_num,
+                        )
+                    saved_transcript.save()
 
                     # 4. get an already existing or create a new collection in ChromaDB
                     collection = chroma_client.get_or_create_collection(
@@ -343,31 +552,19 @@ if provider_ready and chroma_connection_established:
                         },
                     )
 
-                    # 5. create excerpts. Either
-                    #   - from original transcript
-                    #   - or from whisper transcription if transcription checkbox is checked
-                    if transcription_checkbox:
-                        download = download_mp3(
-                            video_id=saved_video.yt_video_id,
-                            download_folder_path="data/audio",
-                        )
-                        whisper_transcript = generate_transcript(file_path=download)
-                        transcript_excerpts = split_text_recursively(
-                            transcript_text=whisper_transcript,
-                            chunk_size=chunk_size,
-                            len_func="tokens",
-                        )
-                    else:
-                        transcript_excerpts = split_text_recursively(
-                            transcript_text=original_transcript,
-                            chunk_size=chunk_size,
-                            len_func="tokens",
-                        )
+                    # 5. create excerpts from the (compacted) transcript. If advanced transcription is enabled,
+                    #   the index is upgraded with a Whisper transcription in the background afterwards,
+                    #   so that the video can be queried right away
+                    transcript_excerpts = split_into_excerpts(
+                        transcript_text=transcript_text,
+                        chunk_size=chunk_size,
+                        segments=transcript_segments,
+                    )
 
                     # 6. embed/index transcript excerpts
                     Transcript.update(
                         {
-                            Transcript.preprocessed: transcription_checkbox,
+                            Transcript.preprocessed: False,
                             Transcript.chunk_size: chunk_size,
                             Transcript.chroma_collection_id: collection.id,
                             Transcript.chroma_collection_name: collection.name,
@@ -378,12 +575,33 @@ if provider_ready and chroma_connection_established:
                         excerpts=transcript_excerpts,
                         embeddings=embedding_model,
                     )
+                    invalidate_collection(collection.name)
+
+                    # 7. transcribe with whisper and swap the index once it's done
+                    if transcription_checkbox:
+                        yt_video_id = saved_video.yt_video_id
+                        start_index_upgrade(
+                            chroma_client=chroma_client,
+                            video=saved_video,
+                            transcribe=lambda: generate_transcript_segments(
+                                file_path=download_mp3(
+                                    video_id=yt_video_id,
+                                    download_folder_path="data/audio",
+                                )
+                            ),
+                            chunk_size=chunk_size,
+                            embeddings=embedding_model,
+                            collection_metadata=collection.metadata,
+                            compacted=compaction_checkbox,
+                        )
                 except InvalidUrlException as e:
                     st.error(e.message)
                     e.log_error()
                 except NoTranscriptReceivedException as e:
                     st.error(e.message)
                     e.log_error()
+                except CircuitOpenError as e:
+                    st.error(e.message)
                 except Exception as e:
                     logging.error(
                         "An unexpected error occurred: %s", str(e), exc_info=True
@@ -392,6 +610,16 @@ if provider_ready and chroma_connection_established:
                 else:
                     refresh_page(
                         message="The video has been processed! Please refresh the page and choose it in the select-box above."
+                        + (
+                            f" Compacting the transcript reduced it by {format_token_reduction(saved_transcript.original_token_num, saved_transcript.processed_token_num)}."
+                            if compaction_checkbox
+                            else ""
+                        )
+                        + (
+                            " The answers will be based on YouTube's captions until the Whisper transcription, which runs in the background, is finished."
+                            if transcription_checkbox
+                            else ""
+                        )
                     )
 
     with col2:
@@ -410,7 +638,10 @@ if provider_ready and chroma_connection_established:
                 with st.expander("Video Summary"):
                     st.container(height=512, border=False).write(saved_summary.text)
 
-        if collection and collection.count() > 0:
+        if (
+            collection
+            and get_collection_count(collection, ttl=collection_cache_ttl) > 0
+        ):
             collection_embeddings_model = collection.metadata.get("embeddings_model")
             collection_embeddings_provider = collection.metadata.get(
                 "embeddings_provider", "OpenAI"
@@ -422,17 +653,21 @@ if provider_ready and chroma_connection_established:
                         "OpenAI API key is required to query this collection's embeddings."
                     )
                     st.stop()
-                retrieval_embeddings = OpenAIEmbeddings(
-                    api_key=st.session_state.openai_api_key,
+                retrieval_embeddings = get_embeddings(
+                    provider="OpenAI",
                     model=collection_embeddings_model,
+                    api_key=st.session_state.openai_api_key,
+                    base_url=get_openai_base_url(),
                 )
             else:
-                if not is_ollama_available():
+                if not is_ollama_ready():
                     st.warning(
                         "Ollama server is required to query this collection's embeddings."
                     )
                     st.stop()
-                available_ollama_embeddings = get_ollama_models(model_type="embeddings")
+                available_ollama_embeddings = get_ollama_model_names(
+                    model_type="embeddings"
+                )
                 if (
                     collection_embeddings_model
                     and collection_embeddings_model not in available_ollama_embeddings
@@ -441,17 +676,67 @@ if provider_ready and chroma_connection_established:
                         f"Ollama embedding model '{collection_embeddings_model}' is not available. Please pull it before continuing."
                     )
                     st.stop()
-                retrieval_embeddings = OllamaEmbeddings(
-                    model=collection_embeddings_model
+                retrieval_embeddings = get_embeddings(
+                    provider="Ollama",
+                    model=collection_embeddings_model,
+                    base_url=get_ollama_host(),
                 )
 
             # init vector store
-            chroma_db = Chroma(
-                client=chroma_client,
+            chroma_db = get_vector_store(
+                chroma_client,
                 collection_name=collection.name,
-                embedding_function=retrieval_embeddings,
+                embeddings=retrieval_embeddings,
             )
 
+            upgrade_running = is_upgrade_running(saved_video.yt_video_id)
+            if upgrade_running:
+                st.info(
+                    "The video is being transcribed with Whisper in the background. Until then, answers are based on YouTube's captions."
+                )
+
+            with st.expander("Change the chunk size"):
+                st.caption(get_config_value("help_texts.rechunk"))
+                current_chunk_size = collection.metadata["chunk_size"]
+                rechunk_size = st.radio(
+                    label="Chunk size",
+                    key="rechunk_size",
+                    options=sorted(CHUNK_SIZE_TO_K_MAPPING),
+                    index=sorted(CHUNK_SIZE_TO_K_MAPPING).index(current_chunk_size),
+                    horizontal=True,
+                )
+                if st.button(
+                    label="Re-chunk",
+                    key="rechunk_button",
+                    # the upgrade would replace the new index with one of the old chunk size
+                    disabled=rechunk_size == current_chunk_size or upgrade_running,
+                ):
+                    try:
+                        with st.spinner("Re-chunking the video..."):
+                            rechunked = rechunk_index(
+                                chroma_client=chroma_client,
+                                video=saved_video,
+                                chunk_size=rechunk_size,
+                                embeddings=retrieval_embeddings,
+                                collection_metadata=collection.metadata,
+                            )
+                    except CircuitOpenError as e:
+                        st.error(e.message)
+                    except Exception as e:
+                        logging.error(
+                            "An unexpected error occurred: %s", str(e), exc_info=True
+                        )
+                        st.error(GENERAL_ERROR_MESSAGE)
+                    else:
+                        if rechunked:
+                            refresh_page(
+                                message=f"The video was re-chunked to a chunk size of {rechunk_size}."
+                            )
+                        else:
+                            st.warning(
+                                "The transcript of this video wasn't stored. Delete and process the video again to change its chunk size."
+                            )
+
             with st.expander(label=":information_source: Tips and important notes"):
                 st.markdown(read_file(".assets/rag_quidelines.md"))
 
@@ -474,8 +759,11 @@ if provider_ready and chroma_connection_established:
                             question=prompt,
                             llm=chat_model,
                             relevant_docs=relevant_docs,
+                            backup_llm=backup_chat_model,
                         )
                         st.session_state.response = response
+                    except CircuitOpenError as e:
+                        st.error(e.message)
                     except Exception as e:
                         logging.error(
                             "An unexpected error occurred: %s", str(e), exc_info=True
@@ -496,6 +784,11 @@ if provider_ready and chroma_connection_established:
                             label="Show chunks retrieved from index and provided to the model as context"
                         ):
                             for d in relevant_docs:
+                                if "start" in d.metadata:
+                                    st.markdown(
+                                        f"[{format_timestamp(d.metadata['start'])} - {format_timestamp(d.metadata['end'])}]"
+                                        f"({get_timestamp_url(saved_video.link, d.metadata['start'])})"
+                                    )
                                 st.write(d.page_content)
                                 st.divider()
 else:
@@ -1,22 +1,42 @@
-from typing import List, Literal
+import logging
+import os
+from typing import List, Literal, Optional
 
 import streamlit as st
 
-from modules.persistance import SQL_DB, LibraryEntry, Video, delete_library_entry
-from modules.ui import display_download_button, display_nav_menu
+from modules.export import EXPORT_FORMATS, get_export_data
+from modules.helpers import get_config_value
+from modules.library_index import (
+    count_unindexed_entries,
+    get_library_embeddings,
+    is_backfill_running,
+    search_library_semantically,
+    start_library_backfill,
+)
+from modules.persistance import (
+    LibraryEntry,
+    delete_library_entry,
+    get_channels_with_summaries,
+    get_library_entry_text,
+    get_library_page,
+    get_titles_of_videos_with_library_entries,
+    initialize_database,
+    search_library,
+)
+from modules.ui import (
+    GENERAL_ERROR_MESSAGE,
+    display_download_button,
+    display_nav_menu,
+)
 
 st.set_page_config("Library", layout="wide", initial_sidebar_state="auto")
 display_nav_menu()
 
 # --- SQLite stuff ---
-SQL_DB.connect(reuse_if_open=True)
-# create tables if they don't already exist
-SQL_DB.create_tables([LibraryEntry], safe=True)
+# connect and create tables (or add new columns) if they don't already exist
+initialize_database()
 # --- end ---
 
-tab_summaries, tab_answers = st.tabs(["Summaries", "Answers"])
-saved_videos = Video.select()
-
 
 def execute_entry_deletion(entry: LibraryEntry):
     """Wrapper func for deleting a library entry."""
@@ -24,76 +44,267 @@ def execute_entry_deletion(entry: LibraryEntry):
     st.rerun()
 
 
-def prepare_entries_for_export(
-    entries: List[LibraryEntry], entry_type: Literal["S", "A"]
-) -> str:
-    """Prepare library entries for export."""
-    if entry_type == "S":
-        return "\n\n".join(
-            [
-                f"## {entry.get_video_title()}\n\n{entry.text}\n\n---"
-                for entry in entries
-            ]
+def display_export_button(
+    entry_type: Literal["S", "A"],
+    label: str,
+    file_name: str,
+    channel: Optional[str] = None,
+    video_title: Optional[str] = None,
+):
+    """Displays a button for downloading the entries and the choice of the format.
+
+    The export is only created when the button is clicked and reused until the entries change.
+    """
+    with st.container(horizontal=True, vertical_alignment="bottom"):
+        export_format = (
+            st.segmented_control(
+                label="Format",
+                options=list(EXPORT_FORMATS),
+                format_func=lambda f: EXPORT_FORMATS[f][2],
+                default="md",
+                key=f"{entry_type}_export_format",
+                label_visibility="collapsed",
+            )
+            # no format is selected, if the selected one is clicked again
+            or "md"
         )
-    else:
-        return "\n\n".join(
-            [f"# {entry.question}\n\n{entry.text}\n\n---" for entry in entries]
+        display_download_button(
+            data=get_export_data(
+                entry_type, export_format, channel=channel, video_title=video_title
+            ),
+            file_name=file_name,
+            label=label,
+            key=f"{entry_type}_export",
+            export_format=export_format,
         )
 
 
-with tab_summaries:
-    selected_channel = st.selectbox(
-        label="Filter by channel",
-        placeholder="choose a channel or start typing",
-        # only videos with an associated transcript can be selected
-        options={
-            video.channel
-            for video in Video.select()
-            .join(LibraryEntry)
-            .where(LibraryEntry.entry_type == "S")
-            .execute()
-        },
-        index=None,
-        key="selected_channel",
-    )
+def get_page_cursors(
+    entry_type: Literal["S", "A"], filter_value: Optional[str]
+) -> List[int]:
+    """Returns the cursors of the pages up to the current one, kept in the session state per entry type and filter."""
+    return st.session_state.setdefault(f"{entry_type}_page_cursors_{filter_value}", [0])
 
-    if selected_channel:
-        saved_lib_entries_summaries = (
-            LibraryEntry.select()
-            .join(Video)
-            .where(LibraryEntry.entry_type == "S", Video.channel == selected_channel)
-            .execute()
+
+def get_current_page(
+    entry_type: Literal["S", "A"],
+    channel: Optional[str] = None,
+    video_title: Optional[str] = None,
+):
+    """Returns the entries of the current page and the cursor of the next page."""
+    cursors = get_page_cursors(entry_type, channel or video_title)
+    while True:
+        entries, next_cursor = get_library_page(
+            entry_type,
+            channel=channel,
+            video_title=video_title,
+            after_id=cursors[-1],
+            page_size=get_config_value("library.page_size"),
         )
-    else:
-        saved_lib_entries_summaries = (
-            LibraryEntry.select().where(LibraryEntry.entry_type == "S").execute()
+        # the last entries of the page were deleted, go back to the previous page
+        if entries or len(cursors) == 1:
+            return entries, next_cursor
+        cursors.pop()
+
+
+def display_pagination(
+    entry_type: Literal["S", "A"], filter_value: Optional[str], next_cursor
+):
+    """Displays the buttons for paging through the entries, if there is more than one page."""
+    cursors = get_page_cursors(entry_type, filter_value)
+    if len(cursors) == 1 and next_cursor is None:
+        return
+    # the callbacks run before the fragment reruns, which then shows the other page
+    with st.container(horizontal=True):
+        st.button(
+            "Previous page",
+            key=f"{entry_type}_previous_page",
+            icon=":material/chevron_left:",
+            disabled=len(cursors) == 1,
+            on_click=cursors.pop,
+        )
+        st.caption(f"Page {len(cursors)}")
+        st.button(
+            "Next page",
+            key=f"{entry_type}_next_page",
+            icon=":material/chevron_right:",
+            disabled=next_cursor is None,
+            on_click=cursors.append,
+            args=(next_cursor,),
         )
 
-    if saved_lib_entries_summaries:
-        if selected_channel:
+
+def display_entry_text(entry_id: int, key: str, label: str = "Show"):
+    """Displays an expander, whose text is only loaded when it's opened."""
+    expander = st.expander(label, key=key, on_change="rerun")
+    if expander.open:
+        with expander:
+            st.write(get_library_entry_text(entry_id))
+
+
+def export_answer(entry_id: int, question: str) -> str:
+    return "# " + question + "\n\n" + get_library_entry_text(entry_id)
+
+
+@st.fragment
+def display_summaries(selected_channel: Optional[str]):
+    entries, next_cursor = get_current_page("S", channel=selected_channel)
+    if not entries:
+        st.info("You don't have any saved summaries yet!")
+        return
+    if selected_channel:
+        display_export_button(
+            "S",
+            label=f"Download all summaries from {selected_channel}",
+            file_name=f"Summaries from {selected_channel}",
+            channel=selected_channel,
+        )
+    st.header("Saved summaries")
+    for entry in entries:
+        st.subheader(f"{entry.video.title} - {entry.video.channel}")
+        display_entry_text(entry.id, key=f"summary_text_{entry.id}")
+        with st.container(horizontal=True):
+            display_download_button(
+                data=lambda entry_id=entry.id: get_library_entry_text(entry_id),
+                file_name=entry.video.title,
+                key=f"download_summary_{entry.id}",
+            )
+            if st.button(
+                label="Delete entry",
+                key=f"delete_summary_{entry.id}",
+                icon=":material/delete_forever:",
+            ):
+                execute_entry_deletion(entry)
+        st.divider()
+    display_pagination("S", selected_channel, next_cursor)
+
+
+@st.fragment
+def display_answers(selected_video_title: Optional[str]):
+    entries, next_cursor = get_current_page("A", video_title=selected_video_title)
+    if not entries:
+        st.info("You don't have any saved answers yet!")
+        return
+    st.header("Saved answers")
+    for entry in entries:
+        st.subheader(entry.question)
+        display_entry_text(entry.id, key=f"answer_text_{entry.id}")
+        with st.container(horizontal=True):
             display_download_button(
-                data=prepare_entries_for_export(
-                    saved_lib_entries_summaries, entry_type="S"
+                data=lambda entry_id=entry.id, question=entry.question: export_answer(
+                    entry_id, question
                 ),
-                file_name=f"Summaries from {selected_channel}",
-                label=f"Download all summaries from {selected_channel}",
+                file_name=entry.question,
+                key=f"download_answer_{entry.id}",
             )
-        st.header("Saved summaries")
-        for i, entry in enumerate(saved_lib_entries_summaries, 0):
-            st.subheader(f"{entry.video.title} - {entry.video.channel}")
-            with st.expander("Show"):
-                st.write(entry.text)
-            with st.container(horizontal=True):
-                display_download_button(data=entry.text, file_name=entry.video.title)
-                if st.button(
-                    label="Delete entry",
-                    key=f"delete_summary_{i}",
-                    icon=":material/delete_forever:",
-                ):
-                    execute_entry_deletion(entry)
-            st.divider()
+            if st.button(
+                label="Delete entry",
+                key=f"delete_answer_{entry.id}",
+                icon=":material/delete_forever:",
+            ):
+                execute_entry_deletion(entry)
+        st.divider()
+    display_pagination("A", selected_video_title, next_cursor)
+
+
+SEARCH_RESULT_KINDS = {"S": "Summary", "A": "Answer", "T": "Transcript"}
+
+
+@st.fragment
+def display_search_results(query: str):
+    results = search_library(query, limit=get_config_value("library.page_size"))
+    if not results:
+        st.info("Nothing found.")
+        return
+    for result in results:
+        st.markdown(f"**{SEARCH_RESULT_KINDS[result.kind]}** · {result.video_title}")
+        if result.question:
+            st.caption(result.question)
+        st.markdown(result.snippet)
+        # transcripts are only shown in excerpts, as they can be very long
+        if result.kind != "T":
+            display_entry_text(result.id, key=f"search_result_text_{result.id}")
+        st.divider()
+
+
+@st.fragment
+def display_semantic_search_results(query: str):
+    provider = st.session_state.get(
+        "llm_provider", os.getenv("YTGPT_LLM_PROVIDER", "OpenAI")
+    )
+    embeddings = get_library_embeddings(
+        provider, st.session_state.get("openai_api_key") or os.getenv("OPENAI_API_KEY")
+    )
+    if embeddings is None:
+        st.info(
+            f"Searching by meaning requires an OpenAI API key or the Ollama embedding model "
+            f"'{get_config_value('library.embeddings.Ollama')}', depending on the selected provider."
+        )
+        return
+    unindexed = count_unindexed_entries(embeddings)
+    if unindexed:
+        with st.container(horizontal=True):
+            st.caption(f"{unindexed} entries aren't searchable by meaning yet.")
+            st.button(
+                "Index them",
+                key="backfill_library_index",
+                icon=":material/manage_search:",
+                disabled=is_backfill_running(embeddings),
+                on_click=start_library_backfill,
+                args=(embeddings,),
+            )
+    try:
+        results = search_library_semantically(
+            query, embeddings, k=get_config_value("library.semantic_search_results")
+        )
+    except Exception as e:
+        logging.error("Semantic search of the library failed: %s", str(e))
+        st.error(GENERAL_ERROR_MESSAGE)
+        return
+    if not results:
+        st.info("Nothing found.")
+        return
+    for entry, similarity in results:
+        st.markdown(
+            f"**{SEARCH_RESULT_KINDS[entry.entry_type]}** · {entry.video.title}"
+        )
+        if entry.question:
+            st.caption(entry.question)
+        st.caption(f"Similarity: {similarity:.2f}")
+        display_entry_text(entry.id, key=f"semantic_search_result_text_{entry.id}")
+        st.divider()
+
+
+with st.container(horizontal=True, vertical_alignment="bottom"):
+    search_query = st.text_input(
+        label="Search the library",
+        placeholder="search summaries, answers, transcripts and video titles",
+        key="library_search",
+    )
+    search_mode = st.segmented_control(
+        label="Search by",
+        options=["Keywords", "Meaning"],
+        default="Keywords",
+        key="library_search_mode",
+    )
+if search_query:
+    if search_mode == "Meaning":
+        display_semantic_search_results(search_query)
     else:
-        st.info("You don't have any saved summaries yet!")
+        display_search_results(search_query)
+
+tab_summaries, tab_answers = st.tabs(["Summaries", "Answers"])
+
+with tab_summaries:
+    selected_channel = st.selectbox(
+        label="Filter by channel",
+        placeholder="choose a channel or start typing",
+        # only channels of videos with a saved summary can be selected
+        options=get_channels_with_summaries(),
+        index=None,
+        key="selected_channel",
+    )
+    display_summaries(selected_channel)
 
 
 with tab_answers:
@@ -101,69 +312,30 @@ with tab_answers:
         label="Filter by video",
         placeholder="choose a video or start typing",
         # only videos with an associated transcript and library entries can be selected
-        options=[
-            video.title
-            for video in saved_videos
-            if (video.transcripts.count() != 0 and video.lib_entries.count() != 0)
-        ],
+        options=get_titles_of_videos_with_library_entries(),
         index=None,
         key="selected_video",
     )
 
     if selected_video_title:
-        saved_lib_entries_answers = (
-            LibraryEntry.select()
-            .join(Video)
-            .where(
-                LibraryEntry.entry_type == "A",
-                Video.title == st.session_state.selected_video,
-            )
-            .execute()
-        )
-        display_download_button(
-            data=prepare_entries_for_export(saved_lib_entries_answers, entry_type="A"),
-            file_name=f"Answers from {selected_video_title}",
+        display_export_button(
+            "A",
             label=f"Download all answers from '{selected_video_title}'",
+            file_name=f"Answers from {selected_video_title}",
+            video_title=selected_video_title,
         )
-        
+
         # Check if there's a summary for the selected video
-        saved_summary = (
-            LibraryEntry.select()
-            .join(Video)
-            .where(
-                LibraryEntry.entry_type == "S",
-                Video.title == st.session_state.selected_video,
-            )
-            .first()
+        saved_summaries, _ = get_library_page(
+            "S", video_title=selected_video_title, page_size=1
         )
-        
-        if saved_summary:
+        if saved_summaries:
             st.subheader("Video Summary")
-            with st.expander("Show Summary"):
-                st.write(saved_summary.text)
+            display_entry_text(
+                saved_summaries[0].id,
+                key=f"video_summary_text_{saved_summaries[0].id}",
+                label="Show Summary",
+            )
             st.divider()
-    else:
-        saved_lib_entries_answers = (
-            LibraryEntry.select().where(LibraryEntry.entry_type == "A").execute()
-        )
 
-    if saved_lib_entries_answers:
-        st.header("Saved answers")
-        for j, entry in enumerate(saved_lib_entries_answers, 0):
-            st.subheader(entry.question)
-            with st.expander("Show"):
-                st.write(entry.text)
-            with st.container(horizontal=True):
-                display_download_button(
-                    data="# " + entry.question + "\n\n" + entry.text,
-                    file_name=entry.question,
-                )
-                if st.button(
-                    label="Delete entry",
-                    key=f"delete_answer_{j}",
-                    icon=":material/delete_forever:",
-                ):
-                    execute_entry_deletion(entry)
-            st.divider()
-    else:
-        st.info("You don't have any saved answers yet!")
+    display_answers(selected_video_title)
@@ -3,28 +3,37 @@ import os
 from datetime import datetime as dt
 
 import streamlit as st
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
 
+from modules.capabilities import get_model_capabilities
+from modules.clients import get_chat_model
+from modules.compaction import (
+    compact_transcript,
+    format_token_reduction,
+    log_token_reduction,
+)
 from modules.helpers import (
     extract_youtube_video_id,
     get_config_value,
+    get_ollama_host,
     get_openai_base_url,
     is_api_key_set,
-    is_api_key_valid,
-    is_ollama_available,
+    num_tokens_from_string,
 )
+from modules.health import is_ollama_ready, is_openai_key_valid
+from modules.library_index import get_library_embeddings
 from modules.persistance import (
-    SQL_DB,
-    LibraryEntry,
-    Video,
     get_or_create_video,
+    get_transcript,
+    initialize_database,
     save_library_entry,
 )
+from modules.resilience import CircuitOpenError
 from modules.summary import TranscriptTooLongForModelException, get_transcript_summary
+from modules.tokenizer import prewarm_encodings
 from modules.ui import (
     GENERAL_ERROR_MESSAGE,
     display_api_key_warning,
+    display_degraded_mode_banner,
     display_download_button,
     display_link_to_repo,
     display_model_settings_sidebar,
@@ -40,12 +49,12 @@ from modules.youtube import (
 )
 
 # --- SQLite stuff ---
-SQL_DB.connect(reuse_if_open=True)
-# create tables if they don't already exist
-SQL_DB.create_tables([Video, LibraryEntry], safe=True)
+# connect and create tables (or add new columns) if they don't already exist
+initialize_database()
 # --- end ---
 
 st.set_page_config("Summaries", layout="wide", initial_sidebar_state="auto")
+prewarm_encodings()
 if "llm_provider" not in st.session_state:
     st.session_state.llm_provider = os.getenv("YTGPT_LLM_PROVIDER", "OpenAI")
 if "summary" not in st.session_state:
@@ -56,6 +65,7 @@ if "video_url" not in st.session_state:
     st.session_state.video_url = ""
 
 display_api_key_warning()
+display_degraded_mode_banner()
 
 # --- part of the sidebar which doesn't require an api key ---
 display_nav_menu()
@@ -101,6 +111,10 @@ def save_summary_to_lib():
             question_text=None,
             response_text=summary_text,
             video=saved_video,
+            # adds the summary to the semantic search of the library in the background
+            embeddings=get_library_embeddings(
+                st.session_state.llm_provider, st.session_state.get("openai_api_key")
+            ),
         )
     except Exception as e:
         st.error("Saving failed! If you are a developer, see logs for details!")
@@ -113,9 +127,9 @@ display_model_settings_sidebar()
 
 provider = st.session_state.llm_provider
 provider_is_openai = provider == "OpenAI"
-ollama_ready = is_ollama_available() if not provider_is_openai else False
+ollama_ready = is_ollama_ready() if not provider_is_openai else False
 openai_ready = (
-    is_api_key_set() and is_api_key_valid(st.session_state.openai_api_key)
+    is_api_key_set() and is_openai_key_valid(st.session_state.openai_api_key)
     if provider_is_openai
     else False
 )
@@ -135,6 +149,11 @@ if provider_ready:
             key="custom_prompt_input",
             help=get_config_value("help_texts.custom_prompt"),
         )
+        compaction_checkbox = st.checkbox(
+            label="Compact transcript",
+            key="compaction_checkbox",
+            help=get_config_value("help_texts.compaction_checkbox"),
+        )
         summarize_button = st.button("Summarize", key="summarize_button")
         if url_input != "":
             try:
@@ -157,24 +176,54 @@ if provider_ready:
     with col2:
         if summarize_button:
             try:
-                transcript = fetch_youtube_transcript(url_input)
-                if provider_is_openai:
-                    llm = ChatOpenAI(
-                        name=st.session_state.model,
-                        api_key=st.session_state.openai_api_key,
-                        base_url=get_openai_base_url(),
-                        temperature=st.session_state.temperature,
-                        model=st.session_state.model,
-                        top_p=st.session_state.top_p,
-                        # max_completion_tokens=4096,
+                # the compacted form of the transcript of a processed video is stored next to it
+                saved_transcript = (
+                    get_transcript(extract_youtube_video_id(url_input))
+                    if compaction_checkbox
+                    else None
+                )
+                transcript = (
+                    saved_transcript.text
+                    if saved_transcript
+                    else fetch_youtube_transcript(url_input)
+                )
+                if compaction_checkbox:
+                    tokenizer = get_model_capabilities(
+                        st.session_state.llm_provider, st.session_state.model
+                    ).tokenizer
+                    original_token_num = num_tokens_from_string(
+                        string=transcript, encoding_name=tokenizer
+                    )
+                    transcript = (
+                        saved_transcript.get_compacted_text()
+                        if saved_transcript
+                        else compact_transcript(transcript)
                     )
-                else:
-                    llm = ChatOllama(
-                        name=st.session_state.model,
-                        model=st.session_state.model,
-                        temperature=st.session_state.temperature,
-                        top_p=st.session_state.top_p,
+                    compacted_token_num = num_tokens_from_string(
+                        string=transcript, encoding_name=tokenizer
                     )
+                    log_token_reduction(
+                        yt_video_id=extract_youtube_video_id(url_input),
+                        original_token_num=original_token_num,
+                        compacted_token_num=compacted_token_num,
+                    )
+                    st.caption(
+                        f"Compacting the transcript reduced it by {format_token_reduction(original_token_num, compacted_token_num)}."
+                    )
+                llm = get_chat_model(
+                    provider=st.session_state.llm_provider,
+                    model=st.session_state.model,
+                    temperature=st.session_state.temperature,
+                    top_p=st.session_state.top_p,
+                    api_key=(
+                        st.session_state.openai_api_key if provider_is_openai else None
+                    ),
+                    base_url=(
+                        get_openai_base_url()
+                        if provider_is_openai
+                        else get_ollama_host()
+                    ),
+                )
                 with st.spinner("Summarizing video :gear: Hang on..."):
                     if custom_prompt:
                         resp = get_transcript_summary(
@@ -210,6 +259,8 @@ if provider_ready:
             except TranscriptTooLongForModelException as e:
                 display_dialog(e.message)
                 e.log_error()
+            except CircuitOpenError as e:
+                st.error(e.message)
             except Exception as e:
                 logging.error("An unexpected error occurred: %s", str(e), exc_info=True)
                 st.error(GENERAL_ERROR_MESSAGE)
@@ -0,0 +1,104 @@
+"""Fixtures shared by the tests: a test database and a fake Chroma client."""
+
+import uuid
+
+import numpy as np
+import pytest
+from peewee import SqliteDatabase
+
+from modules import (
+    bundles,
+    capabilities,
+    indexing,
+    ingestion,
+    library_index,
+    maintenance,
+    persistance,
+)
+from modules.persistance import MODELS
+
+# the modules that use the database directly, e.g. for transactions
+DATABASE_MODULES = [
+    bundles,
+    capabilities,
+    indexing,
+    ingestion,
+    library_index,
+    maintenance,
+    persistance,
+]
+
+
+class DummyCollection:
+    """An in-memory Chroma collection, which counts how often it was read."""
+
+    def __init__(self, name, metadata=None):
+        self.id = uuid.uuid4()
+        self.name = name
+        self.metadata = metadata
+        self.ids, self.embeddings, self.documents, self.metadatas = [], [], [], []
+        self.gets = 0
+
+    def count(self):
+        return len(self.ids)
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        self.ids.extend(ids)
+        self.embeddings.extend(np.asarray(embeddings).tolist())
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas or [None] * len(ids))
+
+    def get(self, include, limit=None, offset=0):
+        self.gets += 1
+        end = None if limit is None else offset + limit
+        return {
+            "ids": self.ids[offset:end],
+            "embeddings": np.asarray(self.embeddings[offset:end]),
+            "documents": self.documents[offset:end],
+            "metadatas": self.metadatas[offset:end],
+        }
+
+
+class DummyChromaClient:
+    """An in-memory Chroma client, whose collections are kept by name."""
+
+    def __init__(self):
+        self.collections = {}
+
+    def create_collection(self, name, metadata=None):
+        self.collections[name] = DummyCollection(name, metadata)
+        return self.collections[name]
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+    def list_collections(self):
+        return list(self.collections.values())
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+
+@pytest.fixture
+def database(tmp_path_factory, monkeypatch):
+    """A test database with all tables.
+
+    It's stored in a file, so that threads started by a test share it, and in a directory of its own,
+    so that it doesn't show up in the tmp_path of the test.
+    """
+    test_db = SqliteDatabase(str(tmp_path_factory.mktemp("database") / "test.sqlite3"))
+    for module in DATABASE_MODULES:
+        monkeypatch.setattr(module, "SQL_DB", test_db)
+    with test_db.bind_ctx(MODELS):
+        test_db.connect()
+        test_db.create_tables(MODELS)
+
+        yield test_db
+
+        test_db.drop_tables(MODELS)
+        test_db.close()
+
+
+@pytest.fixture
+def chroma_client():
+    return DummyChromaClient()
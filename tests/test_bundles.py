@@ -0,0 +1,163 @@
+import io
+import json
+import zipfile
+from datetime import datetime as dt
+
+import numpy as np
+import pytest
+
+from modules import bundles
+from modules.bundles import InvalidBundleException, export_bundle, import_bundle
+from modules.persistance import (
+    MODELS,
+    LibraryEntry,
+    Transcript,
+    Video,
+    get_or_create_video,
+    save_library_entry,
+)
+
+
+@pytest.fixture
+def processed_video(database, chroma_client, monkeypatch):
+    """A processed video with three chunks, exported in batches of two."""
+    monkeypatch.setattr(bundles, "get_config_value", lambda key_path: 2)
+    collection = chroma_client.create_collection(
+        "captions", metadata={"chunk_size": 128, "embeddings_model": "model"}
+    )
+    collection.add(
+        ids=["a", "b", "c"],
+        embeddings=[[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]],
+        documents=["first", "second", "third"],
+        metadatas=[
+            {"start": 0.0, "end": 1.0},
+            {"start": 1.0, "end": 2.5},
+            {"start": 2.5, "end": 4.0},
+        ],
+    )
+    video, _ = get_or_create_video(
+        yt_video_id="video",
+        link="https://www.youtube.com/watch?v=video",
+        title="Video",
+        channel="Channel",
+        saved_on=dt(2024, 1, 1),
+    )
+    Transcript.create(
+        video=video,
+        text="first second third",
+        segments=b"\x00\x01\x02",
+        chunk_size=128,
+        original_token_num=3,
+        chroma_collection_id=collection.id,
+        chroma_collection_name=collection.name,
+    )
+    save_library_entry("S", None, "A summary", video)
+
+    return chroma_client
+
+
+def clear_library(database, chroma_client):
+    """Removes the processed video from the database and its collection, to import it again."""
+    database.drop_tables(MODELS)
+    database.create_tables(MODELS)
+    for name in list(chroma_client.collections):
+        chroma_client.delete_collection(name)
+
+
+def test_bundle_round_trip(database, processed_video):
+    """Test that an imported video has the same transcript, chunks, embeddings and library entries."""
+    bundle = io.BytesIO()
+    assert export_bundle(processed_video, bundle) == 1
+    clear_library(database, processed_video)
+
+    result = import_bundle(processed_video, io.BytesIO(bundle.getvalue()))
+
+    assert result.imported == ["Video"]
+    transcript = Transcript.select(Transcript, Video).join(Video).get()
+    assert transcript.video.yt_video_id == "video"
+    assert transcript.video.saved_on == dt(2024, 1, 1)
+    assert transcript.text == "first second third"
+    assert transcript.segments == b"\x00\x01\x02"
+    assert (transcript.chunk_size, transcript.original_token_num) == (128, 3)
+    collection = processed_video.get_collection(transcript.chroma_collection_name)
+    assert collection.metadata == {"chunk_size": 128, "embeddings_model": "model"}
+    assert collection.documents == ["first", "second", "third"]
+    assert collection.metadatas[1] == {"start": 1.0, "end": 2.5}
+    np.testing.assert_allclose(
+        collection.embeddings, [[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]], rtol=1e-6
+    )
+    assert [e.text for e in LibraryEntry.select()] == ["A summary"]
+
+
+def test_bundle_stores_embeddings_as_npy(processed_video):
+    bundle = io.BytesIO()
+    export_bundle(processed_video, bundle)
+
+    with zipfile.ZipFile(bundle) as archive:
+        embeddings = np.load(io.BytesIO(archive.read("videos/video/embeddings.npy")))
+
+    assert embeddings.dtype == np.float32
+    assert embeddings.shape == (3, 2)
+
+
+def test_already_processed_videos_are_skipped(processed_video):
+    bundle = io.BytesIO()
+    export_bundle(processed_video, bundle)
+
+    result = import_bundle(processed_video, bundle)
+
+    assert result.skipped == ["Video"]
+    assert list(processed_video.collections) == ["captions"]
+
+
+def test_failed_import_removes_the_collection(database, processed_video, monkeypatch):
+    bundle = io.BytesIO()
+    export_bundle(processed_video, bundle)
+    clear_library(database, processed_video)
+    monkeypatch.setattr(Transcript, "create", classmethod(lambda cls, **kwargs: 1 / 0))
+
+    with pytest.raises(ZeroDivisionError):
+        import_bundle(processed_video, bundle)
+
+    assert processed_video.collections == {}
+    assert Video.select().count() == 0
+
+
+def test_invalid_bundle_is_rejected(processed_video):
+    with pytest.raises(InvalidBundleException):
+        import_bundle(processed_video, io.BytesIO(b"not a zip file"))
+
+
+def rewrite_manifest(bundle, change):
+    """Returns a copy of a bundle, whose manifest was changed by a function."""
+    rewritten = io.BytesIO()
+    with zipfile.ZipFile(bundle) as source, zipfile.ZipFile(rewritten, "w") as target:
+        for name in source.namelist():
+            if name == bundles.MANIFEST_NAME:
+                manifest = json.loads(source.read(name))
+                change(manifest["videos"][0])
+                target.writestr(name, json.dumps(manifest))
+            else:
+                target.writestr(name, source.read(name))
+    return rewritten
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda video: video["transcript"].update(chroma_collection_name="captions"),
+        lambda video: video["transcript"].pop("language"),
+        lambda video: video["files"].update(video="videos/video/text.txt"),
+        lambda video: video["files"].pop("chunks"),
+    ],
+)
+def test_bundle_with_invalid_keys_is_rejected(database, processed_video, change):
+    bundle = io.BytesIO()
+    export_bundle(processed_video, bundle)
+    clear_library(database, processed_video)
+
+    with pytest.raises(InvalidBundleException):
+        import_bundle(processed_video, rewrite_manifest(bundle, change))
+
+    assert processed_video.collections == {}
+    assert Transcript.select().count() == 0
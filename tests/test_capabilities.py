@@ -0,0 +1,165 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from modules import capabilities, catalog
+from modules.persistance import ModelCapability
+
+
+class DummyOllamaClient:
+    def __init__(self, context_length=8192):
+        self.calls = 0
+        self.context_length = context_length
+
+    def show(self, model):
+        self.calls += 1
+        return SimpleNamespace(
+            modelinfo={
+                "general.architecture": "llama",
+                "llama.context_length": self.context_length,
+                "llama.embedding_length": 4096,
+            }
+        )
+
+
+@pytest.fixture(autouse=True)
+def clear_catalog(database):
+    """Persists the capabilities in the test database and clears the in-process catalog."""
+    catalog.clear_catalog()
+    yield
+    catalog.clear_catalog()
+
+
+def test_openai_models_are_matched_exactly():
+    """Test that a model isn't matched by substring, e.g. 'gpt-4' doesn't get the window of 'gpt-4o'."""
+    assert capabilities.get_model_capabilities("OpenAI", "gpt-4").context_length == 8192
+    gpt_4o = capabilities.get_model_capabilities("OpenAI", "gpt-4o")
+    assert gpt_4o.context_length == 128000
+    assert gpt_4o.max_output_tokens == 16384
+    assert gpt_4o.tokenizer == "o200k_base"
+    assert (
+        capabilities.get_model_capabilities("OpenAI", "gpt-4o-mini-tts").context_length
+        is None
+    )
+
+
+def test_dated_snapshots_share_the_capabilities_of_their_model():
+    snapshot = capabilities.get_model_capabilities("OpenAI", "gpt-4o-2024-08-06")
+
+    assert snapshot.context_length == 128000
+    assert snapshot.max_output_tokens == 16384
+
+
+def test_embedding_dimension_of_openai_models():
+    assert (
+        capabilities.get_model_capabilities(
+            "OpenAI", "text-embedding-3-large"
+        ).embedding_dimension
+        == 3072
+    )
+
+
+def test_ollama_capabilities_are_resolved_once_and_persisted(monkeypatch):
+    """Test that the Ollama server is asked once and the persisted row is reused after a restart."""
+    client = DummyOllamaClient()
+    monkeypatch.setattr(
+        capabilities.clients, "get_ollama_client", lambda host, timeout=None: client
+    )
+
+    resolved = capabilities.get_model_capabilities(
+        "Ollama", "llama3.2", base_url="http://ollama:11434"
+    )
+    assert resolved.context_length == 8192
+    assert resolved.embedding_dimension == 4096
+    assert ModelCapability.select().count() == 1
+
+    # simulates a restart of the app, which clears the in-process catalog
+    catalog.clear_catalog()
+    assert (
+        capabilities.get_model_capabilities(
+            "Ollama", "llama3.2", base_url="http://ollama:11434"
+        )
+        == resolved
+    )
+    assert client.calls == 1
+
+
+def test_expired_capabilities_are_resolved_again(monkeypatch):
+    client = DummyOllamaClient()
+    monkeypatch.setattr(
+        capabilities.clients, "get_ollama_client", lambda host, timeout=None: client
+    )
+    capabilities.get_model_capabilities(
+        "Ollama", "llama3.2", base_url="http://ollama:11434"
+    )
+    catalog.clear_catalog()
+
+    original_get_config_value = capabilities.get_config_value
+    monkeypatch.setattr(
+        capabilities,
+        "get_config_value",
+        lambda key: (
+            0
+            if key == "model_catalog.capabilities_ttl"
+            else original_get_config_value(key)
+        ),
+    )
+    capabilities.get_model_capabilities(
+        "Ollama", "llama3.2", base_url="http://ollama:11434"
+    )
+
+    assert client.calls == 2
+    assert ModelCapability.select().count() == 1
+
+
+def test_capabilities_are_kept_per_ollama_host(monkeypatch):
+    """Test that the same tag on two Ollama servers doesn't share the persisted capabilities."""
+    ollama_clients = {
+        "http://small:11434": DummyOllamaClient(context_length=2048),
+        "http://large:11434": DummyOllamaClient(context_length=131072),
+    }
+    monkeypatch.setattr(
+        capabilities.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: ollama_clients[host],
+    )
+
+    for host, client in ollama_clients.items():
+        resolved = capabilities.get_model_capabilities(
+            "Ollama", "llama3.2", base_url=host
+        )
+        assert resolved.context_length == client.context_length
+    catalog.clear_catalog()
+
+    assert ModelCapability.select().count() == 2
+    assert (
+        capabilities.get_model_capabilities(
+            "Ollama", "llama3.2", base_url="http://small:11434"
+        ).context_length
+        == 2048
+    )
+
+
+def test_peeking_resolves_unknown_capabilities_in_the_background(monkeypatch):
+    """Test that peeking doesn't wait for the Ollama server and the capabilities are known afterwards."""
+    release = threading.Event()
+    client = DummyOllamaClient()
+    show = client.show
+    monkeypatch.setattr(client, "show", lambda model: release.wait(5) and show(model))
+    monkeypatch.setattr(
+        capabilities.clients, "get_ollama_client", lambda host, timeout=None: client
+    )
+    host = "http://ollama:11434"
+
+    assert capabilities.peek_model_capabilities("Ollama", "llama3.2", host) is None
+    assert capabilities.peek_model_capabilities("Ollama", "llama3.2", host) is None
+    release.set()
+    for _ in range(100):
+        resolved = capabilities.peek_model_capabilities("Ollama", "llama3.2", host)
+        if resolved:
+            break
+        threading.Event().wait(0.01)
+
+    assert resolved.context_length == 8192
+    assert client.calls == 1
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from modules import catalog, helpers
+
+
+class DummyModel:
+    def __init__(self, id):
+        self.id = id
+
+
+class DummyOpenAIClient:
+    def __init__(self, model_ids):
+        self.model_ids = model_ids
+        self.models = self
+        self.calls = 0
+
+    def list(self):
+        self.calls += 1
+        return [DummyModel(id) for id in self.model_ids]
+
+
+@pytest.fixture(autouse=True)
+def clear_catalog():
+    catalog.clear_catalog()
+    yield
+    catalog.clear_catalog()
+
+
+def test_stale_entries_are_returned_and_refreshed_in_background(monkeypatch):
+    """Test that a stale entry doesn't block the caller and is replaced by a background refresh."""
+    now = [100.0]
+    monkeypatch.setattr(catalog.time, "monotonic", lambda: now[0])
+    cache = catalog.TTLCache("test")
+    refreshed = threading.Event()
+
+    assert cache.get("key", lambda: ["old"], ttl=60) == ["old"]
+    now[0] += 61
+
+    def fetch():
+        refreshed.set()
+        return ["new"]
+
+    assert cache.get("key", fetch, ttl=60) == ["old"]
+    assert refreshed.wait(timeout=2)
+    for _ in range(100):
+        if cache.get("key", fetch, ttl=60) == ["new"]:
+            break
+        time.sleep(0.01)
+    assert cache.get("key", fetch, ttl=60) == ["new"]
+
+
+def test_available_models_are_cached_per_api_key(monkeypatch):
+    """Test that the model lists of different API keys are fetched and cached separately."""
+    clients = {
+        "sk-first": DummyOpenAIClient(["gpt-4.1-nano", "gpt-4o"]),
+        "sk-second": DummyOpenAIClient(["gpt-4o"]),
+    }
+    monkeypatch.setattr(helpers, "get_openai_client", lambda api_key: clients[api_key])
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+
+    assert helpers.get_available_models("gpts", api_key="sk-first") == [
+        "gpt-4.1-nano",
+        "gpt-4o",
+    ]
+    assert helpers.get_available_models("gpts", api_key="sk-second") == ["gpt-4o"]
+    helpers.get_available_models("gpts", api_key="sk-first")
+
+    assert clients["sk-first"].calls == 1
+    assert clients["sk-second"].calls == 1
@@ -0,0 +1,157 @@
+import inspect
+import threading
+
+import pytest
+
+from modules import clients
+
+
+@pytest.fixture(autouse=True)
+def clear_client_cache():
+    clients.clear_client_cache()
+    yield
+    clients.clear_client_cache()
+
+
+def test_chat_models_are_shared_per_configuration():
+    """Test that the same configuration returns the same instance and a different one a new instance."""
+    kwargs = dict(
+        provider="OpenAI",
+        model="gpt-4.1-nano",
+        temperature=1.0,
+        top_p=1.0,
+        api_key="sk-test",
+        base_url="https://api.openai.com/v1",
+    )
+
+    chat_model = clients.get_chat_model(**kwargs)
+
+    assert clients.get_chat_model(**kwargs) is chat_model
+    assert clients.get_chat_model(**{**kwargs, "temperature": 0.5}) is not chat_model
+    assert clients.get_chat_model(**{**kwargs, "api_key": "sk-other"}) is not chat_model
+
+
+def test_api_keys_are_not_part_of_cache_keys():
+    clients.get_embeddings(
+        provider="OpenAI", model="text-embedding-3-small", api_key="sk-secret"
+    )
+
+    assert all("sk-secret" not in key for key in clients._clients)
+
+
+def test_least_recently_used_client_is_evicted(monkeypatch):
+    monkeypatch.setattr(clients, "MAX_CACHED_CLIENTS", 2)
+    first = clients.get_ollama_client("http://first:11434")
+    clients.get_ollama_client("http://second:11434")
+    # using the first client makes the second one the least recently used
+    assert clients.get_ollama_client("http://first:11434") is first
+    clients.get_ollama_client("http://third:11434")
+
+    assert [key[1] for key in clients._clients] == [
+        "http://first:11434",
+        "http://third:11434",
+    ]
+
+
+def test_creating_a_client_doesnt_block_other_lookups():
+    """Test that a client whose creation hangs, e.g. Chroma's, doesn't block the lookup of other clients."""
+    creating = threading.Event()
+    release = threading.Event()
+
+    def create_hanging_client():
+        creating.set()
+        release.wait(5)
+        return "chroma"
+
+    hanging = threading.Thread(
+        target=clients._get_or_create, args=(("chroma",), create_hanging_client)
+    )
+    hanging.start()
+    try:
+        assert creating.wait(1)
+        looked_up = []
+        lookup = threading.Thread(
+            target=lambda: looked_up.append(clients.get_ollama_client("http://o:11434"))
+        )
+        lookup.start()
+        lookup.join(1)
+        assert looked_up
+    finally:
+        release.set()
+        hanging.join()
+    assert clients._get_or_create(("chroma",), lambda: "other") == "chroma"
+
+
+def test_chroma_creates_its_session_as_expected():
+    """The timeout of Chroma is set on its private httpx session, see clients.get_chroma_client."""
+    from chromadb.api.fastapi import FastAPI
+
+    assert "self._session = httpx.Client(" in inspect.getsource(FastAPI.__init__)
+
+
+class DummyCollection:
+    def __init__(self, name):
+        self.name = name
+        self.count_calls = 0
+
+    def count(self):
+        self.count_calls += 1
+        return 3
+
+
+class DummyChromaClient:
+    def __init__(self):
+        self.get_calls = 0
+
+    def get_collection(self, name):
+        self.get_calls += 1
+        return DummyCollection(name)
+
+
+def test_collection_handles_and_counts_are_cached_until_invalidated():
+    chroma_client = DummyChromaClient()
+
+    collection = clients.get_collection(chroma_client, "brave-panda")
+    assert clients.get_collection(chroma_client, "brave-panda") is collection
+    assert clients.get_collection_count(collection) == 3
+    assert clients.get_collection_count(collection) == 3
+    assert chroma_client.get_calls == 1
+    assert collection.count_calls == 1
+
+    clients.invalidate_collection("brave-panda")
+
+    assert clients.get_collection(chroma_client, "brave-panda") is not collection
+    assert chroma_client.get_calls == 2
+
+
+def test_cached_collection_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(clients.time, "monotonic", lambda: now[0])
+    chroma_client = DummyChromaClient()
+
+    clients.get_collection(chroma_client, "brave-panda", ttl=60)
+    now[0] += 61
+    clients.get_collection(chroma_client, "brave-panda", ttl=60)
+
+    assert chroma_client.get_calls == 2
+
+
+def test_clients_are_created_with_the_configured_timeouts():
+    config = clients.get_config()
+    chat_model = clients.get_chat_model(
+        provider="OpenAI",
+        model="gpt-4.1-nano",
+        temperature=1.0,
+        top_p=1.0,
+        api_key="sk-test",
+    )
+    ollama_client = clients.get_ollama_client("http://localhost:11434")
+
+    assert chat_model.request_timeout == config.get("resilience.timeouts.openai")
+    assert ollama_client._client.timeout.read == config.get(
+        "resilience.timeouts.ollama"
+    )
+    # health checks use clients with a shorter timeout
+    health_check_client = clients.get_ollama_client("http://localhost:11434", timeout=5)
+    assert health_check_client is not ollama_client
+    assert health_check_client._client.timeout.read == 5
@@ -0,0 +1,66 @@
+from modules.compaction import (
+    compact_segments,
+    compact_transcript,
+    format_token_reduction,
+)
+from modules.segments import join_segments
+
+
+def test_compact_transcript_removes_annotations_and_fillers():
+    """Test that annotations and filler words are stripped."""
+    transcript = "[Music]\num so this is uh great ♪\n(applause) thanks"
+
+    assert compact_transcript(transcript) == "so this is great thanks"
+
+
+def test_compact_transcript_drops_repetitions():
+    """Test that repeated lines and immediately repeated word sequences are dropped."""
+    transcript = (
+        "hello and welcome\nhello and welcome\nto the the video. I think I think so."
+    )
+
+    assert (
+        compact_transcript(transcript) == "hello and welcome to the video.\nI think so."
+    )
+
+
+def test_compact_transcript_keeps_grammatical_repetitions():
+    transcript = (
+        "I had had enough. He said that that was fine. It is what it is is it not."
+    )
+
+    assert compact_transcript(transcript) == (
+        "I had had enough.\nHe said that that was fine.\nIt is what it is is it not."
+    )
+
+
+def test_compact_transcript_is_deterministic():
+    transcript = "one two\none two three\n[Music]\nfour."
+
+    assert compact_transcript(transcript) == compact_transcript(transcript)
+
+
+def test_compact_segments_keeps_timing():
+    """Test that lines are merged into sentences spanning the time of their segments."""
+    text, segments = join_segments(
+        [
+            (0.0, 2.0, "[Music]"),
+            (2.0, 2.0, "so today we"),
+            (4.0, 2.0, "so today we talk about it."),
+            (6.0, 3.0, "Next topic"),
+        ]
+    )
+
+    compacted_text, compacted_segments = compact_segments(text, segments)
+
+    assert compacted_text == "so today we talk about it.\nNext topic"
+    assert [(s.start, s.duration) for s in compacted_segments] == [
+        (2.0, 4.0),
+        (6.0, 3.0),
+    ]
+    assert compacted_text[compacted_segments[1].offset :] == "Next topic"
+
+
+def test_format_token_reduction():
+    assert format_token_reduction(1200, 900) == "25.0% (1200 -> 900 tokens)"
+    assert format_token_reduction(0, 0) == "0.0% (0 -> 0 tokens)"
@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+
+from modules import config
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(
+        json.dumps(
+            {
+                "health": {"interval": 30, "initial_wait": 3.0},
+                "help_texts": {"model": "Pick a model"},
+                "hedging": {"enabled": False},
+            }
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_values_are_read_by_key_path(config_file):
+    cfg = config.Config(config_file)
+
+    assert cfg.get("health.interval") == 30
+    assert cfg.get("health") == {"interval": 30, "initial_wait": 3.0}
+    with pytest.raises(KeyError):
+        cfg.get("health.missing")
+
+
+def test_file_is_reloaded_when_modified(config_file, monkeypatch):
+    cfg = config.Config(config_file)
+    config_file.write_text(json.dumps({"health": {"interval": 10}}), encoding="utf-8")
+    stat = config_file.stat()
+    os.utime(config_file, (stat.st_atime, stat.st_mtime + 5))
+
+    # the modification time isn't checked again before the reload check interval has passed
+    assert cfg.get("health.interval") == 30
+    monkeypatch.setattr(cfg, "_next_check", 0.0)
+    assert cfg.get("health.interval") == 10
+
+
+def test_env_variables_override_values_with_their_type(config_file, monkeypatch):
+    monkeypatch.setenv("YTGPT_CONFIG__HEALTH__INTERVAL", "5")
+    monkeypatch.setenv("YTGPT_CONFIG__HEALTH__INITIAL_WAIT", "0.5")
+    monkeypatch.setenv("YTGPT_CONFIG__HEDGING__ENABLED", "true")
+    monkeypatch.setenv("YTGPT_CONFIG__HELP_TEXTS__MODEL", "42")
+
+    cfg = config.Config(config_file)
+
+    assert cfg.get("health.interval") == 5
+    assert cfg.get("health.initial_wait") == 0.5
+    assert cfg.get("hedging.enabled") is True
+    assert cfg.get("help_texts.model") == "42"
+    assert cfg.get("health") == {"interval": 5, "initial_wait": 0.5}
+
+
+def test_default_config_is_independent_of_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config.clear_config_cache()
+
+    assert config.get_config() is config.get_config()
+    assert config.get_config().get("default_model.gpt")
+
+
+def test_invalid_file_keeps_previous_values(config_file, monkeypatch):
+    """Test that a file saved while being edited doesn't break reading the config."""
+    cfg = config.Config(config_file)
+    config_file.write_text('{"health": {"interval": ', encoding="utf-8")
+    stat = config_file.stat()
+    os.utime(config_file, (stat.st_atime, stat.st_mtime + 5))
+    monkeypatch.setattr(cfg, "_next_check", 0.0)
+
+    assert cfg.get("health.interval") == 30
+    # the invalid file isn't parsed again on every check
+    monkeypatch.setattr(config.json, "load", lambda f: pytest.fail("parsed again"))
+    monkeypatch.setattr(cfg, "_next_check", 0.0)
+    assert cfg.get("health.interval") == 30
+
+
+def test_env_variables_match_keys_case_insensitively(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text(
+        json.dumps({"rate_limits": {"OpenAI": {"max_concurrency": 8}}}),
+        encoding="utf-8",
+    )
+    monkeypatch.setenv("YTGPT_CONFIG__RATE_LIMITS__OPENAI__MAX_CONCURRENCY", "1")
+    monkeypatch.setenv("YTGPT_CONFIG__RATE_LIMITS__OLLAMA__MAX_CONCURRENCY", "2")
+
+    cfg = config.Config(path)
+
+    assert cfg.get("rate_limits.OpenAI.max_concurrency") == 1
+    # keys that don't exist yet are created in lowercase
+    assert cfg.get("rate_limits.ollama.max_concurrency") == 2
+    assert "rate_limits.openai" not in cfg._values
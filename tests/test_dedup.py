@@ -0,0 +1,94 @@
+import random
+
+from langchain_core.documents import Document
+
+from modules.dedup import (
+    deduplicate_documents,
+    estimate_similarity,
+    minhash_signature,
+)
+
+SPONSOR_READ = (
+    "This video is sponsored by Acme VPN. Protect your privacy online with "
+    "military grade encryption, servers in sixty countries and no logs at all. "
+    "Use the code in the description to get three months for free."
+)
+
+
+def test_minhash_signature_is_deterministic():
+    assert minhash_signature(SPONSOR_READ) == minhash_signature(SPONSOR_READ)
+
+
+def test_estimate_similarity():
+    """Test that similar texts get a high and different texts a low estimated similarity."""
+    signature = minhash_signature(SPONSOR_READ)
+    similar = minhash_signature(SPONSOR_READ.replace("sixty", "seventy"))
+    different = minhash_signature("Today we are going to bake a sourdough bread.")
+
+    assert estimate_similarity(signature, signature) == 1.0
+    assert estimate_similarity(signature, similar) > 0.6
+    assert estimate_similarity(signature, different) < 0.2
+
+
+def test_deduplicate_documents_records_aliases():
+    """Test that near-duplicates are removed and recorded on the canonical chunk."""
+    docs = [
+        Document(page_content=SPONSOR_READ, metadata={"start": 10.0, "end": 30.0}),
+        Document(
+            page_content="Today we are going to bake a sourdough bread.",
+            metadata={"start": 30.0, "end": 60.0},
+        ),
+        Document(
+            page_content=SPONSOR_READ + " Thanks!",
+            metadata={"start": 600.0, "end": 620.0},
+        ),
+    ]
+
+    unique_docs, aliases = deduplicate_documents(docs, threshold=0.8)
+
+    assert aliases == {2: 0}
+    assert [d.page_content for d in unique_docs] == [
+        docs[0].page_content,
+        docs[1].page_content,
+    ]
+    assert unique_docs[0].metadata["alias_count"] == 1
+    assert unique_docs[0].metadata["alias_starts"] == "600.0"
+    assert "alias_count" not in unique_docs[1].metadata
+
+
+def test_deduplicate_documents_keeps_distinct_chunks():
+    docs = [
+        Document(page_content=f"chunk number {i} talks about topic {i}")
+        for i in range(5)
+    ]
+
+    unique_docs, aliases = deduplicate_documents(docs)
+
+    assert aliases == {}
+    assert len(unique_docs) == 5
+
+
+def test_pairs_just_above_the_threshold_are_deduplicated():
+    """Test that the LSH bands don't miss pairs whose similarity is only slightly above the threshold."""
+    rng = random.Random(3)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    pairs = []
+    for _ in range(100):
+        words = rng.sample(vocabulary, 60)
+        variant = list(words)
+        for i in rng.sample(range(60), 2):
+            variant[i] = rng.choice(vocabulary)
+        text, other = " ".join(words), " ".join(variant)
+        similarity = estimate_similarity(
+            minhash_signature(text), minhash_signature(other)
+        )
+        if 0.8 <= similarity < 0.86:
+            pairs.append((text, other))
+
+    assert len(pairs) > 20
+    for text, other in pairs:
+        canonical, aliases = deduplicate_documents(
+            [Document(page_content=text), Document(page_content=other)],
+            threshold=0.8,
+        )
+        assert aliases == {1: 0}
@@ -0,0 +1,135 @@
+import json
+import zipfile
+from datetime import datetime as dt
+
+import pytest
+
+from modules import export, persistance
+from modules.export import export_library
+from modules.persistance import (
+    LibraryEntry,
+    Video,
+    delete_library_entry,
+    get_or_create_video,
+    save_library_entry,
+)
+
+
+@pytest.fixture
+def library(database, tmp_path, monkeypatch):
+    """Two videos with summaries and answers, exported to a temporary directory."""
+    monkeypatch.setattr(export, "get_config_value", lambda key_path: str(tmp_path))
+    for i in range(2):
+        video, _ = get_or_create_video(
+            yt_video_id=f"video_{i}",
+            link=f"https://www.youtube.com/watch?v=video_{i}",
+            title=f"Video {i}: Ünïcode",
+            channel="Channel",
+            saved_on=dt.now(),
+        )
+        save_library_entry("S", None, f"Summary {i}", video)
+        save_library_entry("A", f"Question {i}?", f"Answer {i}a", video)
+        save_library_entry("A", f"Question {i}?", f"Answer {i}b", video)
+
+    return tmp_path
+
+
+def test_export_markdown(library):
+    path = export_library("S", "md", channel="Channel")
+
+    assert path.read_text(encoding="utf-8") == (
+        "## Video 0: Ünïcode\n\nSummary 0\n\n---\n\n## Video 1: Ünïcode\n\nSummary 1\n\n---"
+    )
+
+
+def test_export_jsonl(library):
+    path = export_library("A", "jsonl", video_title="Video 1: Ünïcode")
+
+    records = [
+        json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()
+    ]
+    assert [(r["type"], r["question"], r["text"]) for r in records] == [
+        ("answer", "Question 1?", "Answer 1a"),
+        ("answer", "Question 1?", "Answer 1b"),
+    ]
+    assert records[0]["video"]["yt_video_id"] == "video_1"
+
+
+def test_export_zip_has_one_file_per_video(library):
+    path = export_library("A", "zip")
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.namelist() == [
+            "Video 0_ Ünïcode (video_0).md",
+            "Video 1_ Ünïcode (video_1).md",
+        ]
+        assert archive.read("Video 1_ Ünïcode (video_1).md").decode("utf-8") == (
+            "# Question 1?\n\nAnswer 1a\n\n---\n\n# Question 1?\n\nAnswer 1b\n\n---"
+        )
+
+
+def test_export_is_cached_until_the_library_changes(library, monkeypatch):
+    exported = []
+    iter_library_entries = export.iter_library_entries
+
+    def counting_iter(*args, **kwargs):
+        exported.append(args)
+        return iter_library_entries(*args, **kwargs)
+
+    monkeypatch.setattr(export, "iter_library_entries", counting_iter)
+
+    first = export_library("S", "md")
+    first_text = first.read_text(encoding="utf-8")
+    assert export_library("S", "md") == first
+    assert len(exported) == 1
+
+    video, _ = get_or_create_video("video_0", "", "", "", dt.now())
+    entry = save_library_entry("S", None, "Summary 2", video)
+    second = export_library("S", "md")
+    assert "Summary 2" in second.read_text(encoding="utf-8")
+    delete_library_entry(entry)
+    third = export_library("S", "md")
+
+    assert len(exported) == 3
+    assert second != first
+    # the entries are the same as at the first export again, which was removed by the second one
+    assert third == first
+    assert third.read_text(encoding="utf-8") == first_text
+    # older versions of the export are removed
+    assert [p.name for p in library.iterdir()] == [third.name]
+
+
+def test_export_is_invalidated_by_edits_and_renames(library):
+    first = export_library("S", "md")
+
+    entry = LibraryEntry.get(LibraryEntry.text == "Summary 0")
+    entry.text = "Edited summary 0"
+    entry.save()
+    second = export_library("S", "md")
+    assert second != first
+    assert "Edited summary 0" in second.read_text(encoding="utf-8")
+
+    Video.update(title="Renamed video 1").where(
+        Video.yt_video_id == "video_1"
+    ).execute()
+    third = export_library("S", "md")
+    assert third != second
+    assert "## Renamed video 1" in third.read_text(encoding="utf-8")
+
+
+def test_rows_are_read_from_the_cursor_in_batches(library):
+    """Test the reading of the server-side cursors of PostgreSQL and MySQL, with a cursor of SQLite."""
+    query = (
+        LibraryEntry.select(LibraryEntry, Video).join(Video).order_by(LibraryEntry.id)
+    )
+
+    entries = list(
+        persistance._iter_from_cursor(
+            query, lambda connection: connection.cursor(), batch_size=4
+        )
+    )
+
+    assert [(e.text, e.video.title) for e in entries] == [
+        (e.text, e.video.title) for e in query
+    ]
+    assert len(entries) == 6
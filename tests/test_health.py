@@ -0,0 +1,181 @@
+import threading
+
+import pytest
+
+from modules import health, resilience
+
+
+class DummyOllamaClient:
+    def __init__(self, models=None, should_fail=False):
+        self._models = models or []
+        self.should_fail = should_fail
+
+    def list(self):
+        if self.should_fail:
+            raise ConnectionError("connection refused")
+        return {"models": self._models}
+
+
+class DummyChromaClient:
+    def heartbeat(self):
+        return 1
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(health, "get_chroma_client", DummyChromaClient)
+
+
+def test_probe_publishes_status_and_models(monkeypatch):
+    """Test that a probe publishes the availability and the models of Ollama."""
+    models = [
+        {"model": "llama3", "details": {"family": "llama"}},
+        {"model": "nomic-embed-text:latest", "details": {"family": "embed"}},
+    ]
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: DummyOllamaClient(models),
+    )
+    monitor = health.HealthMonitor(probe_ollama=True)
+
+    monitor.probe_all()
+
+    ollama_status = monitor.get_status("ollama")
+    assert ollama_status.available
+    assert health.filter_ollama_models(ollama_status.models, "embeddings") == [
+        "nomic-embed-text:latest"
+    ]
+    assert monitor.get_status("chroma").available
+
+
+def test_probe_records_unavailable_provider(monkeypatch):
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: DummyOllamaClient(should_fail=True),
+    )
+    monitor = health.HealthMonitor(probe_ollama=True)
+
+    monitor.probe_all()
+
+    status = monitor.get_status("ollama")
+    assert not status.available
+    assert "connection refused" in status.error
+
+
+def test_ollama_is_only_probed_once_selected(monkeypatch):
+    probed = []
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: probed.append(host) or DummyOllamaClient(),
+    )
+    monitor = health.HealthMonitor()
+
+    monitor.probe_all()
+    assert probed == []
+    assert monitor.get_status("ollama") is None
+
+    monitor.watch_ollama()
+    monitor.probe_all()
+    assert len(probed) == 1
+    assert monitor.get_status("ollama").available
+
+
+def test_failed_probes_dont_open_circuit_breakers(monkeypatch):
+    """Test that an unreachable provider is reported as unavailable without putting the app into degraded mode."""
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: DummyOllamaClient(should_fail=True),
+    )
+    monitor = health.HealthMonitor(probe_ollama=True)
+
+    for _ in range(10):
+        monitor.probe_all()
+
+    assert not monitor.get_status("ollama").available
+    assert resilience.get_unavailable_dependencies() == []
+
+
+def test_slow_probe_doesnt_delay_the_others(monkeypatch):
+    release = threading.Event()
+
+    class HangingOllamaClient:
+        def list(self):
+            release.wait(5)
+            return {"models": []}
+
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: HangingOllamaClient(),
+    )
+    monitor = health.HealthMonitor(probe_ollama=True)
+    probing = threading.Thread(target=monitor.probe_all)
+    probing.start()
+    try:
+        assert monitor.get_status("chroma", wait=1).available
+        assert monitor.get_status("ollama") is None
+    finally:
+        release.set()
+        probing.join()
+
+
+def test_get_status_doesnt_block_without_probe():
+    """Test that reading the status of a service that wasn't probed yet returns right away."""
+    monitor = health.HealthMonitor()
+
+    assert monitor.get_status("ollama") is None
+
+
+def test_openai_keys_are_probed_once_watched(monkeypatch):
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: DummyOllamaClient(),
+    )
+    monkeypatch.setattr(
+        health.HealthMonitor, "_probe_openai", lambda self, api_key: ["gpt-4.1-nano"]
+    )
+    monitor = health.HealthMonitor()
+
+    monitor.watch_openai_key("sk-test")
+    monitor.probe_all()
+
+    status = monitor.get_status(f"openai:{health.clients.hash_secret('sk-test')}")
+    assert status.available
+    assert status.models == ["gpt-4.1-nano"]
+
+
+def test_unused_openai_keys_are_forgotten(monkeypatch):
+    """Test that keys are forgotten with their statuses after the TTL and beyond the maximum number of keys."""
+    now = [100.0]
+    monkeypatch.setattr(health.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(
+        health.clients,
+        "get_ollama_client",
+        lambda host, timeout=None: DummyOllamaClient(),
+    )
+    probed = []
+    monkeypatch.setattr(
+        health.HealthMonitor,
+        "_probe_openai",
+        lambda self, api_key: probed.append(api_key) or [],
+    )
+    monitor = health.HealthMonitor(openai_key_ttl=60, max_openai_keys=2)
+    for api_key in ("sk-old", "sk-idle", "sk-active"):
+        monitor.watch_openai_key(api_key)
+    monitor.probe_all()
+    assert sorted(probed) == ["sk-active", "sk-idle"]
+
+    now[0] += 61
+    monitor.watch_openai_key("sk-active")
+    probed.clear()
+    monitor.probe_all()
+
+    assert probed == ["sk-active"]
+    assert monitor.get_status(f"openai:{health.clients.hash_secret('sk-idle')}") is None
+    assert monitor.get_status(f"openai:{health.clients.hash_secret('sk-active')}")
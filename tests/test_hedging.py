@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from modules import hedging, resilience
+
+
+class DummyChunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class DummyChatModel:
+    def __init__(self, model_name, answer, delay=0.0, error=None, chunk_delay=0.0):
+        self.model_name = model_name
+        self.answer = answer
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.error = error
+        self.calls = 0
+        self.closed = threading.Event()
+
+    def stream(self, messages):
+        self.calls += 1
+        try:
+            time.sleep(self.delay)
+            if self.error:
+                raise self.error
+            for i, word in enumerate(self.answer.split()):
+                if i:
+                    time.sleep(self.chunk_delay)
+                yield DummyChunk(word + " ")
+        finally:
+            self.closed.set()
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(hedging, "_trackers", {})
+    monkeypatch.setattr(
+        hedging,
+        "_stats",
+        {"requests": 0, "hedged": 0, "secondary_wins": 0, "latency_saved": 0.0},
+    )
+
+
+def invoke(primary, secondary, hedge_delay):
+    return hedging.hedged_invoke(
+        primary=primary, secondary=secondary, messages=[], hedge_delay=hedge_delay
+    )
+
+
+def test_fast_primary_is_not_hedged():
+    """Test that the secondary model isn't called if the primary answers in time."""
+    primary = DummyChatModel("llama3", "primary answer")
+    secondary = DummyChatModel("gpt-4.1-nano", "secondary answer")
+
+    response = invoke(primary, secondary, hedge_delay=1.0)
+
+    assert response == "primary answer "
+    assert secondary.calls == 0
+    assert hedging._stats["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    """Test that the secondary model wins if the primary is slow and the primary stream is closed."""
+    primary = DummyChatModel("llama3", "primary answer", delay=0.3)
+    secondary = DummyChatModel("gpt-4.1-nano", "secondary answer")
+
+    response = invoke(primary, secondary, hedge_delay=0.05)
+
+    assert response == "secondary answer "
+    # the losing stream is closed once its first token arrives
+    assert primary.closed.wait(timeout=2)
+    for _ in range(100):
+        if hedging._stats["requests"]:
+            break
+        time.sleep(0.01)
+    assert hedging._stats["hedged"] == 1
+    assert hedging._stats["secondary_wins"] == 1
+    assert hedging._stats["latency_saved"] > 0
+
+
+def test_primary_first_token_during_secondary_response_is_logged(monkeypatch):
+    """Test that a first token of the primary, which arrives while the secondary still streams, is used for the stats."""
+    monkeypatch.setattr(hedging, "_get_timeout", lambda llm: 30.0)
+    primary = DummyChatModel("llama3", "primary answer", delay=0.2)
+    secondary = DummyChatModel(
+        "gpt-4.1-nano", "a long secondary answer", chunk_delay=0.1
+    )
+
+    response = invoke(primary, secondary, hedge_delay=0.05)
+
+    assert response == "a long secondary answer "
+    # logged right away instead of after the deadline of the primary
+    assert hedging._stats["secondary_wins"] == 1
+    assert 0 < hedging._stats["latency_saved"] < 1.0
+
+
+def test_failing_primary_fails_over():
+    """Test that the request fails over to the secondary model if the primary fails before the hedge delay."""
+    primary = DummyChatModel("llama3", "", error=ConnectionError("GPU box down"))
+    secondary = DummyChatModel("gpt-4.1-nano", "secondary answer")
+
+    assert invoke(primary, secondary, hedge_delay=5.0) == "secondary answer "
+
+
+def test_both_failing_raises_primary_error():
+    primary = DummyChatModel("llama3", "", error=ConnectionError("primary down"))
+    secondary = DummyChatModel("gpt-4.1-nano", "", error=RuntimeError("secondary"))
+
+    with pytest.raises(ConnectionError):
+        invoke(primary, secondary, hedge_delay=5.0)
+
+
+def test_hedge_delay_is_percentile_of_first_token_latencies():
+    """Test that the default delay is used until enough latencies are recorded, then their p95."""
+    llm = DummyChatModel("llama3", "")
+    assert hedging.get_hedge_delay(llm) == hedging.get_config_value(
+        "hedging.default_delay"
+    )
+
+    tracker = hedging.get_latency_tracker(llm)
+    for latency in range(1, 101):
+        tracker.record(latency / 10)
+
+    assert hedging.get_hedge_delay(llm) == pytest.approx(9.6)
+
+
+def test_hanging_models_time_out(monkeypatch):
+    """Test that the wait ends with a timeout if neither model answers within the timeout of its provider."""
+    monkeypatch.setattr(hedging, "_get_timeout", lambda llm: 0.2)
+    primary = DummyChatModel("llama3", "primary answer", delay=5.0)
+    secondary = DummyChatModel("gpt-4.1-nano", "secondary answer", delay=5.0)
+
+    start = time.monotonic()
+    with pytest.raises(resilience.DependencyTimeoutError):
+        invoke(primary, secondary, hedge_delay=0.05)
+
+    assert time.monotonic() - start < 1.0
+    assert secondary.calls == 1
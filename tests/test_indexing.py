@@ -0,0 +1,155 @@
+from datetime import datetime as dt
+
+import pytest
+from langchain_core.documents import Document
+
+from modules import indexing
+from modules.persistance import Transcript, get_or_create_video
+from modules.segments import Segment
+
+
+class DummyEmbeddings:
+    def embed_query(self, text):
+        return [0.1, 0.2]
+
+
+@pytest.fixture
+def indexed_video(database, chroma_client, monkeypatch):
+    monkeypatch.setattr(indexing.randomname, "get_name", lambda: "whisper-index")
+    monkeypatch.setattr(indexing, "num_tokens_from_string", lambda string: 1)
+    monkeypatch.setattr(
+        indexing,
+        "split_text_recursively",
+        lambda transcript_text, **kwargs: [Document(page_content=transcript_text)],
+    )
+    video, _ = get_or_create_video(
+        yt_video_id="test_video_123",
+        link="https://www.youtube.com/watch?v=test_video_123",
+        title="Test Video",
+        channel="Test Channel",
+        saved_on=dt.now(),
+    )
+    caption_collection = chroma_client.create_collection("captions")
+    caption_collection.add(ids=["1"], embeddings=[[0.1]], documents=["caption"])
+    Transcript.create(
+        video=video,
+        preprocessed=False,
+        chunk_size=512,
+        chroma_collection_id=caption_collection.id,
+        chroma_collection_name=caption_collection.name,
+    )
+    return video, chroma_client
+
+
+def test_upgrade_swaps_index(indexed_video):
+    """Test that a successful upgrade points the transcript to the new collection."""
+    video, chroma_client = indexed_video
+
+    indexing.upgrade_index_with_whisper(
+        chroma_client=chroma_client,
+        video=video,
+        transcribe=lambda: ("A whisper transcription.", []),
+        chunk_size=512,
+        embeddings=DummyEmbeddings(),
+        collection_metadata={"chunk_size": 512},
+    )
+
+    transcript = Transcript.get(Transcript.video == video)
+    assert transcript.preprocessed is True
+    assert transcript.chroma_collection_name == "whisper-index"
+    assert list(chroma_client.collections) == ["whisper-index"]
+    assert chroma_client.collections["whisper-index"].count() == 1
+
+
+def test_failed_upgrade_keeps_caption_index(indexed_video):
+    """Test that a failing transcription leaves the caption-based index untouched."""
+    video, chroma_client = indexed_video
+
+    def failing_transcription():
+        raise RuntimeError("download failed")
+
+    indexing.upgrade_index_with_whisper(
+        chroma_client=chroma_client,
+        video=video,
+        transcribe=failing_transcription,
+        chunk_size=512,
+        embeddings=DummyEmbeddings(),
+        collection_metadata={"chunk_size": 512},
+    )
+
+    transcript = Transcript.get(Transcript.video == video)
+    assert transcript.preprocessed is False
+    assert transcript.chroma_collection_name == "captions"
+    assert list(chroma_client.collections) == ["captions"]
+
+
+def test_upgrade_keeps_compaction(indexed_video):
+    """Test that the transcription is compacted if the captions were, and the compacted form is stored."""
+    video, chroma_client = indexed_video
+    segments = [Segment(0.0, 2.0, 0), Segment(2.0, 2.0, 24)]
+
+    indexing.upgrade_index_with_whisper(
+        chroma_client=chroma_client,
+        video=video,
+        transcribe=lambda: ("[Music] Hello um there.\nHello um there.", segments),
+        chunk_size=512,
+        embeddings=DummyEmbeddings(),
+        collection_metadata={"chunk_size": 512},
+        compacted=True,
+    )
+
+    transcript = Transcript.get(Transcript.video == video)
+    assert transcript.text == "[Music] Hello um there.\nHello um there."
+    assert transcript.compacted_text == "Hello there."
+    assert [s.start for s in transcript.get_segments(compacted=True)] == [0.0]
+    assert chroma_client.collections["whisper-index"].documents == ["Hello there."]
+
+
+def test_rechunk_index_splits_the_stored_transcript(indexed_video, monkeypatch):
+    """Test that re-chunking splits the stored text and segments at the new size, without fetching them."""
+    video, chroma_client = indexed_video
+    segments = [Segment(0.0, 2.0, 0), Segment(2.0, 2.0, 11)]
+    transcript = Transcript.get(Transcript.video == video)
+    transcript.text = "First one. Second one."
+    transcript.set_segments(segments)
+    transcript.save()
+    splits = []
+
+    def split_text_recursively(transcript_text, chunk_size, segments, **kwargs):
+        splits.append((transcript_text, chunk_size, segments))
+        return [Document(page_content=part) for part in transcript_text.split(". ")]
+
+    monkeypatch.setattr(indexing, "split_text_recursively", split_text_recursively)
+    monkeypatch.setattr(indexing.randomname, "get_name", lambda: "rechunked")
+
+    assert indexing.rechunk_index(
+        chroma_client=chroma_client,
+        video=video,
+        chunk_size=128,
+        embeddings=DummyEmbeddings(),
+        collection_metadata={"chunk_size": 512, "embeddings_model": "model"},
+    )
+
+    assert splits == [("First one. Second one.", 128, segments)]
+    transcript = Transcript.get(Transcript.video == video)
+    assert transcript.chunk_size == 128
+    assert transcript.chroma_collection_name == "rechunked"
+    assert list(chroma_client.collections) == ["rechunked"]
+    collection = chroma_client.collections["rechunked"]
+    assert collection.metadata == {"chunk_size": 128, "embeddings_model": "model"}
+    assert collection.documents == ["First one", "Second one."]
+
+
+def test_rechunk_index_needs_the_stored_transcript(indexed_video):
+    video, chroma_client = indexed_video
+
+    assert not indexing.rechunk_index(
+        chroma_client=chroma_client,
+        video=video,
+        chunk_size=128,
+        embeddings=DummyEmbeddings(),
+        collection_metadata={"chunk_size": 512},
+    )
+
+    assert Transcript.get(Transcript.video == video).chunk_size == 512
+    assert list(chroma_client.collections) == ["captions"]
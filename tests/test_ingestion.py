@@ -0,0 +1,166 @@
+from datetime import datetime as dt
+from datetime import timedelta
+
+import pytest
+from langchain_core.documents import Document
+from peewee import OperationalError
+
+from modules import ingestion
+from modules.persistance import (
+    IngestionJob,
+    Transcript,
+    Video,
+    get_ingestion_jobs,
+    get_or_create_video,
+)
+from modules.youtube import NoTranscriptReceivedException
+
+
+class DummyEmbeddings:
+    def __init__(self, failures=0):
+        self.failures = failures
+
+    def embed_query(self, text):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("rate limited")
+        return [0.1, 0.2]
+
+
+@pytest.fixture
+def stubbed_stages(monkeypatch):
+    names = iter(f"collection-{i}" for i in range(100))
+    monkeypatch.setattr(ingestion, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(ingestion.randomname, "get_name", lambda: next(names))
+    monkeypatch.setattr(ingestion, "num_tokens_from_string", lambda string: 1)
+    monkeypatch.setattr(
+        ingestion,
+        "get_video_metadata",
+        lambda url: {"name": f"Title of {url}", "channel": "Channel"},
+    )
+
+    def fetch_transcript(url):
+        if url.endswith("without_transcript"):
+            raise NoTranscriptReceivedException(url)
+        return f"transcript of {url}", []
+
+    monkeypatch.setattr(
+        ingestion, "fetch_youtube_transcript_segments", fetch_transcript
+    )
+    monkeypatch.setattr(
+        ingestion,
+        "split_into_excerpts",
+        lambda transcript_text, **kwargs: [Document(page_content=transcript_text)],
+    )
+
+
+def create_pipeline(chroma_client, embeddings):
+    return ingestion.IngestionPipeline(
+        chroma_client=chroma_client,
+        embeddings=embeddings,
+        embeddings_model="text-embedding-3-small",
+        embeddings_provider="OpenAI",
+        chunk_size=512,
+        workers={"metadata": 2, "transcript": 2, "splitting": 1, "embedding": 2},
+        queue_size=2,
+        max_attempts=3,
+    )
+
+
+def test_pipeline_processes_batch(database, chroma_client, stubbed_stages):
+    """Test that all videos of a batch pass through the stages and their progress is persisted."""
+    get_or_create_video(
+        yt_video_id="alreadydone",
+        link="https://www.youtube.com/watch?v=alreadydone",
+        title="Already processed",
+        channel="Channel",
+        saved_on=dt.now(),
+    )
+    Transcript.create(video=Video.get(Video.yt_video_id == "alreadydone"))
+    urls = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(6)] + [
+        "https://www.youtube.com/watch?v=alreadydone",
+        "https://www.youtube.com/watch?v=without_transcript",
+    ]
+    # the first two embedding calls fail and are retried
+    pipeline = create_pipeline(chroma_client, DummyEmbeddings(failures=2))
+
+    batch_id = pipeline.submit(urls)
+    pipeline.run(batch_id)
+
+    jobs = get_ingestion_jobs(batch_id)
+    assert [j["url"] for j in jobs] == urls
+    assert [j["status"] for j in jobs] == ["done"] * 6 + ["skipped", "failed"]
+    assert jobs[-1]["stage"] == "transcript"
+    assert (
+        Transcript.select()
+        .where(Transcript.chroma_collection_name.is_null(False))
+        .count()
+        == 6
+    )
+    assert len(chroma_client.collections) == 6
+
+
+def test_database_errors_dont_stop_the_workers(
+    database, chroma_client, stubbed_stages, monkeypatch
+):
+    """Test that failed status updates are retried or fail the job, without killing the worker threads."""
+    update_ingestion_job = ingestion.update_ingestion_job
+    failures = {"running": 2, "done": 2}
+
+    def flaky_update(job_id, **fields):
+        if failures.get(fields.get("status")):
+            failures[fields["status"]] -= 1
+            raise OperationalError("database is locked")
+        update_ingestion_job(job_id, **fields)
+
+    monkeypatch.setattr(ingestion, "update_ingestion_job", flaky_update)
+    urls = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(6)]
+    # a single worker per stage, which has to survive the errors
+    pipeline = create_pipeline(chroma_client, DummyEmbeddings())
+    pipeline.workers = {stage: 1 for stage in ingestion.STAGES}
+
+    batch_id = pipeline.submit(urls)
+    pipeline.run(batch_id)
+
+    statuses = [j["status"] for j in get_ingestion_jobs(batch_id)]
+    # the jobs whose "done" update failed are marked as failed instead
+    assert sorted(statuses) == ["done"] * 4 + ["failed"] * 2
+
+
+def test_stale_running_jobs_are_marked_as_failed(
+    database, chroma_client, stubbed_stages
+):
+    stranded = IngestionJob.create(
+        batch_id="old",
+        url="https://www.youtube.com/watch?v=stranded",
+        status="running",
+        updated_on=dt.now() - timedelta(hours=2),
+    )
+    running = IngestionJob.create(
+        batch_id="other",
+        url="https://www.youtube.com/watch?v=running",
+        status="running",
+        updated_on=dt.now(),
+    )
+    pipeline = create_pipeline(chroma_client, DummyEmbeddings())
+
+    pipeline.run(pipeline.submit([]))
+
+    assert IngestionJob.get_by_id(stranded.id).status == "failed"
+    assert IngestionJob.get_by_id(running.id).status == "running"
+
+
+def test_resolve_video_urls_removes_duplicates():
+    urls = ingestion.resolve_video_urls(
+        [
+            "https://youtu.be/dQw4w9WgXcQ",
+            "",
+            "https://www.youtube.com/watch?v=abcdefghijk",
+            "https://youtu.be/dQw4w9WgXcQ",
+        ]
+    )
+
+    assert urls == [
+        "https://youtu.be/dQw4w9WgXcQ",
+        "https://www.youtube.com/watch?v=abcdefghijk",
+    ]
@@ -0,0 +1,146 @@
+import time
+from datetime import datetime as dt
+
+import pytest
+
+from modules import library_index
+from modules.library_index import (
+    backfill_library_index,
+    count_unindexed_entries,
+    get_library_index,
+    index_library_entry,
+    search_library_semantically,
+)
+from modules.persistance import (
+    LibraryEntry,
+    delete_library_entry,
+    get_or_create_video,
+    save_library_entry,
+)
+
+VOCABULARY = ["pasta", "sauce", "bread", "oven", "guitar", "chord"]
+
+
+class FakeEmbeddings:
+    """Embeds texts as counts of the words of the vocabulary and records what it embeds."""
+
+    model = "fake-embeddings"
+
+    def __init__(self):
+        self.embedded = []
+
+    def _embed(self, text):
+        words = text.lower().split()
+        return [float(words.count(word)) for word in VOCABULARY]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FailingEmbeddings(FakeEmbeddings):
+    def embed_documents(self, texts):
+        raise ValueError("model not found")
+
+
+@pytest.fixture
+def video(database):
+    library_index.clear_library_indexes()
+    video, _ = get_or_create_video(
+        yt_video_id="video",
+        link="https://www.youtube.com/watch?v=video",
+        title="Kitchen",
+        channel="Channel",
+        saved_on=dt.now(),
+    )
+
+    return video
+
+
+def wait_until_indexed(embeddings, unindexed=0):
+    for _ in range(200):
+        if count_unindexed_entries(embeddings) == unindexed:
+            return
+        time.sleep(0.01)
+    raise AssertionError("The entries weren't indexed in the background.")
+
+
+def test_search_returns_most_similar_entries_first(video):
+    embeddings = FakeEmbeddings()
+    pasta = save_library_entry("S", None, "pasta with sauce", video, embeddings)
+    bread = save_library_entry("S", None, "bread with sauce", video, embeddings)
+    save_library_entry("A", "Which chord?", "a guitar chord", video, embeddings)
+    wait_until_indexed(embeddings)
+
+    results = search_library_semantically("pasta sauce", embeddings, k=2)
+
+    assert [entry.id for entry, _ in results] == [pasta.id, bread.id]
+    assert results[0][1] == pytest.approx(1.0)
+    assert results[1][1] == pytest.approx(0.5)
+    answers = search_library_semantically("guitar", embeddings, entry_type="A")
+    assert [entry.question for entry, _ in answers] == ["Which chord?"]
+
+
+def test_saving_an_entry_embeds_only_that_entry(video):
+    """Test that the index is updated incrementally, without embedding or reloading the whole library."""
+    embeddings = FakeEmbeddings()
+    save_library_entry("S", None, "pasta with sauce", video, embeddings)
+    wait_until_indexed(embeddings)
+    index = get_library_index(embeddings)
+    assert len(index) == 1
+
+    embeddings.embedded.clear()
+    guitar = save_library_entry("S", None, "guitar", video, embeddings)
+    wait_until_indexed(embeddings)
+
+    assert embeddings.embedded == ["Kitchen\n\nguitar"]
+    assert get_library_index(embeddings) is index
+    assert len(index) == 2
+    assert search_library_semantically("guitar", embeddings)[0][0].id == guitar.id
+
+
+def test_backfill_embeds_entries_that_are_not_indexed(video, monkeypatch):
+    monkeypatch.setattr(
+        library_index,
+        "get_config_value",
+        lambda key_path: 2 if key_path == "library.embedding_batch_size" else None,
+    )
+    embeddings = FakeEmbeddings()
+    for text in ["pasta", "bread", "oven"]:
+        save_library_entry("S", None, text, video)
+    save_library_entry("S", None, "guitar", video, embeddings)
+    wait_until_indexed(embeddings, unindexed=3)
+
+    assert count_unindexed_entries(embeddings) == 3
+    assert backfill_library_index(embeddings) == 3
+    assert count_unindexed_entries(embeddings) == 0
+    assert len(embeddings.embedded) == 4
+    assert len(get_library_index(embeddings)) == 4
+
+
+def test_failed_embedding_does_not_prevent_saving(video):
+    embeddings = FailingEmbeddings()
+
+    entry = save_library_entry("S", None, "pasta", video, embeddings)
+    index_library_entry(entry.id, embeddings)
+
+    assert LibraryEntry.get_by_id(entry.id).text == "pasta"
+    assert count_unindexed_entries(embeddings) == 1
+
+
+def test_deleted_entries_are_not_found(video):
+    embeddings = FakeEmbeddings()
+    pasta = save_library_entry("S", None, "pasta", video, embeddings)
+    save_library_entry("S", None, "pasta with sauce", video, embeddings)
+    wait_until_indexed(embeddings)
+    assert len(search_library_semantically("pasta", embeddings)) == 2
+
+    delete_library_entry(pasta)
+
+    assert [
+        entry.id for entry, _ in search_library_semantically("pasta", embeddings)
+    ] == [pasta.id + 1]
+    assert len(get_library_index(embeddings)) == 1
@@ -1,4 +1,5 @@
 """Test library page functionality."""
+
 from datetime import datetime as dt
 
 import pytest
@@ -8,7 +9,12 @@ from modules.persistance import (
     LibraryEntry,
     Transcript,
     Video,
+    get_channels_with_summaries,
+    get_library_entry_text,
+    get_library_page,
     get_or_create_video,
+    get_titles_of_videos_with_library_entries,
+    get_titles_of_videos_with_transcript,
     save_library_entry,
 )
 
@@ -169,3 +175,85 @@ def test_no_summary_for_video_in_chat_page(setup_test_db):
 
     # Verify no summary was found
     assert saved_summary is None
+
+
+@pytest.fixture
+def count_queries(monkeypatch):
+    """Counts the queries executed on the test database."""
+    queries = []
+    original_execute_sql = test_db.execute_sql
+
+    def execute_sql(sql, params=None, *args, **kwargs):
+        queries.append(sql)
+        return original_execute_sql(sql, params, *args, **kwargs)
+
+    monkeypatch.setattr(test_db, "execute_sql", execute_sql)
+    return queries
+
+
+@pytest.fixture
+def library(setup_test_db):
+    """Creates videos with and without transcripts, summaries and answers."""
+    for i in range(10):
+        video, _ = get_or_create_video(
+            yt_video_id=f"video_{i}",
+            link=f"https://www.youtube.com/watch?v=video_{i}",
+            title=f"Video {i}",
+            channel=f"Channel {i % 2}",
+            saved_on=dt.now(),
+        )
+        # every third video has no transcript
+        if i % 3:
+            Transcript.create(video=video)
+        save_library_entry("S", None, f"Summary {i}", video)
+        if i % 2:
+            save_library_entry("A", f"Question {i}?", f"Answer {i}", video)
+
+
+def test_chat_picker_uses_one_query(library, count_queries):
+    titles = get_titles_of_videos_with_transcript()
+
+    assert titles == [f"Video {i}" for i in range(10) if i % 3]
+    assert len(count_queries) == 1
+
+
+def test_library_pickers_use_one_query_each(library, count_queries):
+    titles = get_titles_of_videos_with_library_entries()
+    channels = get_channels_with_summaries()
+
+    assert titles == [f"Video {i}" for i in range(10) if i % 3]
+    assert channels == ["Channel 0", "Channel 1"]
+    assert len(count_queries) == 2
+
+
+def test_library_entries_are_loaded_with_their_videos(library, count_queries):
+    """Test that rendering a page (incl. title and channel of the videos) takes one query."""
+    summaries, _ = get_library_page(entry_type="S", page_size=20)
+    rendered = [f"{e.video.title} - {e.video.channel}" for e in summaries]
+
+    assert len(rendered) == 10
+    assert rendered[1] == "Video 1 - Channel 1"
+    assert len(count_queries) == 1
+
+
+def test_library_entries_are_filtered(library):
+    summaries, _ = get_library_page("S", channel="Channel 1")
+    answers, _ = get_library_page("A", video_title="Video 3")
+
+    assert [e.video.title for e in summaries] == [f"Video {i}" for i in range(1, 10, 2)]
+    assert [e.question for e in answers] == ["Question 3?"]
+
+
+def test_library_is_keyset_paginated(library, count_queries):
+    """Test that pages are fetched by cursor with one query each and without the text of the entries."""
+    first_page, cursor = get_library_page("S", page_size=4)
+    second_page, cursor = get_library_page("S", after_id=cursor, page_size=4)
+    last_page, last_cursor = get_library_page("S", after_id=cursor, page_size=4)
+
+    assert [e.video.title for e in first_page] == [f"Video {i}" for i in range(4)]
+    assert [e.video.title for e in second_page] == [f"Video {i}" for i in range(4, 8)]
+    assert [e.video.title for e in last_page] == ["Video 8", "Video 9"]
+    assert last_cursor is None
+    assert len(count_queries) == 3
+    assert all('"text"' not in query for query in count_queries)
+    assert get_library_entry_text(first_page[0].id) == "Summary 0"
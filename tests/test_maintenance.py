@@ -0,0 +1,162 @@
+import uuid
+from datetime import datetime as dt
+from datetime import timedelta
+
+from modules.maintenance import reconcile
+from modules.persistance import (
+    LibraryEmbedding,
+    LibraryEntry,
+    ReconciliationCandidate,
+    Transcript,
+    Video,
+    delete_video,
+    get_or_create_video,
+    save_library_entry,
+)
+
+
+def add_collection(chroma_client, name, size=0, dimension=4):
+    collection = chroma_client.create_collection(name)
+    collection.add(
+        ids=[str(i) for i in range(size)],
+        embeddings=[[0.0] * dimension] * size,
+        documents=[""] * size,
+    )
+    return collection
+
+
+def create_video(yt_video_id, collection=None, saved_on=None):
+    video, _ = get_or_create_video(
+        yt_video_id=yt_video_id,
+        link=f"https://www.youtube.com/watch?v={yt_video_id}",
+        title=f"Video {yt_video_id}",
+        channel="Channel",
+        saved_on=saved_on or dt.now(),
+    )
+    Transcript.create(
+        video=video,
+        text="text",
+        chroma_collection_id=collection and collection.id,
+        chroma_collection_name=collection and collection.name,
+    )
+    return video
+
+
+def test_orphaned_collections_are_removed_after_the_grace_period(
+    database, chroma_client
+):
+    processed = add_collection(chroma_client, "processed", size=3)
+    add_collection(chroma_client, "orphan", size=10, dimension=8)
+    create_video("a", processed)
+
+    report = reconcile(chroma_client, grace_period=3600)
+
+    assert report.deleted_collections == []
+    assert report.pending == 1
+    assert set(chroma_client.collections) == {"processed", "orphan"}
+
+    ReconciliationCandidate.update(
+        first_seen_on=dt.now() - timedelta(hours=2)
+    ).execute()
+    report = reconcile(chroma_client, grace_period=3600)
+
+    assert report.deleted_collections == ["orphan"]
+    assert report.reclaimed_embeddings == 10
+    assert report.reclaimed_bytes == 10 * 8 * 4
+    assert set(chroma_client.collections) == {"processed"}
+    assert ReconciliationCandidate.select().count() == 0
+    # live collections are only counted, not sampled for their size
+    assert processed.gets == 0
+
+
+def test_orphans_that_are_linked_meanwhile_are_forgotten(database, chroma_client):
+    collection = add_collection(chroma_client, "in-progress", size=1)
+    reconcile(chroma_client, grace_period=3600)
+    assert ReconciliationCandidate.select().count() == 1
+
+    create_video("a", collection)
+    reconcile(chroma_client, grace_period=0)
+
+    assert ReconciliationCandidate.select().count() == 0
+    assert set(chroma_client.collections) == {"in-progress"}
+
+
+def test_half_written_transcripts_are_removed(database, chroma_client):
+    """Test that transcripts without (embeddings in) a collection are removed, together with unused videos."""
+    empty = add_collection(chroma_client, "empty")
+    missing = add_collection(chroma_client, "missing", size=1)
+    chroma_client.delete_collection("missing")
+    old = dt.now() - timedelta(days=1)
+    create_video("without-collection", saved_on=old)
+    create_video("empty-collection", empty, saved_on=old)
+    saved = create_video("missing-collection", missing)
+    save_library_entry("S", None, "A summary", saved)
+
+    report = reconcile(chroma_client, grace_period=0)
+
+    assert sorted(report.removed_transcripts) == [
+        "Video empty-collection",
+        "Video missing-collection",
+        "Video without-collection",
+    ]
+    assert report.deleted_collections == ["empty"]
+    assert Transcript.select().count() == 0
+    # the video with a summary in the library is kept
+    assert [v.yt_video_id for v in Video.select()] == ["missing-collection"]
+
+
+def test_transcripts_with_another_collection_id_are_repaired(database, chroma_client):
+    collection = add_collection(chroma_client, "processed", size=1)
+    video = create_video("a", collection)
+    Transcript.update(chroma_collection_id=uuid.uuid4()).execute()
+
+    report = reconcile(chroma_client, grace_period=0)
+
+    assert report.repaired_transcripts == ["Video a"]
+    assert video.transcripts.get().chroma_collection_id == collection.id
+
+
+def test_dangling_rows_are_deleted(database, chroma_client):
+    video = create_video("a")
+    entry = save_library_entry("S", None, "A summary", video)
+    LibraryEmbedding.create(entry=entry, provider="p", model="m", vector=b"")
+    # deleted without its transcript and library entries, as delete_video did before
+    Video.delete().execute()
+
+    report = reconcile(chroma_client, grace_period=3600)
+
+    assert report.deleted_rows == {
+        "libraryembedding": 1,
+        "libraryentry": 1,
+        "transcript": 1,
+        "video": 0,
+    }
+    assert LibraryEntry.select().count() == 0
+    assert LibraryEmbedding.select().count() == 0
+
+
+def test_dry_run_changes_nothing(database, chroma_client):
+    add_collection(chroma_client, "orphan", size=2)
+    create_video("a", saved_on=dt.now() - timedelta(days=1))
+
+    report = reconcile(chroma_client, grace_period=0, dry_run=True, vacuum=True)
+
+    assert report.deleted_collections == ["orphan"]
+    assert report.removed_transcripts == ["Video a"]
+    assert report.deleted_rows["video"] == 1
+    assert "Would remove 1 orphaned collections" in report.summary()
+    assert set(chroma_client.collections) == {"orphan"}
+    assert Transcript.select().count() == 1
+    assert ReconciliationCandidate.select().count() == 0
+
+
+def test_delete_video_keeps_videos_with_library_entries(database):
+    saved = create_video("saved")
+    save_library_entry("S", None, "A summary", saved)
+    unsaved = create_video("unsaved")
+
+    delete_video(saved)
+    delete_video(unsaved)
+
+    assert Transcript.select().count() == 0
+    assert [v.yt_video_id for v in Video.select()] == ["saved"]
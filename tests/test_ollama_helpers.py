@@ -1,4 +1,7 @@
-from modules import helpers
+import ollama
+import pytest
+
+from modules import catalog, clients, helpers
 
 
 class DummyClient:
@@ -17,9 +20,18 @@ class DummyClient:
         return {"status": "success", "model": model}
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    clients.clear_client_cache()
+    catalog.clear_catalog()
+    yield
+    clients.clear_client_cache()
+    catalog.clear_catalog()
+
+
 def test_is_ollama_available_handles_failure(monkeypatch):
     monkeypatch.setattr(
-        helpers.ollama, "Client", lambda host=None: DummyClient(should_fail=True)
+        ollama, "Client", lambda host=None, timeout=None: DummyClient(should_fail=True)
     )
     assert helpers.is_ollama_available() is False
 
@@ -30,7 +42,9 @@ def test_get_ollama_models_filters_embeddings(monkeypatch):
         {"model": "nomic-embed-text:latest", "details": {"family": "embed"}},
     ]
     monkeypatch.setattr(
-        helpers.ollama, "Client", lambda host=None: DummyClient(models=sample_models)
+        ollama,
+        "Client",
+        lambda host=None, timeout=None: DummyClient(models=sample_models),
     )
     assert helpers.get_ollama_models("gpts") == ["llama3"]
     assert helpers.get_ollama_models("embeddings") == ["nomic-embed-text:latest"]
@@ -38,6 +52,18 @@ def test_get_ollama_models_filters_embeddings(monkeypatch):
 
 def test_pull_ollama_model_returns_false_on_error(monkeypatch):
     monkeypatch.setattr(
-        helpers.ollama, "Client", lambda host=None: DummyClient(should_fail=True)
+        ollama, "Client", lambda host=None, timeout=None: DummyClient(should_fail=True)
     )
     assert helpers.pull_ollama_model("llama3") is False
+
+
+def test_pull_ollama_model_uses_the_pull_timeout(monkeypatch):
+    timeouts = []
+
+    def make_client(host=None, timeout=None):
+        timeouts.append(timeout)
+        return DummyClient()
+
+    monkeypatch.setattr(ollama, "Client", make_client)
+    assert helpers.pull_ollama_model("llama3") is True
+    assert timeouts == [helpers.get_config_value("resilience.timeouts.ollama_pull")]
@@ -1,13 +1,19 @@
+import threading
 from datetime import datetime as dt
 
 import pytest
 from peewee import SqliteDatabase
+from playhouse.pool import PooledSqliteDatabase
 
+from modules.config import get_config
 from modules.persistance import (
+    MODELS,
     LibraryEntry,
+    SchemaVersion,
     Transcript,
     Video,
     get_or_create_video,
+    get_transcript,
     save_library_entry,
 )
 
@@ -19,14 +25,14 @@ test_db = SqliteDatabase(":memory:")
 def setup_test_db():
     """Set up a test database before each test."""
     # Bind models to test database
-    test_db.bind([Video, Transcript, LibraryEntry])
+    test_db.bind(MODELS)
     test_db.connect()
     test_db.create_tables([Video, Transcript, LibraryEntry])
 
     yield test_db
 
     # Clean up after test
-    test_db.drop_tables([Video, Transcript, LibraryEntry])
+    test_db.drop_tables(MODELS)
     test_db.close()
 
 
@@ -131,3 +137,219 @@ def test_save_summary_with_existing_video(setup_test_db):
     )
 
     assert transcript.video.id == video.id
+
+
+def test_compacted_text_is_stored_next_to_the_transcript(setup_test_db):
+    """Test that a transcript is compacted once and its compacted form is read from the database afterwards."""
+    video, _ = get_or_create_video("video", "", "Video", "Channel", dt.now())
+    Transcript.create(video=video, text="[Music] Hello um there.")
+
+    transcript = get_transcript("video")
+
+    assert transcript.get_compacted_text() == "Hello there."
+    assert get_transcript("video").compacted_text == "Hello there."
+    assert get_transcript("unknown") is None
+
+
+def test_initialize_database_adds_missing_columns(setup_test_db, monkeypatch):
+    """Test that columns added to a model are added to tables created by older versions."""
+    from modules import persistance
+
+    monkeypatch.setattr(persistance, "SQL_DB", test_db)
+    test_db.drop_tables([Transcript])
+    test_db.execute_sql(
+        "CREATE TABLE transcript (id INTEGER PRIMARY KEY, video_id INTEGER NOT NULL, "
+        "original_token_num INTEGER)"
+    )
+
+    persistance.initialize_database()
+
+    columns = {column.name for column in test_db.get_columns("transcript")}
+    assert {"text", "segments", "chroma_collection_name"} <= columns
+
+
+def test_initialize_database_creates_indexes_and_records_schema_version(
+    setup_test_db, monkeypatch
+):
+    """Test that the secondary indexes are created and the schema is upgraded only once per process."""
+    from modules import persistance
+
+    monkeypatch.setattr(persistance, "SQL_DB", test_db)
+    monkeypatch.setattr(persistance, "_initialized_databases", set())
+    executed = []
+    original_create_tables = test_db.create_tables
+
+    def create_tables(models, **options):
+        executed.append(models)
+        original_create_tables(models, **options)
+
+    monkeypatch.setattr(test_db, "create_tables", create_tables)
+
+    persistance.initialize_database()
+    persistance.initialize_database()
+
+    indexed_columns = {
+        (table, tuple(index.columns))
+        for table in ("video", "libraryentry", "transcript")
+        for index in test_db.get_indexes(table)
+    }
+    assert {
+        ("video", ("title",)),
+        ("video", ("channel",)),
+        ("libraryentry", ("entry_type",)),
+        ("libraryentry", ("video_id",)),
+        ("transcript", ("video_id",)),
+    } <= indexed_columns
+    assert [v.version for v in SchemaVersion.select()] == sorted(
+        persistance.SCHEMA_MIGRATIONS
+    )
+    assert max(persistance.SCHEMA_MIGRATIONS) == persistance.SCHEMA_VERSION
+    assert len(executed) == 1
+
+
+def test_sqlite_database_uses_wal(tmp_path):
+    """Test that connections to the SQLite database use the WAL journal mode."""
+    from modules import persistance
+
+    db = persistance.connect_database(f"sqlite:///{tmp_path / 'test.sqlite3'}")
+    db.connect()
+
+    assert db.execute_sql("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute_sql("PRAGMA synchronous").fetchone()[0] == 1
+    db.close()
+
+
+def test_connect_database_from_url(tmp_path):
+    """Test that pooled databases are configured from config.json, unless the URL overrides it."""
+    from modules import persistance
+
+    db = persistance.connect_database(
+        f"sqlite+pool:///{tmp_path / 'test.sqlite3'}?max_connections=3"
+    )
+
+    assert isinstance(db, PooledSqliteDatabase)
+    assert db.database == str(tmp_path / "test.sqlite3")
+    assert db._max_connections == 3
+    assert db._stale_timeout == get_config().get("database.stale_timeout")
+    with pytest.raises(ValueError):
+        persistance.connect_database("oracle://user@host/db")
+
+
+def test_connections_of_ended_threads_are_returned_to_the_pool(tmp_path):
+    """Test that threads which don't close their connection, like the reruns of pages, don't exhaust the pool."""
+    from modules import persistance
+
+    db = persistance.connect_database(
+        f"sqlite+pool:///{tmp_path / 'test.sqlite3'}?max_connections=2&timeout=0"
+    )
+    for _ in range(5):
+        thread = threading.Thread(target=lambda: db.execute_sql("SELECT 1"))
+        thread.start()
+        thread.join()
+
+    assert len(db._in_use) == 0
+    assert len(db._connections) == 1
+    db.close_all()
+
+
+def test_pool_timeout_doesnt_replace_the_busy_timeout(tmp_path):
+    from modules import persistance
+
+    db = persistance.connect_database(
+        f"sqlite+pool:///{tmp_path / 'test.sqlite3'}?timeout=5"
+    )
+
+    assert db._wait_timeout == 5
+    assert db.execute_sql("PRAGMA busy_timeout").fetchone()[0] == 10000
+    db.close_all()
+
+
+@pytest.fixture
+def search_db(setup_test_db, monkeypatch):
+    """The test database with the full-text search index."""
+    from modules import persistance
+
+    monkeypatch.setattr(persistance, "SQL_DB", test_db)
+    persistance._create_search_index(persistance.MODELS)
+    video, _ = get_or_create_video(
+        yt_video_id="search_video",
+        link="https://www.youtube.com/watch?v=search_video",
+        title="Cooking pasta",
+        channel="Kitchen",
+        saved_on=dt.now(),
+    )
+    return video
+
+
+def test_search_index_is_kept_in_sync_with_entries_and_transcripts(search_db):
+    """Test that inserted, updated and deleted entries and transcripts are found (or not) by the search."""
+    from modules.persistance import search_library
+
+    save_library_entry("A", "Which sauce?", "A tomato sauce with basil.", search_db)
+    transcript = Transcript.create(video=search_db, text="Boil the water first.")
+
+    assert [(r.kind, r.id) for r in search_library("tomato")] == [
+        ("A", LibraryEntry.get().id)
+    ]
+    assert [(r.kind, r.id) for r in search_library("boil")] == [("T", transcript.id)]
+
+    LibraryEntry.update(text="A pesto sauce.").execute()
+    transcript.delete_instance()
+
+    assert search_library("tomato") == []
+    assert search_library("pesto")[0].kind == "A"
+    assert search_library("boil") == []
+
+    LibraryEntry.delete().execute()
+    assert search_library("pesto") == []
+
+
+def test_search_index_follows_video_title(search_db):
+    """Test that renaming a video updates the titles of its indexed entries."""
+    from modules.persistance import search_library
+
+    save_library_entry("S", None, "Salt the water.", search_db)
+    Video.update(title="Cooking risotto").where(Video.id == search_db.id).execute()
+
+    assert search_library("pasta") == []
+    assert search_library("risotto")[0].video_title == "Cooking risotto"
+
+
+def test_search_library_ranks_and_highlights(search_db):
+    """Test that title matches rank first, the last word matches as prefix and snippets highlight matches."""
+    from modules.persistance import search_library
+
+    other_video, _ = get_or_create_video(
+        yt_video_id="other_video",
+        link="https://www.youtube.com/watch?v=other_video",
+        title="Baking bread",
+        channel="Kitchen",
+        saved_on=dt.now(),
+    )
+    save_library_entry("S", None, "Bread goes well with pasta.", other_video)
+    save_library_entry("S", None, "Use plenty of water.", search_db)
+
+    results = search_library("pas")
+
+    assert [r.video_title for r in results] == ["Cooking pasta", "Baking bread"]
+    assert "**pasta**" in results[1].snippet
+    # operators and quotes of FTS5 in the input are not interpreted
+    assert search_library('(pasta" -') == search_library("pasta")
+    assert search_library("  ") == []
+
+
+def test_search_without_full_text_index(search_db):
+    """Test the search of databases other than SQLite, which have no FTS5 index."""
+    from modules import persistance
+
+    save_library_entry("A", "Which sauce?", "A tomato sauce with basil.", search_db)
+    Transcript.create(video=search_db, text="Boil the water, then add the Pasta.")
+
+    results = persistance._search_library_with_like(["pasta", "water"], limit=10)
+
+    assert [(r.kind, r.snippet) for r in results] == [
+        ("T", "Boil the **water**, then add the **Pasta**.")
+    ]
+    assert [
+        r.kind for r in persistance._search_library_with_like(["cooking"], limit=10)
+    ] == ["A", "T"]
@@ -0,0 +1,116 @@
+import pytest
+
+from modules import ratelimit
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class DummyResult:
+    def __init__(self, headers=None):
+        self.response_metadata = {"headers": headers or {}}
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ratelimit.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_concurrency_limiter_aimd():
+    """Test that the limit is halved when rate limited and increases additively on success."""
+    limiter = ratelimit.AdaptiveConcurrencyLimiter(max_concurrency=8)
+
+    limiter.on_rate_limited()
+    assert limiter.limit == 4.0
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.limit == 1.0
+
+    for _ in range(3):
+        limiter.on_success()
+    assert 2.0 < limiter.limit < 3.0
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+
+def test_token_bucket_waits_for_refill(monkeypatch):
+    """Test that acquiring more tokens than available waits for the bucket to refill."""
+    bucket = ratelimit.TokenBucket(per_minute=60)
+    sleeps = []
+
+    def fake_sleep(seconds):
+        # let the time pass for the bucket
+        sleeps.append(seconds)
+        bucket.updated -= seconds
+
+    monkeypatch.setattr(ratelimit.time, "sleep", fake_sleep)
+
+    bucket.acquire(60)
+    assert sleeps == []
+
+    bucket.acquire(2)
+    assert sum(sleeps) == pytest.approx(2.0, abs=0.1)
+
+
+def test_call_with_rate_limit_retries_rate_limited_calls(no_sleep):
+    limiter = ratelimit.RateLimiter(max_concurrency=4)
+    calls = []
+
+    def flaky_call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimitError("too many requests")
+        return DummyResult()
+
+    result = ratelimit.call_with_rate_limit(limiter, flaky_call)
+
+    assert isinstance(result, DummyResult)
+    assert len(calls) == 3
+    assert no_sleep == [ratelimit.DEFAULT_RETRY_AFTER] * 2
+    assert limiter.concurrency.limit < 4
+
+
+def test_call_with_rate_limit_raises_other_errors(no_sleep):
+    limiter = ratelimit.RateLimiter()
+
+    def failing_call():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        ratelimit.call_with_rate_limit(limiter, failing_call)
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_headers_pause_exhausted_buckets():
+    limiter = ratelimit.RateLimiter(requests_per_minute=100, tokens_per_minute=1000)
+
+    limiter.update_from_headers(
+        {
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "6m0s",
+            "x-ratelimit-remaining-tokens": "500",
+            "x-ratelimit-reset-tokens": "1s",
+        }
+    )
+
+    assert limiter.requests.paused_until > limiter.tokens.paused_until
+
+
+def test_parse_duration():
+    assert ratelimit.parse_duration("1.5") == 1.5
+    assert ratelimit.parse_duration("6m0s") == 360.0
+    assert ratelimit.parse_duration("20ms") == pytest.approx(0.02)
+    assert ratelimit.parse_duration("1h2m3s") == 3723.0
+
+
+def test_rate_limiters_are_shared_per_provider_model_and_key():
+    limiter = ratelimit.get_rate_limiter("OpenAI", "gpt-4.1-nano", "sk-a")
+
+    assert ratelimit.get_rate_limiter("OpenAI", "gpt-4.1-nano", "sk-a") is limiter
+    assert ratelimit.get_rate_limiter("OpenAI", "gpt-4.1-nano", "sk-b") is not limiter
+    assert ratelimit.get_rate_limiter("OpenAI", "gpt-4.1", "sk-a") is not limiter
@@ -0,0 +1,164 @@
+import pytest
+
+from modules import resilience
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class NotFoundError(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def clear_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(resilience.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def failing(error):
+    def func():
+        raise error
+
+    return func
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    """Test that the circuit opens after consecutive failures, fails fast and closes after a successful trial call."""
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = resilience.CircuitBreaker("chroma", failure_threshold=2, reset_timeout=30)
+    calls = []
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing(ConnectionError()))
+    assert breaker.is_open
+
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.call(lambda: calls.append("not called"))
+    assert calls == []
+
+    # the trial call after the reset timeout fails, so the circuit stays open
+    now[0] += 31
+    with pytest.raises(ConnectionError):
+        breaker.call(failing(ConnectionError()))
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.call(lambda: "not called")
+
+    now[0] += 31
+    assert breaker.call(lambda: "ok") == "ok"
+    assert not breaker.is_open
+    assert breaker.failures == 0
+
+
+def test_expected_and_rate_limit_errors_dont_open_circuit():
+    """Test that expected errors and rate limits don't count as failures of the dependency."""
+    breaker = resilience.CircuitBreaker("youtube", failure_threshold=1)
+
+    with pytest.raises(NotFoundError):
+        breaker.call(failing(NotFoundError()), expected_errors=(NotFoundError,))
+    with pytest.raises(RateLimitError):
+        breaker.call(failing(RateLimitError()))
+
+    assert not breaker.is_open
+
+
+def test_retry_uses_exponential_backoff(no_sleep):
+    """Test that failed calls are retried with growing, jittered delays."""
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    assert resilience.retry(flaky, attempts=3, base_delay=1.0) == "ok"
+    assert len(no_sleep) == 2
+    assert 0.5 <= no_sleep[0] <= 1.5
+    assert 1.0 <= no_sleep[1] <= 3.0
+
+
+def test_retry_gives_up_on_non_retryable_errors(no_sleep):
+    """Test that errors that can't be fixed by retrying are raised immediately."""
+    with pytest.raises(NotFoundError):
+        resilience.retry(failing(NotFoundError()), give_up_on=(NotFoundError,))
+    with pytest.raises(RateLimitError):
+        resilience.retry(failing(RateLimitError()))
+    assert no_sleep == []
+
+
+def test_timeouts_of_clients_are_reported_as_dependency_timeouts(no_sleep):
+    """Test that the timeout errors of the client libraries are raised as DependencyTimeoutError."""
+
+    class ReadTimeout(Exception):
+        pass
+
+    with pytest.raises(resilience.DependencyTimeoutError) as exc_info:
+        resilience.resilient_call("ollama", failing(ReadTimeout()), idempotent=False)
+
+    assert isinstance(exc_info.value, TimeoutError)
+    assert exc_info.value.dependency == "ollama"
+    assert isinstance(exc_info.value.__cause__, ReadTimeout)
+
+
+def test_retry_stops_at_the_deadline(monkeypatch):
+    """Test that no retry is started that could end after the deadline."""
+    now = [0.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(resilience.time, "sleep", lambda delay: None)
+    attempts = []
+
+    def slow_failure():
+        attempts.append(now[0])
+        now[0] += 10
+        raise ConnectionError("timed out")
+
+    with pytest.raises(ConnectionError):
+        resilience.retry(
+            slow_failure, attempts=5, base_delay=0.0, deadline=25, attempt_timeout=10
+        )
+
+    assert attempts == [0.0, 10.0]
+
+
+def test_resilient_call_retries_only_idempotent_calls(no_sleep):
+    """Test that non-idempotent calls are made once, while idempotent ones are retried."""
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise ConnectionError("unreachable")
+
+    with pytest.raises(ConnectionError):
+        resilience.resilient_call("openai", func, idempotent=False)
+    assert len(calls) == 1
+
+    with pytest.raises(ConnectionError):
+        resilience.resilient_call("chroma", func)
+    assert len(calls) == 1 + resilience.get_config_value("resilience.retry_attempts")
+
+
+def test_get_unavailable_dependencies(no_sleep):
+    """Test that dependencies with an open circuit are reported as unavailable."""
+    threshold = resilience.get_config_value(
+        "resilience.circuit_breaker.failure_threshold"
+    )
+    for _ in range(threshold):
+        with pytest.raises(ConnectionError):
+            resilience.resilient_call(
+                "chroma", failing(ConnectionError()), idempotent=False
+            )
+    resilience.resilient_call("youtube", lambda: "ok")
+
+    assert resilience.get_unavailable_dependencies() == ["chroma"]
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.resilient_call("chroma", lambda: "ok")
@@ -0,0 +1,88 @@
+from langchain_core.documents import Document
+
+from modules.rag import merge_adjacent_documents, split_text_recursively
+from modules.segments import (
+    format_timestamp,
+    get_time_range,
+    get_timestamp_url,
+    join_segments,
+    pack_segments,
+    unpack_segments,
+)
+
+TIMED_TEXTS = [
+    (0.0, 2.5, "hello and welcome"),
+    (2.5, 3.0, "to this video"),
+    (5.5, 4.0, "today we talk about segments"),
+]
+
+
+def test_join_segments_matches_text_formatter():
+    """Test that the transcript text is joined like youtube_transcript_api's TextFormatter."""
+    text, segments = join_segments(TIMED_TEXTS)
+
+    assert text == "\n".join(t[2] for t in TIMED_TEXTS)
+    for segment, (_, _, segment_text) in zip(segments, TIMED_TEXTS):
+        assert text[segment.offset :].startswith(segment_text)
+
+
+def test_pack_and_unpack_segments():
+    """Test that segments survive the round trip through their binary form."""
+    _, segments = join_segments(TIMED_TEXTS)
+
+    packed = pack_segments(segments)
+
+    assert len(packed) == 12 * len(segments)
+    assert unpack_segments(packed) == segments
+
+
+def test_get_time_range():
+    """Test that a span of text is mapped to the time range of the segments it covers."""
+    text, segments = join_segments(TIMED_TEXTS)
+    start = text.index("to this")
+    end = text.index("today") + len("today")
+
+    assert get_time_range(segments, start, end) == (2.5, 9.5)
+    assert get_time_range([], 0, 10) is None
+
+
+def test_split_text_recursively_adds_time_ranges():
+    """Test that chunks carry their time range when segments are provided."""
+    text, segments = join_segments(TIMED_TEXTS)
+
+    chunks = split_text_recursively(text, chunk_size=32, segments=segments)
+
+    assert [c.metadata["start"] for c in chunks] == [0.0, 5.5]
+    assert [c.metadata["end"] for c in chunks] == [5.5, 9.5]
+
+
+def test_split_text_recursively_without_segments():
+    """Test that chunks have no metadata when no segments are provided."""
+    chunks = split_text_recursively("hello and welcome\nto this video", chunk_size=20)
+
+    assert all(c.metadata == {} for c in chunks)
+
+
+def test_merge_adjacent_documents():
+    """Test that touching chunks are merged and ordered by time."""
+    docs = [
+        Document(page_content="third", metadata={"start": 20.0, "end": 30.0}),
+        Document(page_content="second", metadata={"start": 10.0, "end": 20.0}),
+        Document(page_content="first", metadata={"start": 0.0, "end": 5.0}),
+        Document(page_content="untimed"),
+    ]
+
+    merged = merge_adjacent_documents(docs)
+
+    assert [d.page_content for d in merged] == ["first", "second\nthird", "untimed"]
+    assert merged[1].metadata == {"start": 10.0, "end": 30.0}
+
+
+def test_timestamp_helpers():
+    assert format_timestamp(75.3) == "01:15"
+    assert format_timestamp(3725) == "1:02:05"
+    assert (
+        get_timestamp_url("https://www.youtube.com/watch?v=abc", 75.3)
+        == "https://www.youtube.com/watch?v=abc&t=75s"
+    )
+    assert get_timestamp_url("https://youtu.be/abc", 5) == "https://youtu.be/abc?t=5s"
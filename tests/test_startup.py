@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.startup import PAGES, REPO_ROOT, get_top_level_imports
+
+# dependencies that are only imported on first use, see modules/clients.py
+HEAVY_MODULES = [
+    "chromadb",
+    "langchain_chroma",
+    "langchain_openai",
+    "langchain_ollama",
+    "openai",
+    "whisper",
+    "torch",
+]
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_loading_page_does_not_import_heavy_dependencies(page):
+    """Test that importing the modules of a page doesn't pull in the client libraries or whisper."""
+    script = (
+        "import importlib, sys\n"
+        "for module in sys.argv[1:]:\n"
+        "    importlib.import_module(module)\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script, *get_top_level_imports(PAGES[page])],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert output.strip().splitlines()[-1] == "[]"
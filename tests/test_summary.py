@@ -4,12 +4,9 @@ import pytest
 from langchain_openai import ChatOpenAI
 from streamlit.testing.v1 import AppTest
 
+from modules.capabilities import OPENAI_CONTEXT_WINDOWS
 from modules.helpers import is_api_key_valid
-from modules.summary import (
-    OPENAI_CONTEXT_WINDOWS,
-    TranscriptTooLongForModelException,
-    get_transcript_summary,
-)
+from modules.summary import TranscriptTooLongForModelException, get_transcript_summary
 from modules.youtube import (
     InvalidUrlException,
     fetch_youtube_transcript,
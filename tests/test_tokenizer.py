@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from modules import helpers, tokenizer
+
+
+class DummyEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def clear_encodings():
+    tokenizer.clear_encodings()
+    yield
+    tokenizer.clear_encodings()
+
+
+def test_encodings_are_loaded_once_in_the_background(monkeypatch):
+    loads = []
+    loaded = threading.Event()
+
+    def load(encoding_name):
+        loads.append(encoding_name)
+        loaded.set()
+        return DummyEncoding()
+
+    monkeypatch.setattr(tokenizer, "_load_encoding", load)
+
+    tokenizer.prewarm_encodings(["o200k_base"])
+    assert loaded.wait(timeout=2)
+
+    assert (
+        helpers.num_tokens_from_string("three short words", encoding_name="o200k_base")
+        == 3
+    )
+    assert loads == ["o200k_base"]
+
+
+def test_token_count_is_estimated_if_encoding_is_unavailable(monkeypatch):
+    """Test that a failing download (e.g. without network access) doesn't fail the token count."""
+
+    def load(encoding_name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tokenizer, "_load_encoding", load)
+
+    assert helpers.num_tokens_from_string("x" * 400, encoding_name="cl100k_base") == 101
+
+
+def test_cache_dir_is_set_for_tiktoken(monkeypatch):
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+
+    cache_dir = tokenizer.get_cache_dir()
+
+    assert cache_dir.endswith(".tiktoken_cache")
+    assert tokenizer.os.environ["TIKTOKEN_CACHE_DIR"] == cache_dir